@@ -1,26 +1,103 @@
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, abort
 from pymongo import MongoClient
-import requests # New import
+import atexit
+import base64
+import logging
 import os
-from werkzeug.utils import secure_filename
+from events.event_log import EventLog, SegmentSink, MongoSink, BufferFull
+from observability.metrics import Counter, Gauge, instrument_flask
+from observability.profiling import PROFILER, register_profiler_routes
+from serving.process_local import ProcessLocal
+from recommender.client import RecommenderClient, RecommenderUnavailable, HttpTransport, InProcessTransport, CircuitBreaker
 
-app = Flask(__name__)
+# LOG_LEVEL=DEBUG shows per-request detail; the default keeps logging off the hot path.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
-# Configuration for file uploads
-UPLOAD_FOLDER = 'app/static/uploads'
-RESULT_FOLDER = 'app/static/results'
+app = Flask(__name__)
+# Request-duration histograms and GET /metrics in the Prometheus text format
+instrument_flask(app, 'app')
+# PROFILER_ENABLED=1 adds /debug/profiler and a SIGUSR2 toggle for the sampling profiler.
+if os.getenv("PROFILER_ENABLED", "0") == "1":
+    register_profiler_routes(app)
+    PROFILER.install_signal_toggle()
+
+# Configuration for file uploads. Try-on photos are processed in memory and never written to disk.
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['RESULT_FOLDER'] = RESULT_FOLDER
+CLOTHES_FOLDER = 'app/static/clothes'
+TRYON_OUTPUT_FORMAT = os.getenv("TRYON_OUTPUT_FORMAT", "jpeg")
+TRYON_OUTPUT_QUALITY = int(os.getenv("TRYON_OUTPUT_QUALITY", "90"))
+# Pose fidelity tier: 'fast' under heavy load, 'accurate' when latency matters less (see QUALITY_TIERS)
+TRYON_QUALITY = os.getenv("TRYON_QUALITY", "accurate")
 
 
+# MongoDB clients, the event flusher thread and the recommender client's connection pool must not
+# be shared across a fork, so each is built on first use in the process serving requests
+# (see serving/prefork.py). Importing this module opens no connections and starts no threads.
+
 # This app still needs its own MongoDB connection to manage the raw preferences from the quiz
-client = MongoClient('mongodb://localhost:27017/')
-db = client['fashion_app']
-preferences_collection = db['preferences'] # Renamed for clarity
+mongo_client = ProcessLocal(lambda: MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/")))
+
+def get_db():
+    return mongo_client.get()['fashion_app']
+
+def get_preferences_collection():
+    return get_db()['preferences']
+
+# Interaction events are buffered in memory and written in batches by a background thread:
+# EVENT_SINKS=segments (compressed files under EVENT_LOG_DIR), mongo (cart_events/feedback_events) or both.
+EVENT_SINKS = os.getenv("EVENT_SINKS", "segments,mongo").split(',')
+
+def _create_event_log():
+    event_sinks = []
+    if 'segments' in EVENT_SINKS:
+        event_sinks.append(SegmentSink(os.getenv("EVENT_LOG_DIR", "event_segments")))
+    if 'mongo' in EVENT_SINKS:
+        db = get_db()
+        event_sinks.append(MongoSink({'add_to_cart': db['cart_events'], 'feedback': db['feedback_events']}))
+    log = EventLog(
+        event_sinks,
+        capacity=int(os.getenv("EVENT_BUFFER_SIZE", "65536")),
+        flush_interval=float(os.getenv("EVENT_FLUSH_INTERVAL", "1.0")),
+        block_timeout=float(os.getenv("EVENT_BLOCK_TIMEOUT", "0.05")))
+    atexit.register(log.close)
+    return log
+
+event_log = ProcessLocal(_create_event_log)
+for _name, _help in (('pushed', "Interaction events accepted."), ('rejected', "Interaction events dropped on a full buffer."),
+                     ('flushed', "Interaction events written to the sinks."), ('sink_errors', "Failed event sink writes.")):
+    Counter(f"events_{_name}_total", _help, function=lambda name=_name: event_log.get().stats()[name])
+Gauge('events_buffered', "Interaction events waiting in the buffer.", function=lambda: event_log.get().stats()['buffered'])
+
+def record_event(event_type, **fields):
+    try:
+        event_log.get().push(event_type, **fields)
+    except BufferFull as e:
+        # Losing an analytics event is better than failing the user's request.
+        logger.warning("Dropped %s event: %s", event_type, e)
 
 # URL for the recommender API
-RECOMMENDER_API_URL = "http://127.0.0.1:5001"
+RECOMMENDER_API_URL = os.getenv("RECOMMENDER_API_URL", "http://127.0.0.1:5001")
+
+# All recommender calls go through one pooled, resilient client. RECOMMENDER_TRANSPORT=inprocess
+# calls RecommenderEngine directly when both services are deployed together, configured from the same
+# environment variables as recommender/api.py.
+def _create_recommender():
+    if os.getenv("RECOMMENDER_TRANSPORT", "http") == "inprocess":
+        transport = InProcessTransport()
+    else:
+        transport = HttpTransport(
+            RECOMMENDER_API_URL,
+            timeout=(float(os.getenv("RECOMMENDER_CONNECT_TIMEOUT", "1.0")), float(os.getenv("RECOMMENDER_READ_TIMEOUT", "3.0"))),
+            retries=int(os.getenv("RECOMMENDER_RETRIES", "2")))
+    client = RecommenderClient(
+        transport,
+        CircuitBreaker(failure_threshold=int(os.getenv("RECOMMENDER_BREAKER_FAILURES", "5")),
+                       reset_timeout=float(os.getenv("RECOMMENDER_BREAKER_RESET", "30"))))
+    atexit.register(client.close)
+    return client
+
+recommender = ProcessLocal(_create_recommender)
 
 @app.route('/')
 def index():
@@ -43,20 +120,89 @@ def quiz():
             "items": quiz_items,
             "color": request.form.get("color")
         }
-        preferences_collection.update_one({'user_id': user_id}, {'$set': user_preferences}, upsert=True)
+        get_preferences_collection().update_one({'user_id': user_id}, {'$set': user_preferences}, upsert=True)
 
         # NEW: Call recommender API to initialize scores
         try:
-            init_payload = {'user_id': user_id, 'quiz_items': quiz_items}
-            requests.post(f"{RECOMMENDER_API_URL}/initialize", json=init_payload)
-        except requests.exceptions.RequestException as e:
-            print(f"Error calling recommender API: {e}")
+            recommender.get().initialize(user_id, quiz_items)
+        except RecommenderUnavailable as e:
+            logger.warning("Error calling recommender API: %s", e)
             # Decide how to handle this - maybe show an error page
 
         return redirect(url_for('recommendations'))
     return render_template('quiz.html')
 
-from virtual_tryon.tryon_engine import TryOnEngine
+import threading
+from virtual_tryon.engine_pool import TryOnEnginePool, PoolExhausted
+from virtual_tryon.job_queue import TryOnJobQueue, QueueFull
+from virtual_tryon.garment_store import GarmentStore
+from virtual_tryon.pose_cache import PoseCache
+# virtual_tryon.tryon_engine pulls in mediapipe, which takes most of a second to import; it is loaded
+# on the first in-thread try-on, or ahead of the fork by preload().
+
+# Pose results keyed by photo content, shared by every engine so trying another garment on the same photo skips detection.
+pose_cache = PoseCache(
+    max_bytes=int(os.getenv("TRYON_POSE_CACHE_MB", "256")) * 1024 * 1024,
+    spill_dir=os.getenv("TRYON_POSE_CACHE_DIR") or None,
+    spill_max_bytes=int(os.getenv("TRYON_POSE_CACHE_DIR_MB", "1024")) * 1024 * 1024)
+
+# Garments decoded once into memory-mapped premultiplied arrays; reloaded when a PNG changes. The decoded
+# levels are kept outside static/ so they are never served as files.
+GARMENT_CACHE_DIR = os.getenv("GARMENT_CACHE_DIR") or "garment_cache"
+garment_store = GarmentStore(CLOTHES_FOLDER, GARMENT_CACHE_DIR)
+if os.getenv("GARMENT_PRELOAD", "0") == "1":
+    garment_store.preload()
+
+# serving/prefork.py runs SERVING_WORKERS copies of this process, so the engine pool, the job queue's
+# processes and the batch threads default to this worker's share of the CPUs rather than all of them.
+SERVING_WORKERS = int(os.getenv("SERVING_WORKERS", "1"))
+TRYON_CPUS = max(1, (os.cpu_count() or 1) // SERVING_WORKERS)
+
+def _create_tryon_engine():
+    from virtual_tryon.tryon_engine import TryOnEngine
+    return TryOnEngine(pose_cache=pose_cache, quality=TRYON_QUALITY,
+                       batch_workers=int(os.getenv("TRYON_BATCH_WORKERS", "0")) or TRYON_CPUS)
+
+# Pre-warmed TryOnEngine instances shared by all requests, for /tryon_all and for /tryon with TRYON_ASYNC=0.
+# Built by init_worker() so no request pays for warming them, or on first use under the development server.
+_tryon_pool = None
+_tryon_pool_lock = threading.Lock()
+
+def get_tryon_pool():
+    global _tryon_pool
+    if _tryon_pool is None:
+        with _tryon_pool_lock:
+            if _tryon_pool is None:
+                _tryon_pool = TryOnEnginePool(
+                    size=int(os.getenv("TRYON_POOL_SIZE", "0")) or TRYON_CPUS,
+                    timeout=float(os.getenv("TRYON_POOL_TIMEOUT", "10")),
+                    engine_factory=_create_tryon_engine)
+                atexit.register(_tryon_pool.shutdown)
+    return _tryon_pool
+
+# With TRYON_ASYNC=1 (the default) try-ons run as jobs on a process pool and the page polls for the result,
+# so request threads are never blocked by pose detection. TRYON_ASYNC=0 uses the in-thread engine pool above.
+TRYON_ASYNC = os.getenv("TRYON_ASYNC", "1") == "1"
+# A job is polled on whichever worker takes the connection, so with several workers the job queue
+# publishes its jobs to a directory they share.
+TRYON_JOB_DIR = os.getenv("TRYON_JOB_DIR") or ("tryon_jobs" if SERVING_WORKERS > 1 else None)
+_tryon_queue = None
+
+def get_tryon_queue():
+    global _tryon_queue
+    if _tryon_queue is None:
+        with _tryon_pool_lock:
+            if _tryon_queue is None:
+                _tryon_queue = TryOnJobQueue(
+                    CLOTHES_FOLDER,
+                    GARMENT_CACHE_DIR,
+                    max_workers=int(os.getenv("TRYON_WORKERS", "0")) or TRYON_CPUS,
+                    max_queue=int(os.getenv("TRYON_MAX_QUEUE", "32")),
+                    pose_cache_bytes=int(os.getenv("TRYON_POSE_CACHE_MB", "256")) * 1024 * 1024,
+                    quality=TRYON_QUALITY,
+                    job_dir=TRYON_JOB_DIR)
+                atexit.register(_tryon_queue.shutdown)
+    return _tryon_queue
 
 def allowed_file(filename):
     return '.' in filename and \
@@ -75,46 +221,144 @@ def tryon():
         if file.filename == '':
             return redirect(request.url)
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Save the uploaded file
-            user_image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(user_image_path)
-
-            # Define clothing and output paths
-            clothing_image_path = f'app/static/clothes/{item_type.lower()}.png'
-            output_filename = f"result_{filename}"
-            output_image_path = os.path.join(app.config['RESULT_FOLDER'], output_filename)
+            # Decode straight from the upload stream instead of saving it first
+            user_image = file.read()
+            try:
+                clothing_image = garment_store.get(item_type)
+            except KeyError:
+                return render_template('tryon.html', item_type=item_type, color=color,
+                                       error="This item is not available for try-on."), 404
+
+            if TRYON_ASYNC:
+                try:
+                    job_id = get_tryon_queue().submit(
+                        user_image, clothing_image.item_type, TRYON_OUTPUT_FORMAT, TRYON_OUTPUT_QUALITY)
+                except QueueFull as e:
+                    logger.warning("Try-on rejected: %s", e)
+                    return render_template('tryon.html', item_type=item_type, color=color,
+                                           error="The try-on service is busy. Please try again in a moment."), 503
+                # The page polls the job status and shows the result once it is done
+                return render_template('tryon.html', item_type=item_type, color=color, job_id=job_id)
 
             # Run the try-on engine
             try:
-                engine = TryOnEngine()
-                engine.apply_tryon(user_image_path, clothing_image_path, output_image_path)
+                with get_tryon_pool().engine() as engine:
+                    result = engine.tryon_bytes(user_image, clothing_image, TRYON_OUTPUT_FORMAT, TRYON_OUTPUT_QUALITY)
+            except PoolExhausted as e:
+                logger.warning("Try-on rejected: %s", e)
+                return render_template('tryon.html', item_type=item_type, color=color,
+                                       error="The try-on service is busy. Please try again in a moment."), 503
             except Exception as e:
-                print(f"Error during try-on process: {e}")
+                logger.exception("Error during try-on process: %s", e)
                 # Render the page with an error message
                 return render_template('tryon.html', item_type=item_type, color=color, error="Failed to process image.")
 
-            # Render the page again, this time with the result image
+            if result is None:
+                return render_template('tryon.html', item_type=item_type, color=color,
+                                       error="Could not find a person in the photo.")
+
+            # Render the page again with the result embedded, so the browser doesn't fetch it separately
+            result_image = f"data:image/{TRYON_OUTPUT_FORMAT};base64,{base64.b64encode(result).decode('ascii')}"
             return render_template('tryon.html',
                                    item_type=item_type,
                                    color=color,
-                                   result_image=f'results/{output_filename}')
+                                   result_image=result_image)
 
     # For the GET request, just show the upload page
     return render_template('tryon.html', item_type=item_type, color=color)
 
+@app.route('/tryon/all', methods=['POST'])
+def tryon_all():
+    """
+    Previews every recommended item type on one uploaded photo with a single pose detection.
+    """
+    file = request.files.get('user_photo')
+    item_types = request.form.getlist('item_types')
+    if not file or not allowed_file(file.filename) or not item_types:
+        return redirect(url_for('recommendations'))
+
+    user_image = file.read()
+    # Item types without a garment image are skipped
+    clothing_images = []
+    available_types = []
+    for item_type in item_types:
+        try:
+            clothing_images.append(garment_store.get(item_type))
+            available_types.append(item_type)
+        except KeyError:
+            continue
+
+    try:
+        with get_tryon_pool().engine() as engine:
+            results = engine.tryon_batch(user_image, clothing_images, TRYON_OUTPUT_FORMAT, TRYON_OUTPUT_QUALITY)
+    except PoolExhausted as e:
+        logger.warning("Try-on rejected: %s", e)
+        return render_template('tryon_all.html', previews=[],
+                               error="The try-on service is busy. Please try again in a moment."), 503
+    except Exception as e:
+        logger.exception("Error during batch try-on: %s", e)
+        return render_template('tryon_all.html', previews=[], error="Failed to process image.")
+
+    if results is None:
+        return render_template('tryon_all.html', previews=[], error="Could not find a person in the photo.")
+
+    previews = [
+        {'item_type': item_type,
+         'image': f"data:image/{TRYON_OUTPUT_FORMAT};base64,{base64.b64encode(result).decode('ascii')}"}
+        for item_type, result in zip(available_types, results) if result is not None
+    ]
+    return render_template('tryon_all.html', previews=previews)
+
+@app.route('/tryon/jobs/<job_id>')
+def tryon_job_status(job_id):
+    job = get_tryon_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/tryon/jobs/<job_id>/result')
+def tryon_job_result(job_id):
+    job = get_tryon_queue().get(job_id)
+    if job is None or job.status != 'done':
+        abort(404)
+    return Response(job.result, mimetype=f'image/{TRYON_OUTPUT_FORMAT}')
+
+def preload():
+    """
+    Loads read-only assets once in the pre-fork parent (serving/prefork.py), so the workers share
+    them copy-on-write: the vision libraries and the decoded garments. Nothing here holds a
+    connection or a thread.
+    """
+    import virtual_tryon.tryon_engine  # noqa: F401  (cv2 and mediapipe)
+    garment_store.preload()
+
+def init_worker():
+    """
+    Builds the per-process clients in a freshly forked worker, before its first request.
+    """
+    get_db()
+    event_log.get()
+    recommender.get()
+    # The engines and the job queue's executor run threads of their own, so they are built after the fork.
+    get_tryon_pool()
+    if TRYON_ASYNC:
+        get_tryon_queue()
+
+@app.route('/tryon/stats')
+def tryon_stats():
+    # Hit/miss counters for the shared pose cache, plus queue depth and job latency in async mode
+    stats = {'pose_cache': pose_cache.stats()}
+    if _tryon_queue is not None:
+        stats['job_queue'] = _tryon_queue.metrics()
+    return jsonify(stats)
+
 @app.route('/recommendations')
 def recommendations():
     user_id = "mock_user_123"
 
     # NEW: Fetch recommendations from the API
-    try:
-        response = requests.get(f"{RECOMMENDER_API_URL}/recommendations/{user_id}")
-        response.raise_for_status() # Raise an exception for bad status codes
-        recommended_products = response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching recommendations: {e}")
-        recommended_products = [] # Show an empty list on error
+    # The client falls back to the last good list (or an empty one) if the recommender is failing.
+    recommended_products = recommender.get().get_recommendations(user_id)
 
     return render_template('recommendations.html', recommendations=recommended_products)
 
@@ -129,18 +373,17 @@ def my_data():
             "items": updated_items,
             "color": request.form.get("color")
         }
-        preferences_collection.update_one({'user_id': user_id}, {'$set': updated_preferences}, upsert=True)
+        get_preferences_collection().update_one({'user_id': user_id}, {'$set': updated_preferences}, upsert=True)
 
         # Re-initialize scores after preferences are updated
         try:
-            init_payload = {'user_id': user_id, 'quiz_items': updated_items}
-            requests.post(f"{RECOMMENDER_API_URL}/initialize", json=init_payload)
-        except requests.exceptions.RequestException as e:
-            print(f"Error calling recommender API: {e}")
+            recommender.get().initialize(user_id, updated_items)
+        except RecommenderUnavailable as e:
+            logger.warning("Error calling recommender API: %s", e)
 
         return redirect(url_for('recommendations'))
 
-    user_prefs = preferences_collection.find_one({'user_id': user_id})
+    user_prefs = get_preferences_collection().find_one({'user_id': user_id})
     if not user_prefs:
         return redirect(url_for('quiz'))
 
@@ -151,13 +394,13 @@ def disable_personalization():
     user_id = "mock_user_123"
 
     # Delete from the local preferences collection
-    preferences_collection.delete_one({'user_id': user_id})
+    get_preferences_collection().delete_one({'user_id': user_id})
 
     # NEW: Call the recommender API to delete the user's score history
     try:
-        requests.delete(f"{RECOMMENDER_API_URL}/user/{user_id}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling recommender API to delete user history: {e}")
+        recommender.get().delete_user(user_id)
+    except RecommenderUnavailable as e:
+        logger.warning("Error calling recommender API to delete user history: %s", e)
         # Depending on the desired behavior, you might want to inform the user
         # that part of the deletion failed. For now, we just log it.
 
@@ -172,16 +415,10 @@ def feedback_proxy():
     product_type = request.form.get('item_type')
     feedback_type = request.form.get('feedback_type')
 
-    # Call the recommender API's feedback endpoint
-    try:
-        feedback_payload = {
-            'user_id': user_id,
-            'item_type': product_type,
-            'feedback_type': feedback_type
-        }
-        requests.post(f"{RECOMMENDER_API_URL}/feedback", json=feedback_payload)
-    except requests.exceptions.RequestException as e:
-        print(f"Error sending feedback to recommender API: {e}")
+    # Send feedback in the background; the recommendations page the redirect lands on
+    # waits for it, so the user still sees its effect.
+    recommender.get().send_feedback(user_id, product_type, feedback_type)
+    record_event('feedback', user_id=user_id, item_type=product_type, feedback_type=feedback_type)
 
     return redirect(url_for('recommendations'))
 
@@ -189,9 +426,11 @@ def feedback_proxy():
 def add_to_cart():
     item_type = request.form.get('item_type')
     color = request.form.get('color')
-    print(f"EVENT: Item added to cart! Type: {item_type}, Color: {color}")
     # In a real application, you would add this item to the user's session/cart in the database.
+    # The event itself is kept as a demand signal for sales_forecast.
+    record_event('add_to_cart', user_id="mock_user_123", item_type=item_type, color=color)
     return redirect(url_for('recommendations'))
 
 if __name__ == '__main__':
+    # Development server. For production, run several workers with: python -m serving.prefork app
     app.run(debug=True) # Runs on default port 5000
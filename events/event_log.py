@@ -0,0 +1,205 @@
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Fields recorded for each event type; push() rejects anything else so the log stays uniform.
+EVENT_TYPES = {
+    'add_to_cart': ('user_id', 'item_type', 'color'),
+    'feedback': ('user_id', 'item_type', 'feedback_type'),
+}
+
+class BufferFull(RuntimeError):
+    """Raised by EventLog.push when the buffer stays full for longer than block_timeout."""
+
+class SegmentSink:
+    def __init__(self, directory, partition_seconds=3600):
+        """
+        Appends events to time-partitioned, gzip-compressed JSON-lines segments.
+
+        Each flushed batch is written as one gzip member per partition file
+        (events-<partition start, UTC>.jsonl.gz). Concatenated members are still a valid gzip stream,
+        so appending never rewrites a segment and a crash can at worst lose the member being written.
+        """
+        self.directory = directory
+        self.partition_seconds = partition_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def partition_path(self, timestamp):
+        start = int(timestamp // self.partition_seconds) * self.partition_seconds
+        name = datetime.fromtimestamp(start, timezone.utc).strftime('%Y%m%dT%H%M%S')
+        return os.path.join(self.directory, f"events-{name}.jsonl.gz")
+
+    def write(self, events):
+        partitions = {}
+        for event in events:
+            partitions.setdefault(self.partition_path(event['ts']), []).append(event)
+        for path, batch in partitions.items():
+            payload = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in batch)
+            with open(path, 'ab') as outfile:
+                outfile.write(gzip.compress(payload.encode('utf-8'), compresslevel=1))
+
+class MongoSink:
+    def __init__(self, collections):
+        """
+        Bulk-inserts events into one collection per event type, e.g. {'add_to_cart': db['cart_events']}.
+        Documents get a created_at datetime (which sales_forecast reads) in place of the float ts.
+        """
+        self.collections = collections
+
+    def write(self, events):
+        by_type = {}
+        for event in events:
+            if event['type'] in self.collections:
+                document = {key: value for key, value in event.items() if key not in ('ts', 'type')}
+                document['created_at'] = datetime.fromtimestamp(event['ts'], timezone.utc)
+                by_type.setdefault(event['type'], []).append(document)
+        for event_type, documents in by_type.items():
+            self.collections[event_type].insert_many(documents, ordered=False)
+
+class EventLog:
+    def __init__(self, sinks, capacity=65536, batch_size=2048, flush_interval=1.0, block_timeout=0.0):
+        """
+        Non-blocking interaction event log for request handlers.
+
+        push() stores the event in a fixed-size ring buffer and returns; a background thread drains
+        the buffer in batches of up to batch_size and hands each batch to every sink in order.
+        When the buffer is full, push() waits up to block_timeout seconds for the flusher to make
+        room, then raises BufferFull (with block_timeout=0 it raises immediately), so a stalled sink
+        pushes back on callers instead of growing memory. A failing sink is logged and counted; the
+        other sinks still receive the batch.
+
+        :param sinks: Objects with write(events), e.g. SegmentSink and MongoSink.
+        :param capacity: Ring buffer size in events.
+        :param batch_size: Most events handed to the sinks per write.
+        :param flush_interval: Longest time an event waits in the buffer.
+        :param block_timeout: Seconds push() may wait for room in a full buffer.
+        """
+        self.sinks = sinks
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+
+        self._ring = [None] * capacity
+        self._head = 0  # next slot to read
+        self._size = 0
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._counters = {'pushed': 0, 'rejected': 0, 'flushed': 0, 'sink_errors': 0}
+
+        self._thread = threading.Thread(target=self._run, name='event-flusher', daemon=True)
+        self._thread.start()
+
+    def push(self, event_type, **fields):
+        """
+        Records an event with the current time. Raises ValueError for unknown types or fields.
+        """
+        expected = EVENT_TYPES.get(event_type)
+        if expected is None or set(fields) - set(expected):
+            raise ValueError(f"Invalid event {event_type!r} with fields {sorted(fields)}")
+        event = {'ts': time.time(), 'type': event_type}
+        event.update(fields)
+
+        with self._not_full:
+            if self._size >= self.capacity:
+                self._wake.set()
+                if not self.block_timeout or not self._not_full.wait_for(
+                        lambda: self._size < self.capacity, timeout=self.block_timeout):
+                    self._counters['rejected'] += 1
+                    raise BufferFull(f"Event buffer full ({self.capacity} events)")
+            self._ring[(self._head + self._size) % self.capacity] = event
+            self._size += 1
+            self._counters['pushed'] += 1
+            if self._size >= self.batch_size:
+                self._wake.set()
+
+    def _drain(self):
+        with self._lock:
+            count = min(self._size, self.batch_size)
+            end = self._head + count
+            if end <= self.capacity:
+                batch = self._ring[self._head:end]
+                self._ring[self._head:end] = [None] * count
+            else:
+                batch = self._ring[self._head:] + self._ring[:end - self.capacity]
+                self._ring[self._head:] = [None] * (self.capacity - self._head)
+                self._ring[:end - self.capacity] = [None] * (end - self.capacity)
+            self._head = end % self.capacity
+            self._size -= count
+            self._not_full.notify_all()
+        return batch
+
+    def flush(self):
+        """
+        Writes everything buffered so far to the sinks. Returns the number of events written.
+        """
+        written = 0
+        # One flush at a time, so batches reach the sinks in the order they were pushed.
+        with self._flush_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return written
+                for sink in self.sinks:
+                    try:
+                        sink.write(batch)
+                    except Exception as e:
+                        self._counters['sink_errors'] += 1
+                        logger.warning("Event sink %s failed to write %d events: %s", type(sink).__name__, len(batch), e)
+                written += len(batch)
+                self._counters['flushed'] += len(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, buffered=self._size, capacity=self.capacity)
+
+    def close(self):
+        """
+        Stops the flusher and writes whatever is still buffered.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+def read_events(directory, start=None, end=None, event_types=None, partition_seconds=3600):
+    """
+    Streams events with start <= ts < end (epoch seconds) from the segments in directory, oldest
+    partition first. Only partitions overlapping the range are opened.
+    """
+    wanted = set(event_types) if event_types else None
+    for path in sorted(glob.glob(os.path.join(directory, 'events-*.jsonl.gz'))):
+        name = os.path.basename(path)[len('events-'):-len('.jsonl.gz')]
+        partition_start = datetime.strptime(name, '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc).timestamp()
+        if (end is not None and partition_start >= end) or \
+                (start is not None and partition_start + partition_seconds <= start):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as infile:
+            try:
+                for line in infile:
+                    event = json.loads(line)
+                    if (start is not None and event['ts'] < start) or (end is not None and event['ts'] >= end):
+                        continue
+                    if wanted is None or event['type'] in wanted:
+                        yield event
+            except (EOFError, gzip.BadGzipFile, ValueError) as e:
+                # Only the last member of a segment can be cut short, by a crash mid-write.
+                logger.warning("Skipping truncated end of %s: %s", path, e)
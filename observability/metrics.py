@@ -0,0 +1,273 @@
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond Mongo reads to multi-second try-on renders.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_recording = threading.local()
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, function=None):
+        """
+        :param function: For unlabelled counters and gauges, a callable read at scrape time instead
+                         of values set by the code, for numbers another object already keeps.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            # Unlabelled metrics are exported as 0 before their first update.
+            self.labels()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values, **kwargs):
+        """
+        Returns the child for one combination of label values; children are created on first use.
+        """
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child(values))
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def render(self):
+        if self.function is not None:
+            self._default()._value = self.function()
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self._value)}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self, values):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+class _GaugeChild(_CounterChild):
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self, values):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+class _HistogramChild:
+    def __init__(self, metric, values):
+        self._metric = metric
+        self._values = values
+        self._counts = [0] * (len(metric.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._metric.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+        observations = getattr(_recording, 'observations', None)
+        if observations is not None:
+            observations.append((self._metric.name, self._values, value))
+
+    @contextlib.contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._metric.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, values, [('le', _format_value(bound))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+        return lines
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self, values):
+        return _HistogramChild(self, values)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+class Registry:
+    def __init__(self):
+        """
+        Holds metrics by name and renders them in the Prometheus text exposition format.
+        """
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@contextlib.contextmanager
+def record_observations():
+    """
+    Collects every histogram observation made by this thread inside the block as
+    (metric name, label values, value) tuples. Worker processes return them with their results
+    so the serving process can replay() them into its own registry.
+    """
+    observations = []
+    _recording.observations = observations
+    try:
+        yield observations
+    finally:
+        _recording.observations = None
+
+def replay(observations, registry=None):
+    registry = registry if registry is not None else REGISTRY
+    for name, values, value in observations:
+        metric = registry.get(name)
+        if metric is not None:
+            metric.labels(*values).observe(value)
+
+def metrics_wsgi_app(registry=None):
+    """
+    A WSGI app answering every request with the registry's metrics, for processes without Flask.
+    """
+    registry = registry if registry is not None else REGISTRY
+
+    def application(environ, start_response):
+        body = registry.render().encode('utf-8')
+        start_response('200 OK', [('Content-Type', CONTENT_TYPE), ('Content-Length', str(len(body)))])
+        return [body]
+
+    return application
+
+def start_metrics_server(port, host='0.0.0.0', registry=None):
+    """
+    Serves the registry on http://host:port/ from a daemon thread, so batch jobs and CLIs can be
+    scraped while they run. Returns the server; call shutdown() on it to stop.
+    """
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = make_server(host, port, metrics_wsgi_app(registry), handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+def write_textfile(path, registry=None):
+    """
+    Writes the registry to path atomically, in the format read by node_exporter's textfile collector.
+    Short-lived jobs call this when they finish, since they may exit before any scrape.
+    """
+    registry = registry if registry is not None else REGISTRY
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as outfile:
+        outfile.write(registry.render())
+    os.replace(temp_path, path)
+
+def instrument_flask(app, service, registry=None):
+    """
+    Records http_request_duration_seconds for every request of a Flask app and serves GET /metrics.
+    Requests are labelled by route rule rather than raw path, so user ids do not create new series.
+    """
+    from flask import Response, g, request
+
+    registry = registry if registry is not None else REGISTRY
+    duration = registry.get('http_request_duration_seconds') or Histogram(
+        'http_request_duration_seconds', "Time spent handling HTTP requests.",
+        ('service', 'method', 'route', 'status'), registry=registry)
+
+    @app.before_request
+    def start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_duration(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            duration.labels(service, request.method, route, response.status_code).observe(time.perf_counter() - started)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+    return duration
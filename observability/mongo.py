@@ -0,0 +1,33 @@
+from pymongo import monitoring
+from observability.metrics import REGISTRY, Counter, Histogram
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self, registry=None):
+        """
+        pymongo command listener that records the latency of every command by command name
+        (find, update, insert, ...) and collection, and counts failed commands.
+        Pass it to MongoClient(event_listeners=[...]). Every listener on the same registry records
+        into the same two metrics, so a process can create as many clients as it needs.
+        """
+        registry = registry if registry is not None else REGISTRY
+        self.duration = registry.get('mongo_command_duration_seconds') or Histogram(
+            'mongo_command_duration_seconds', "Latency of MongoDB commands as seen by the driver.",
+            ('command', 'collection'), registry=registry)
+        self.failures = registry.get('mongo_command_failures_total') or Counter(
+            'mongo_command_failures_total', "MongoDB commands that returned an error.",
+            ('command', 'collection'), registry=registry)
+        # Collection names are only on the started event; keep them until the command finishes.
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ''
+
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, '')
+        self.duration.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, '')
+        self.duration.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        self.failures.labels(event.command_name, collection).inc()
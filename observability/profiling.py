@@ -0,0 +1,137 @@
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, max_stacks=20000):
+        """
+        Low-overhead statistical profiler for a running service.
+
+        While started, a background thread samples the stack of every other thread each interval
+        seconds and counts identical stacks. Nothing is installed on the profiled threads, so a stopped
+        profiler costs nothing and a running one costs roughly one stack walk per thread per sample.
+        collapsed() returns the counts in the folded format read by flamegraph.pl and speedscope.
+
+        :param interval: Seconds between samples.
+        :param max_stacks: Distinct stacks kept; further new stacks are counted as '[truncated]'.
+        """
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, reset=True):
+        with self._lock:
+            if self._thread is not None:
+                return False
+            if reset:
+                self._counts.clear()
+                self.samples = 0
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return False
+        self._stop.set()
+        thread.join()
+        return True
+
+    def toggle(self):
+        if not self.stop():
+            self.start()
+        return self.running
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                with self._lock:
+                    if key not in self._counts and len(self._counts) >= self.max_stacks:
+                        key = '[truncated]'
+                    self._counts[key] += 1
+            self.samples += 1
+
+    def collapsed(self, limit=None):
+        """
+        Folded stacks, one 'frame;frame;frame count' line per distinct stack, most frequent first.
+        """
+        with self._lock:
+            items = self._counts.most_common(limit)
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+    def install_signal_toggle(self, signum=getattr(signal, 'SIGUSR2', None), output_path=None):
+        """
+        Starts or stops the profiler when the process receives signum (SIGUSR2 by default).
+        On stop, the folded stacks are written to output_path (default: profile-<pid>.folded).
+        Must be called from the main thread.
+        """
+        if signum is None:
+            return
+
+        def handle(_signum, _frame):
+            # Profiler start/stop and file writing run off the signal handler's frame.
+            threading.Thread(target=self._toggle_and_dump, args=(output_path,), daemon=True).start()
+
+        signal.signal(signum, handle)
+
+    def _toggle_and_dump(self, output_path):
+        if not self.toggle():
+            path = output_path or f"profile-{os.getpid()}.folded"
+            with open(path, 'w', encoding='utf-8') as outfile:
+                outfile.write(self.collapsed())
+
+PROFILER = SamplingProfiler()
+
+def register_profiler_routes(app, profiler=PROFILER):
+    """
+    Adds /debug/profiler to a Flask app: POST ?action=start|stop toggles sampling at runtime,
+    GET returns the folded stacks collected so far. Only call this when PROFILER_ENABLED=1;
+    the endpoint exposes code paths and should not be reachable publicly.
+    """
+    from flask import Response, jsonify, request
+
+    @app.route('/debug/profiler', methods=['GET', 'POST'])
+    def profiler_control():
+        if request.method == 'POST':
+            action = request.args.get('action', 'toggle')
+            if action == 'start':
+                profiler.start(reset=request.args.get('reset', '1') == '1')
+            elif action == 'stop':
+                profiler.stop()
+            elif action == 'toggle':
+                profiler.toggle()
+            else:
+                return jsonify({"error": f"Unknown action '{action}'"}), 400
+            return jsonify({"running": profiler.running, "samples": profiler.samples}), 200
+        limit = request.args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                return jsonify({"error": "limit must be an integer"}), 400
+        return Response(profiler.collapsed(limit), content_type='text/plain; charset=utf-8')
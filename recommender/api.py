@@ -1,8 +1,48 @@
+import logging
+import os
+import sys
 from flask import Flask, request, jsonify
-from recommender_engine import RecommenderEngine
+from recommender_engine import FEEDBACK_SCORES
+
+# The shared observability and serving packages live at the repository root.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.metrics import Counter, Gauge, instrument_flask
+from observability.profiling import PROFILER, register_profiler_routes
+from serving.process_local import ProcessLocal
+from factory import configured_cache_mode, create_cache, create_engine, create_feedback_aggregator
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-engine = RecommenderEngine()
+# Request-duration histograms and GET /metrics in the Prometheus text format
+instrument_flask(app, 'recommender')
+if os.getenv("PROFILER_ENABLED", "0") == "1":
+    register_profiler_routes(app)
+    PROFILER.install_signal_toggle()
+
+cache_mode = configured_cache_mode()
+
+# The engine, cache and feedback buffer hold a MongoClient, SQLite connections and a flusher thread,
+# none of which survive a fork. Each is built on first use in the process that serves requests, so a
+# pre-fork parent can import this module and every worker still gets its own.
+# Their settings are read from the environment by factory.py.
+cache = ProcessLocal(create_cache)
+engine = ProcessLocal(lambda: create_engine(cache.get()))
+feedback_aggregator = ProcessLocal(lambda: create_feedback_aggregator(engine.get()))
+
+if cache_mode in ("shared", "memory"):
+    # The counters read plain attributes; only the gauge asks the backend for its size (a COUNT(*) when shared).
+    Counter('recommendation_cache_hits_total', "Recommendation cache hits.", function=lambda: cache.get().hits)
+    Counter('recommendation_cache_misses_total', "Recommendation cache misses.", function=lambda: cache.get().misses)
+    Gauge('recommendation_cache_entries', "Lists held by the recommendation cache.", function=lambda: len(cache.get().backend))
+
+def init_worker():
+    """
+    Connects and replays the feedback log in a freshly forked worker, before its first request.
+    """
+    engine.get()
+    feedback_aggregator.get()
 
 @app.route('/initialize', methods=['POST'])
 def initialize_user():
@@ -20,15 +60,39 @@ def initialize_user():
     if not all([user_id, quiz_items]):
         return jsonify({"error": "Missing data"}), 400
 
-    engine.initialize_scores_from_quiz(user_id, quiz_items)
+    engine.get().initialize_scores_from_quiz(user_id, quiz_items)
     return jsonify({"status": "success", "message": f"User {user_id} initialized."}), 200
 
+@app.route('/initialize/batch', methods=['POST'])
+def initialize_users_batch():
+    """
+    Initializes scores for many users in one call.
+    Expects JSON data with: {'users': [{'user_id', 'quiz_items'}, ...]}
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid JSON"}), 400
+
+    users = data.get('users')
+    if not isinstance(users, list) or not users:
+        return jsonify({"error": "Missing data"}), 400
+
+    for record in users:
+        if not isinstance(record, dict) or not all([record.get('user_id'), record.get('quiz_items')]):
+            return jsonify({"error": "Each user needs a user_id and quiz_items"}), 400
+
+    initialized = engine.get().initialize_scores_bulk(users)
+    return jsonify({"status": "success", "message": f"Initialized {initialized} users."}), 200
+
 @app.route('/recommendations/<user_id>', methods=['GET'])
 def get_recommendations(user_id):
     """
     Generates and returns recommendations for a given user.
     """
-    recommendations = engine.generate_recommendations(user_id)
+    aggregator = feedback_aggregator.get()
+    if aggregator:
+        aggregator.ensure_fresh(user_id)
+    recommendations = engine.get().generate_recommendations(user_id)
     return jsonify(recommendations)
 
 @app.route('/feedback', methods=['POST'])
@@ -50,17 +114,14 @@ def handle_feedback():
         return jsonify({"error": "Missing data"}), 400
 
     # Define the score change based on feedback
-    if feedback_type == 'see_more':
-        score_change = 1
-    elif feedback_type == 'less_of_this_type':
-        score_change = -1
-    elif feedback_type == 'delete':
-        score_change = -2 # 'delete' is a strong negative signal
-    else:
-        score_change = 0
+    score_change = FEEDBACK_SCORES.get(feedback_type, 0)
 
     if score_change != 0:
-        engine.update_score(user_id, item_type, score_change)
+        aggregator = feedback_aggregator.get()
+        if aggregator:
+            aggregator.add(user_id, item_type, score_change)
+        else:
+            engine.get().update_score(user_id, item_type, score_change)
 
     return jsonify({"status": "success", "message": "Feedback received"}), 200
 
@@ -69,9 +130,25 @@ def delete_user(user_id):
     """
     Deletes all data associated with a user.
     """
-    deleted_count = engine.delete_user_history(user_id)
+    aggregator = feedback_aggregator.get()
+    if aggregator:
+        # Flush first so this worker's buffered feedback lands before the delete. Feedback still
+        # buffered by other workers is dropped when they flush it, by the engine's deletion tombstone.
+        aggregator.flush()
+    deleted_count = engine.get().delete_user_history(user_id)
     return jsonify({"status": "success", "message": f"Deleted {deleted_count} score entries for user {user_id}."}), 200
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """
+    Returns hit/miss counters for the recommendation cache.
+    """
+    recommendation_cache = cache.get()
+    if recommendation_cache is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **recommendation_cache.stats()}), 200
+
 if __name__ == '__main__':
+    # Development server. For production, run several workers with: python -m serving.prefork recommender
     # Run on a different port to avoid conflict with the main UI app
     app.run(port=5001, debug=True)
@@ -0,0 +1,292 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+class RecommenderUnavailable(Exception):
+    """
+    Raised when the recommender cannot be reached, returns an error, or the circuit breaker is open.
+    """
+
+class RecommenderRequestError(RecommenderUnavailable):
+    """
+    Raised when the recommender rejects a request with a 4xx status. The service itself answered,
+    so this does not count towards opening the circuit breaker.
+    """
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        Opens after failure_threshold consecutive failures and rejects calls for reset_timeout seconds.
+        After that a single trial call is let through; its outcome closes or re-opens the circuit.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            return 'closed' if self._opened_at is None else 'open'
+
+class HttpTransport:
+    def __init__(self, base_url, timeout=(1.0, 3.0), retries=2, backoff=0.1, pool_size=20):
+        """
+        Talks to recommender/api.py over one pooled keep-alive Session.
+
+        :param timeout: (connect, read) timeout in seconds applied to every call.
+        :param retries: Retries with exponential backoff. Connection failures are retried for every
+                        method; 502/503/504 responses only for idempotent GET and DELETE.
+        :param pool_size: Keep-alive connections kept open to the API.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET', 'DELETE'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _call(self, method, path, **kwargs):
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+            if 400 <= response.status_code < 500:
+                raise RecommenderRequestError(f"{response.status_code} {response.reason} for {method} {path}")
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # Connection errors, timeouts, 5xx and unreadable bodies: the service is not working.
+            raise RecommenderUnavailable(str(e)) from e
+
+    def initialize(self, user_id, quiz_items):
+        self._call('POST', '/initialize', json={'user_id': user_id, 'quiz_items': quiz_items})
+
+    def get_recommendations(self, user_id):
+        return self._call('GET', f'/recommendations/{user_id}')
+
+    def send_feedback(self, user_id, item_type, feedback_type):
+        self._call('POST', '/feedback', json={'user_id': user_id, 'item_type': item_type, 'feedback_type': feedback_type})
+
+    def delete_user(self, user_id):
+        self._call('DELETE', f'/user/{user_id}')
+
+    def close(self):
+        self.session.close()
+
+class InProcessTransport:
+    def __init__(self, engine=None, feedback_aggregator=None, **engine_kwargs):
+        """
+        Calls a RecommenderEngine directly when the UI and the recommender run in one deployment,
+        skipping HTTP and JSON entirely.
+
+        Without an engine, the engine, its cache and the write-behind feedback buffer are built from the
+        same environment variables recommender/api.py reads (see recommender/factory.py), and every
+        call behaves as the matching API route does.
+
+        :param engine_kwargs: RecommenderEngine arguments that take precedence over the environment.
+        """
+        # The recommender modules import each other by flat name, as when api.py runs from its directory.
+        directory = os.path.dirname(os.path.abspath(__file__))
+        if directory not in sys.path:
+            sys.path.append(directory)
+        if engine is None:
+            from factory import create_cache, create_engine, create_feedback_aggregator
+            engine = create_engine(create_cache(), **engine_kwargs)
+            feedback_aggregator = create_feedback_aggregator(engine)
+        self.engine = engine
+        self.feedback_aggregator = feedback_aggregator
+
+    def initialize(self, user_id, quiz_items):
+        self.engine.initialize_scores_from_quiz(user_id, quiz_items)
+
+    def get_recommendations(self, user_id):
+        if self.feedback_aggregator is not None:
+            self.feedback_aggregator.ensure_fresh(user_id)
+        return self.engine.generate_recommendations(user_id)
+
+    def send_feedback(self, user_id, item_type, feedback_type):
+        from recommender_engine import FEEDBACK_SCORES
+        score_change = FEEDBACK_SCORES.get(feedback_type, 0)
+        if score_change == 0:
+            return
+        if self.feedback_aggregator is not None:
+            self.feedback_aggregator.add(user_id, item_type, score_change)
+        else:
+            self.engine.update_score(user_id, item_type, score_change)
+
+    def delete_user(self, user_id):
+        if self.feedback_aggregator is not None:
+            # Flush first so buffered feedback cannot recreate scores after the delete.
+            self.feedback_aggregator.flush()
+        self.engine.delete_user_history(user_id)
+
+    def close(self):
+        if self.feedback_aggregator is not None:
+            self.feedback_aggregator.close()
+        self.engine.client.close()
+
+class RecommenderClient:
+    def __init__(self, transport, breaker=None, fallback_size=10000, feedback_workers=4):
+        """
+        Resilient access to the recommender for the UI app.
+
+        Every call goes through a circuit breaker. get_recommendations remembers the last good list per
+        user and returns it (or an empty list) while the recommender is failing, instead of raising.
+        Feedback is sent in the background so the UI can redirect at once; a following
+        get_recommendations for the same user waits for that feedback first, so it is never stale.
+        delete_user drops the user's feedback that has not been sent yet and waits for any being sent,
+        so no feedback can recreate scores after the delete.
+
+        :param transport: HttpTransport or InProcessTransport.
+        :param breaker: CircuitBreaker; a default one is created if omitted.
+        :param fallback_size: Users whose last good recommendations are kept for fallback.
+        :param feedback_workers: Threads sending feedback in the background.
+        """
+        self.transport = transport
+        self.breaker = breaker or CircuitBreaker()
+        self.fallback_size = fallback_size
+        self._fallback = OrderedDict()
+        self._pending_feedback = {}
+        # Bumped by delete_user; feedback queued under an older epoch is dropped instead of sent.
+        self._feedback_epochs = {}
+        self._lock = threading.Lock()
+        self._feedback_executor = ThreadPoolExecutor(max_workers=feedback_workers, thread_name_prefix='feedback')
+
+    def _guarded(self, call, *args):
+        if not self.breaker.allow():
+            raise RecommenderUnavailable("Circuit breaker is open.")
+        try:
+            result = call(*args)
+        except RecommenderRequestError:
+            # The recommender answered; a rejected request says nothing about its health.
+            self.breaker.record_success()
+            raise
+        except RecommenderUnavailable:
+            self.breaker.record_failure()
+            raise
+        except Exception as e:
+            # Engine errors from the in-process transport count as failures too.
+            self.breaker.record_failure()
+            raise RecommenderUnavailable(str(e)) from e
+        self.breaker.record_success()
+        return result
+
+    def initialize(self, user_id, quiz_items):
+        self._guarded(self.transport.initialize, user_id, quiz_items)
+
+    def get_recommendations(self, user_id, feedback_wait=2.0):
+        """
+        Returns the user's recommendations, falling back to the last good list when the recommender fails.
+        """
+        with self._lock:
+            pending = self._pending_feedback.get(user_id)
+        if pending is not None:
+            try:
+                pending.result(timeout=feedback_wait)
+            except Exception:
+                pass
+
+        try:
+            recommendations = self._guarded(self.transport.get_recommendations, user_id)
+        except RecommenderUnavailable as e:
+            logger.warning("Error fetching recommendations, serving cached results: %s", e)
+            with self._lock:
+                return self._fallback.get(user_id, [])
+
+        with self._lock:
+            self._fallback[user_id] = recommendations
+            self._fallback.move_to_end(user_id)
+            while len(self._fallback) > self.fallback_size:
+                self._fallback.popitem(last=False)
+        return recommendations
+
+    def send_feedback(self, user_id, item_type, feedback_type):
+        """
+        Queues feedback for background delivery and returns immediately.
+        """
+        def send():
+            # Wait for the user's previous feedback so clicks are applied in order.
+            if previous is not None:
+                wait([previous])
+            try:
+                with self._lock:
+                    cancelled = self._feedback_epochs.get(user_id, 0) != epoch
+                if not cancelled:
+                    self._guarded(self.transport.send_feedback, user_id, item_type, feedback_type)
+            except RecommenderUnavailable as e:
+                logger.warning("Error sending feedback to recommender: %s", e)
+            finally:
+                with self._lock:
+                    if self._pending_feedback.get(user_id) is future:
+                        # Nothing older is still queued, so the epoch is not needed any more.
+                        del self._pending_feedback[user_id]
+                        self._feedback_epochs.pop(user_id, None)
+
+        with self._lock:
+            previous = self._pending_feedback.get(user_id)
+            epoch = self._feedback_epochs.get(user_id, 0)
+            future = self._feedback_executor.submit(send)
+            self._pending_feedback[user_id] = future
+        return future
+
+    def delete_user(self, user_id):
+        """
+        Deletes the user's history. Feedback still queued for the user is dropped, and feedback already
+        being sent is waited for, so it cannot recreate scores after the delete.
+        """
+        with self._lock:
+            pending = self._pending_feedback.get(user_id)
+            if pending is not None:
+                self._feedback_epochs[user_id] = self._feedback_epochs.get(user_id, 0) + 1
+        if pending is not None:
+            # Bounded by the transport's timeouts; the queued sends behind it return without sending.
+            wait([pending])
+        self._guarded(self.transport.delete_user, user_id)
+        with self._lock:
+            self._fallback.pop(user_id, None)
+
+    def close(self):
+        self._feedback_executor.shutdown(wait=True)
+        self.transport.close()
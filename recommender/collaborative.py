@@ -0,0 +1,156 @@
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class CollaborativeIndex:
+    def __init__(self, initial_capacity=1024):
+        """
+        In-memory user x item_type score matrix for collaborative filtering.
+
+        Item types are a small vocabulary (tens of columns), so the matrix is kept dense:
+        one float32 row per user plus an L2-normalized copy used for cosine similarity.
+        Single cells are updated in place as feedback arrives; nothing is rebuilt per request.
+        """
+        self._lock = threading.Lock()
+        self.user_index = {}
+        self.item_index = {}
+        self.item_types = []
+        self._scores = np.zeros((initial_capacity, 8), dtype=np.float32)
+        self._normed = np.zeros_like(self._scores)
+        self._n_users = 0
+        # Row -> user_id. Only ever appended to, so readers can index it without the lock.
+        self._user_ids = []
+
+    def load(self, rows):
+        """
+        Bulk-loads (user_id, item_type, score) triples, e.g. from RecommenderEngine.iter_all_scores().
+        """
+        with self._lock:
+            for user_id, item_type, score in rows:
+                # _row and _col may grow (replace) the arrays, so index only after calling them.
+                row, col = self._row(user_id), self._col(item_type)
+                self._scores[row, col] = score
+            self._normed[:self._n_users] = self._normalize(self._scores[:self._n_users])
+        logger.info("CollaborativeIndex loaded %d users x %d item types.", self._n_users, len(self.item_types))
+
+    def set_score(self, user_id, item_type, score):
+        with self._lock:
+            row = self._row(user_id)
+            self._scores[row, self._col(item_type)] = score
+            self._renormalize(row)
+
+    def add_score(self, user_id, item_type, score_change):
+        with self._lock:
+            row = self._row(user_id)
+            self._scores[row, self._col(item_type)] += score_change
+            self._renormalize(row)
+
+    def remove_user(self, user_id):
+        """
+        Zeroes the user's row. The row is kept so other row indexes stay valid;
+        an all-zero row has zero similarity to everyone.
+        """
+        with self._lock:
+            row = self.user_index.get(user_id)
+            if row is not None:
+                self._scores[row] = 0
+                self._normed[row] = 0
+
+    def neighbours(self, user_id, k=20):
+        """
+        Returns up to k (user_id, similarity) pairs with the highest cosine similarity to user_id.
+        """
+        return self.neighbours_batch([user_id], k)[0]
+
+    def neighbours_batch(self, user_ids, k=20):
+        """
+        Computes top-k neighbours for several users with a single matrix product.
+        """
+        rows = [self.user_index.get(user_id) for user_id in user_ids]
+        known = [row for row in rows if row is not None]
+        if not known:
+            return [[] for _ in user_ids]
+
+        n_users = self._n_users
+        normed = self._normed[:n_users]
+        similarities = normed @ normed[known].T
+        # A user is never their own neighbour.
+        similarities[known, np.arange(len(known))] = -np.inf
+
+        k = min(k, n_users - 1)
+        results = []
+        column = 0
+        user_ids_by_row = self._user_ids
+        for row in rows:
+            if row is None or k <= 0:
+                results.append([])
+                continue
+            sims = similarities[:, column]
+            column += 1
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            results.append([(user_ids_by_row[i], float(sims[i])) for i in top if sims[i] > 0])
+        return results
+
+    def recommend_item_types(self, user_id, k=20, n=5):
+        """
+        Returns up to n item types liked by the user's neighbours that the user has not scored yet,
+        ranked by similarity-weighted neighbour score.
+        """
+        row = self.user_index.get(user_id)
+        if row is None:
+            return []
+        neighbours = self.neighbours(user_id, k)
+        if not neighbours:
+            return []
+
+        neighbour_rows = [self.user_index[neighbour] for neighbour, _ in neighbours]
+        weights = np.array([similarity for _, similarity in neighbours], dtype=np.float32)
+        liked = np.clip(self._scores[neighbour_rows], 0, None)
+        predicted = weights @ liked
+        predicted[self._scores[row] != 0] = 0
+
+        n = min(n, len(predicted))
+        top = np.argsort(-predicted)[:n]
+        return [self.item_types[col] for col in top if predicted[col] > 0]
+
+    def _row(self, user_id):
+        row = self.user_index.get(user_id)
+        if row is None:
+            row = self._n_users
+            if row == self._scores.shape[0]:
+                self._grow(rows=row * 2)
+            self.user_index[user_id] = row
+            self._user_ids.append(user_id)
+            self._n_users += 1
+        return row
+
+    def _col(self, item_type):
+        col = self.item_index.get(item_type)
+        if col is None:
+            col = len(self.item_types)
+            if col == self._scores.shape[1]:
+                self._grow(cols=col * 2)
+            self.item_index[item_type] = col
+            self.item_types.append(item_type)
+        return col
+
+    def _grow(self, rows=None, cols=None):
+        # Arrays are reassigned rather than resized, so readers holding the old arrays stay consistent.
+        rows = rows or self._scores.shape[0]
+        cols = cols or self._scores.shape[1]
+        for name in ('_scores', '_normed'):
+            old = getattr(self, name)
+            new = np.zeros((rows, cols), dtype=np.float32)
+            new[:old.shape[0], :old.shape[1]] = old
+            setattr(self, name, new)
+
+    def _renormalize(self, row):
+        self._normed[row] = self._normalize(self._scores[row:row + 1])[0]
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
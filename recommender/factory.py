@@ -0,0 +1,126 @@
+import atexit
+import logging
+import os
+import re
+import sys
+from recommender_engine import RecommenderEngine
+from feedback_buffer import FeedbackAggregator
+from recommendation_cache import RecommendationCache, MemoryCacheBackend, SharedCacheBackend
+from collaborative import CollaborativeIndex
+
+# The shared observability package lives at the repository root.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.mongo import MongoCommandMetrics
+
+logger = logging.getLogger(__name__)
+
+# Builds the recommender's components from the environment. recommender/api.py and the app's
+# in-process transport (recommender/client.py) both use these, so RECOMMENDER_TRANSPORT=inprocess
+# runs with the same cache, layout, collaborative filtering and write-behind settings as the API.
+
+def serving_workers():
+    # Set by serving/prefork.py; 1 under the development server or inside another process.
+    return int(os.getenv("SERVING_WORKERS", "1"))
+
+def configured_cache_mode():
+    """
+    Recommendation cache: 'memory' for a single worker, 'shared' for several workers on one host, 'off' to disable.
+    Defaults to 'shared' under serving/prefork.py with more than one worker, so feedback handled by one
+    worker invalidates the list every worker serves.
+    """
+    return os.getenv("RECOMMENDATION_CACHE", "shared" if serving_workers() > 1 else "memory")
+
+def create_cache():
+    mode = configured_cache_mode()
+    size = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000"))
+    ttl = float(os.getenv("RECOMMENDATION_CACHE_TTL", "300"))
+    if mode == "shared":
+        return RecommendationCache(SharedCacheBackend(
+            os.getenv("RECOMMENDATION_CACHE_PATH", "recommendation_cache.db"), max_entries=size, ttl=ttl))
+    if mode == "memory":
+        if serving_workers() > 1:
+            logger.warning("RECOMMENDATION_CACHE=memory with several workers: a worker may serve a list "
+                           "that another worker's feedback changed until it expires. Use 'shared'.")
+        return RecommendationCache(MemoryCacheBackend(max_entries=size, ttl=ttl))
+    return None
+
+def create_engine(cache=None, **overrides):
+    """
+    :param cache: RecommendationCache from create_cache(), or None.
+    :param overrides: RecommenderEngine arguments that take precedence over the environment.
+    """
+    # Collaborative filtering keeps every user's score vector in memory; enable with COLLABORATIVE_FILTERING=1.
+    collaborative = CollaborativeIndex() if os.getenv("COLLABORATIVE_FILTERING", "0") == "1" else None
+    if collaborative is not None and serving_workers() > 1:
+        logger.warning("COLLABORATIVE_FILTERING=1 with several workers: each worker loads its own index at start "
+                       "and only applies the feedback it handles, so neighbours drift between workers until "
+                       "they restart.")
+    # Serve lists written by precompute.py when they are younger than PRECOMPUTED_MAX_AGE seconds (unset = live only).
+    precomputed_max_age = os.getenv("PRECOMPUTED_MAX_AGE")
+    settings = dict(
+        mongo_uri=os.getenv("MONGO_URI", "mongodb://localhost:27017/"),
+        cache=cache,
+        layout=os.getenv("SCORE_LAYOUT", "documents"),
+        collaborative=collaborative,
+        precomputed_max_age=float(precomputed_max_age) if precomputed_max_age else None,
+        event_listeners=[MongoCommandMetrics()],
+    )
+    settings.update(overrides)
+    return RecommenderEngine(**settings)
+
+def create_feedback_aggregator(engine):
+    """
+    Optional write-behind mode for feedback: increments are merged in memory and flushed in bulk
+    instead of one upsert per click. Returns None unless FEEDBACK_WRITE_BEHIND=1.
+    """
+    if os.getenv("FEEDBACK_WRITE_BEHIND", "0") != "1":
+        return None
+    base_path = os.getenv("FEEDBACK_LOG_PATH", "feedback.log")
+    worker = os.getenv("SERVING_WORKER")  # set by serving/prefork.py in each worker
+    log_path = base_path
+    if worker is not None:
+        # One log per worker slot; a restarted worker replays the log its predecessor left behind.
+        log_path = f"{base_path}.{worker}"
+    if worker in (None, "0"):
+        replay_orphaned_logs(engine, base_path, worker)
+    aggregator = FeedbackAggregator(
+        engine,
+        log_path=log_path,
+        max_pending=int(os.getenv("FEEDBACK_FLUSH_SIZE", "500")),
+        flush_interval=float(os.getenv("FEEDBACK_FLUSH_INTERVAL", "2.0")),
+        max_staleness=float(os.getenv("FEEDBACK_MAX_STALENESS", "5.0")),
+    )
+    atexit.register(aggregator.close)
+    return aggregator
+
+def orphaned_logs(base_path, worker):
+    """
+    Feedback logs no current process owns: the slots of workers beyond SERVING_WORKERS after a restart
+    with fewer workers, and the unnumbered log of a single-process run under serving/prefork.py (or
+    the reverse, the numbered logs when running as a single process).
+    """
+    directory, name = os.path.split(os.path.abspath(base_path))
+    slots = serving_workers() if worker is not None else 0
+    pattern = re.compile(re.escape(name) + r'(?:\.(\d+))?(?:\.flushing)?')
+    paths = set()
+    for entry in os.listdir(directory):
+        match = pattern.fullmatch(entry)
+        if match is None:
+            continue
+        slot = match.group(1)
+        if (slot is None and worker is not None) or (slot is not None and int(slot) >= slots):
+            paths.add(os.path.join(directory, name if slot is None else f"{name}.{slot}"))
+    return sorted(paths)
+
+def replay_orphaned_logs(engine, base_path, worker):
+    """
+    Writes the feedback left in orphaned logs (see orphaned_logs) through a FeedbackAggregator of their
+    own, so a batch interrupted mid-write is retried under its batch id and applied once. Called by
+    the first worker only. Logs that cannot be written yet are kept for the next start.
+    """
+    for path in orphaned_logs(base_path, worker):
+        aggregator = FeedbackAggregator(engine, log_path=path, flush_interval=3600)
+        aggregator.close()
+        if not os.path.exists(f"{path}.flushing") and os.path.getsize(path) == 0:
+            os.remove(path)
+            logger.info("Replayed orphaned feedback log %s", path)
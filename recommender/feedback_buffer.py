@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class FeedbackAggregator:
+    def __init__(self, engine, log_path='feedback.log', max_pending=500, flush_interval=2.0,
+                 max_staleness=5.0, fsync=True):
+        """
+        Write-behind buffer for feedback score increments.
+
+        Increments are merged in memory per (user_id, item_type) and flushed to the engine
+        as a single bulk write once max_pending keys are waiting or flush_interval seconds pass.
+        Every accepted increment is first appended to a local log, so nothing is lost if the
+        process dies before a flush; the log is replayed on the next start.
+
+        Each flush is written as a batch with its own id, recorded in the rotated log before the write
+        starts. A batch that fails, or whose outcome is unknown because the process died, is retried
+        with the same id, and the engine skips documents that already applied it, so increments are
+        applied exactly once even though the write is delivered at least once.
+
+        Every increment is logged with the time it was accepted, and each key's earliest time is passed
+        to the engine with the batch, which drops the keys of users deleted after that time.
+
+        :param engine: RecommenderEngine that receives the merged increments.
+        :param log_path: Path of the append-only log of accepted increments.
+        :param max_pending: Number of distinct (user_id, item_type) keys that triggers a flush.
+        :param flush_interval: Seconds between background flushes.
+        :param max_staleness: Seconds a user's pending feedback may stay invisible to reads.
+        :param fsync: Whether to fsync the log after every append.
+        """
+        self.engine = engine
+        self.log_path = log_path
+        self.flushing_path = f"{log_path}.flushing"
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.max_staleness = max_staleness
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        # Epoch time of the first increment of each pending key
+        self._buffered_at = {}
+        self._oldest_by_user = {}
+        # (batch_id, increments, buffered_at) of a rotated batch whose write has not succeeded yet.
+        self._unfinished = None
+        self._closed = False
+
+        self._recover()
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='feedback-flusher', daemon=True)
+        self._thread.start()
+        try:
+            self.flush()
+        except Exception as e:
+            # MongoDB may not be reachable yet; the recovered increments stay logged and the
+            # background flusher keeps retrying them.
+            logger.warning("Could not replay feedback from %s yet: %s", self.log_path, e)
+        logger.info("FeedbackAggregator initialized.")
+
+    def add(self, user_id, item_type, score_change):
+        """
+        Records a score increment. Returns once it is durable in the local log.
+        """
+        accepted_at = time.time()
+        record = json.dumps({'user_id': user_id, 'item_type': item_type, 'score_change': score_change,
+                             'at': accepted_at})
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("FeedbackAggregator is closed.")
+            self._log.write(record + '\n')
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+
+            key = (user_id, item_type)
+            self._pending[key] = self._pending.get(key, 0) + score_change
+            self._buffered_at.setdefault(key, accepted_at)
+            self._oldest_by_user.setdefault(user_id, time.monotonic())
+            should_flush = len(self._pending) >= self.max_pending
+
+        if should_flush:
+            self.flush()
+
+    def ensure_fresh(self, user_id):
+        """
+        Flushes pending feedback before a read if the user's oldest pending
+        increment is older than max_staleness.
+        """
+        with self._lock:
+            oldest = self._oldest_by_user.get(user_id)
+        if oldest is not None and time.monotonic() - oldest >= self.max_staleness:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all pending increments to the engine in one bulk write.
+        The current log is rotated aside first and only removed once the write succeeds;
+        a batch that failed before is retried, with its original id, ahead of anything newer.
+        """
+        with self._flush_lock:
+            if self._unfinished is not None:
+                self._apply_unfinished()
+            with self._lock:
+                if not self._pending:
+                    return 0
+                increments, buffered_at = self._pending, self._buffered_at
+                self._pending, self._buffered_at = {}, {}
+                self._oldest_by_user = {}
+                self._log.close()
+                os.replace(self.log_path, self.flushing_path)
+                self._log = open(self.log_path, 'a', encoding='utf-8')
+            self._unfinished = (self._mark_batch(), increments, buffered_at)
+            self._apply_unfinished()
+            return len(increments)
+
+    def _apply_unfinished(self):
+        batch_id, increments, buffered_at = self._unfinished
+        self.engine.apply_score_increments(increments, batch_id=batch_id, buffered_at=buffered_at)
+        os.remove(self.flushing_path)
+        self._unfinished = None
+
+    def _mark_batch(self):
+        """
+        Appends a new batch id to the rotated log, so a restart retries the batch under the same id.
+        """
+        batch_id = uuid.uuid4().hex
+        with open(self.flushing_path, 'a', encoding='utf-8') as outfile:
+            outfile.write(json.dumps({'batch_id': batch_id}) + '\n')
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        return batch_id
+
+    def close(self):
+        """
+        Stops the background flusher and flushes whatever is still pending.
+        Safe to call more than once; registered as the shutdown hook by the API.
+        """
+        if self._closed:
+            return
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("Could not flush feedback on close, it stays in %s for the next start: %s",
+                           self.log_path, e)
+        with self._lock:
+            self._closed = True
+            self._log.close()
+        logger.info("FeedbackAggregator closed.")
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Error flushing feedback: %s", e)
+
+    def _recover(self):
+        """
+        Loads increments left behind by a previous process: a rotated batch becomes the unfinished
+        batch to retry, and the live log becomes pending again. Nothing is written to MongoDB here.
+        """
+        if os.path.exists(self.flushing_path):
+            batch_id, increments, buffered_at = self._read_log(self.flushing_path)
+            if not increments:
+                os.remove(self.flushing_path)
+            else:
+                # Without an id the process died before the batch was marked, so it was never sent.
+                self._unfinished = (batch_id or self._mark_batch(), increments, buffered_at)
+        if os.path.exists(self.log_path):
+            _, self._pending, self._buffered_at = self._read_log(self.log_path, truncate_torn_tail=True)
+            now = time.monotonic()
+            for user_id, _ in self._pending:
+                self._oldest_by_user.setdefault(user_id, now)
+        count = len(self._pending) + (len(self._unfinished[1]) if self._unfinished else 0)
+        if count:
+            logger.info("Recovered %d pending feedback increments from %s", count, self.log_path)
+
+    @staticmethod
+    def _read_log(path, truncate_torn_tail=False):
+        """
+        Returns (batch_id or None, merged increments, earliest accept time per key) of a log file.
+        """
+        batch_id = None
+        increments = {}
+        buffered_at = {}
+        with open(path, 'rb') as infile:
+            data = infile.read()
+        complete = data[:data.rfind(b'\n') + 1]
+        if truncate_torn_tail and len(complete) != len(data):
+            # A torn final line means the append never completed, so it was never acknowledged.
+            # Cut it off so the next append does not run into it.
+            with open(path, 'r+b') as outfile:
+                outfile.truncate(len(complete))
+        for line in complete.decode('utf-8', errors='replace').splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'batch_id' in record:
+                batch_id = record['batch_id']
+                continue
+            key = (record['user_id'], record['item_type'])
+            increments[key] = increments.get(key, 0) + record['score_change']
+            # Records written before accept times were logged count as older than any deletion.
+            buffered_at[key] = min(buffered_at.get(key, record.get('at', 0.0)), record.get('at', 0.0))
+        return batch_id, increments, buffered_at
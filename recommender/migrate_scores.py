@@ -0,0 +1,86 @@
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pymongo import MongoClient, UpdateOne
+from recommender_engine import profile_sync_operations, score_field, seq_field, write_profile_sync
+
+logger = logging.getLogger(__name__)
+
+def migrate(db, batch_size=1000, start_after=None):
+    """
+    Streams user_scores in user_id order and copies every user's scores into their user_profiles document.
+
+    Run the API with SCORE_LAYOUT=dual while this copies data, then switch to SCORE_LAYOUT=compact once
+    it finishes. No write freeze is needed: in the dual layout every user_scores write bumps the
+    document's seq and sets the profile field to the absolute score with that seq, and the copy uses
+    the same rule (see profile_sync_operations), so whichever of the two lands last, the profile keeps
+    the newest score. Users are read again just before each batch is written, so a user deleted earlier
+    is not recreated, and the fields copied for a user deleted while the batch was in flight are removed
+    again. Re-running the migration is safe.
+
+    :param db: The fashion_app database.
+    :param batch_size: Number of users per bulk write.
+    :param start_after: Resume after this user_id (logged as the checkpoint of every batch).
+    :return: Number of users migrated.
+    """
+    query = {'user_id': {'$gt': start_after}} if start_after is not None else {}
+    cursor = db['user_scores'].find(query, {'user_id': 1, '_id': 0}) \
+        .sort([('user_id', 1), ('item_type', 1)]) \
+        .batch_size(batch_size * 10)
+
+    batch = []
+    migrated = 0
+    started = time.monotonic()
+
+    def flush():
+        nonlocal batch, migrated
+        if not batch:
+            return
+        migrated += _copy_users(db, batch)
+        rate = migrated / max(time.monotonic() - started, 1e-9)
+        logger.info("Migrated %d users (%.0f users/sec). Checkpoint: %r", migrated, rate, batch[-1])
+        batch = []
+
+    for doc in cursor:
+        if not batch or doc['user_id'] != batch[-1]:
+            if len(batch) >= batch_size:
+                flush()
+            batch.append(doc['user_id'])
+    flush()
+    logger.info("Migration finished: %d users copied to user_profiles.", migrated)
+    return migrated
+
+def _copy_users(db, user_ids):
+    """
+    Copies the current user_scores documents of user_ids into user_profiles. Returns the number of users copied.
+    """
+    read_started = datetime.now(timezone.utc)
+    docs = list(db['user_scores'].find({'user_id': {'$in': user_ids}},
+                                       {'user_id': 1, 'item_type': 1, 'score': 1, 'seq': 1, '_id': 0}))
+    write_profile_sync(db['user_profiles'], profile_sync_operations(docs))
+
+    # delete_user_history leaves a tombstone before removing scores; undo what was copied from a
+    # read that preceded it. Fields a newer write has replaced since no longer match the seq filter.
+    deleted = {tombstone['_id'] for tombstone in db['user_deletions'].find(
+        {'_id': {'$in': user_ids}, 'deleted_at': {'$gte': read_started}}, {'_id': 1})}
+    undo = [UpdateOne({'_id': doc['user_id'], seq_field(doc['item_type']): doc.get('seq', 0)},
+                      {'$unset': {score_field(doc['item_type']): '', seq_field(doc['item_type']): ''}})
+            for doc in docs if doc['user_id'] in deleted]
+    if undo:
+        db['user_profiles'].bulk_write(undo, ordered=False)
+        db['user_profiles'].delete_many({'_id': {'$in': list(deleted)}, 'scores': {}})
+        logger.info("Removed the copies of %d users deleted during the migration", len(deleted))
+    return len({doc['user_id'] for doc in docs} - deleted)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert user_scores to the compact one-document-per-user layout.")
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--start-after', default=None, help="Resume after this user_id.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+    client = MongoClient(args.mongo_uri)
+    migrate(client['fashion_app'], batch_size=args.batch_size, start_after=args.start_after)
@@ -0,0 +1,150 @@
+import argparse
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from recommender_engine import RecommenderEngine, build_products, item_type_from_field
+
+logger = logging.getLogger(__name__)
+
+JOB_ID = 'precompute_recommendations'
+
+def iter_user_chunks(engine, chunk_size, start_after=None):
+    """
+    Streams users in user_id order as lists of (user_id, [item_type, ...]) with positive scores, highest first.
+    """
+    chunk = []
+    if engine.layout == 'compact':
+        query = {'_id': {'$gt': start_after}} if start_after is not None else {}
+        for profile in engine.user_profiles.find(query, {'scores': 1}).sort('_id', 1).batch_size(chunk_size):
+            scores = [(item_type_from_field(key), score) for key, score in profile.get('scores', {}).items()]
+            chunk.append((profile['_id'], _ranked(scores)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    else:
+        query = {'user_id': {'$gt': start_after}} if start_after is not None else {}
+        cursor = engine.user_scores.find(query, {'user_id': 1, 'item_type': 1, 'score': 1, '_id': 0}) \
+            .sort([('user_id', 1), ('item_type', 1)]) \
+            .batch_size(chunk_size * 10)
+        current_user, scores = None, []
+        for doc in cursor:
+            if doc['user_id'] != current_user:
+                if current_user is not None:
+                    chunk.append((current_user, _ranked(scores)))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+                current_user, scores = doc['user_id'], []
+            scores.append((doc['item_type'], doc['score']))
+        if current_user is not None:
+            chunk.append((current_user, _ranked(scores)))
+    if chunk:
+        yield chunk
+
+def _ranked(scores):
+    return [item_type for item_type, score in sorted(scores, key=lambda pair: pair[1], reverse=True) if score > 0]
+
+def build_chunk(chunk):
+    """
+    Worker entry point: builds the product lists for one chunk of (user_id, item_types, pref_color).
+    Runs in a pool process, so it only touches plain data.
+    Returns the chunk's last user_id (the checkpoint) and the (user_id, products) pairs.
+    """
+    results = [(user_id, build_products(item_types, pref_color)) for user_id, item_types, pref_color in chunk if item_types]
+    return chunk[-1][0], results
+
+def run(engine, chunk_size=1000, workers=None, resume=True):
+    """
+    Precomputes recommendations for every user into the 'recommendations' collection.
+
+    Users are streamed from Mongo in chunks, their lists are built across a process pool and written
+    back with unordered bulk upserts. The last user_id of every written chunk is checkpointed in
+    'recommendation_jobs', so an interrupted run resumes where it stopped.
+    Collaborative-filtering items are not included; they need the live index held by the API.
+
+    Lists are stamped with the time the run started, which is before any of their scores were read.
+    When the API invalidates a user it leaves a tombstone with the invalidation time, and a list is
+    only written over a tombstone older than its stamp. So a list built from scores that changed
+    while the run was going is dropped instead of being served as fresh.
+
+    :return: Number of users written.
+    """
+    jobs = engine.db['recommendation_jobs']
+    checkpoint = jobs.find_one({'_id': JOB_ID}) if resume else None
+    start_after = checkpoint.get('last_user_id') if checkpoint else None
+    if start_after is not None:
+        logger.info("Resuming precompute after user %r", start_after)
+    else:
+        jobs.update_one({'_id': JOB_ID}, {'$set': {'last_user_id': None, 'started_at': time.time()}}, upsert=True)
+
+    def with_colors(chunks):
+        # Colors are fetched per chunk with one $in query instead of one find_one per user.
+        for chunk in chunks:
+            user_ids = [user_id for user_id, _ in chunk]
+            colors = {
+                doc['user_id']: doc.get('color') or 'black'
+                for doc in engine.preferences.find({'user_id': {'$in': user_ids}}, {'user_id': 1, 'color': 1})
+            }
+            yield [(user_id, item_types, colors.get(user_id, 'black')) for user_id, item_types in chunk]
+
+    written = 0
+    skipped = 0
+    started = time.monotonic()
+    generated_at = time.time()
+
+    def write(last_user_id, results):
+        nonlocal written, skipped
+        if results:
+            stale = 0
+            try:
+                engine.recommendations.bulk_write([
+                    UpdateOne({'_id': user_id, 'invalidated_at': {'$not': {'$gte': generated_at}}},
+                              {'$set': {'items': items, 'generated_at': generated_at}}, upsert=True)
+                    for user_id, items in results
+                ], ordered=False)
+            except BulkWriteError as e:
+                # The filter did not match a newer tombstone, so the upsert hit the existing _id.
+                errors = e.details['writeErrors']
+                if any(error['code'] != 11000 for error in errors):
+                    raise
+                stale = len(errors)
+            written += len(results) - stale
+            skipped += stale
+        jobs.update_one({'_id': JOB_ID}, {'$set': {'last_user_id': last_user_id}})
+        rate = written / max(time.monotonic() - started, 1e-9)
+        logger.info("Precomputed %d users (%.0f users/sec)", written, rate)
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Only a few chunks are in flight at once so memory stays bounded, and results are written
+        # in submission order so the checkpoint only ever moves past fully written chunks.
+        in_flight = deque()
+        for chunk in with_colors(iter_user_chunks(engine, chunk_size, start_after)):
+            in_flight.append(pool.submit(build_chunk, chunk))
+            if len(in_flight) >= workers * 2:
+                write(*in_flight.popleft().result())
+        while in_flight:
+            write(*in_flight.popleft().result())
+
+    jobs.update_one({'_id': JOB_ID}, {'$set': {'last_user_id': None, 'finished_at': time.time()}})
+    elapsed = time.monotonic() - started
+    logger.info("Precompute finished: %d users in %.1fs (%.0f users/sec), %d skipped because their scores "
+                "changed during the run", written, elapsed, written / max(elapsed, 1e-9), skipped)
+    return written
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute recommendations for every user.")
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--layout', default=os.getenv("SCORE_LAYOUT", "documents"))
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and start from the first user.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+    engine = RecommenderEngine(args.mongo_uri, layout=args.layout)
+    run(engine, chunk_size=args.chunk_size, workers=args.workers, resume=not args.restart)
@@ -0,0 +1,206 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Invalidations are remembered this long, so a list whose computation started before one is not
+# stored after it. A set() whose read started longer ago than this is skipped.
+INVALIDATION_WINDOW = 60.0
+
+class MemoryCacheBackend:
+    def __init__(self, max_entries=10000, ttl=300):
+        """
+        In-process LRU+TTL store. Suitable when a single worker serves the API.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        # key -> time.time() of its last invalidation, oldest first
+        self._invalidated = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, since=None):
+        """
+        Stores value. With since (a time.time() taken before value was computed), nothing is stored
+        if the key was invalidated at or after it.
+        """
+        with self._lock:
+            if since is not None and _stale(since, self._invalidated.get(key)):
+                return False
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        now = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._invalidated[key] = now
+            self._invalidated.move_to_end(key)
+            while self._invalidated and next(iter(self._invalidated.values())) < now - INVALIDATION_WINDOW:
+                self._invalidated.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _stale(since, invalidated_at):
+    return since < time.time() - INVALIDATION_WINDOW or (invalidated_at is not None and invalidated_at >= since)
+
+
+class SharedCacheBackend:
+    def __init__(self, path='recommendation_cache.db', max_entries=100000, ttl=300):
+        """
+        LRU+TTL store in a local SQLite file, so several worker processes on one
+        host share entries and see each other's invalidations.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._writes = 0
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS recommendations ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS recommendations_last_used ON recommendations (last_used)")
+        # Last invalidation time per key, kept for INVALIDATION_WINDOW seconds
+        conn.execute("CREATE TABLE IF NOT EXISTS invalidations (key TEXT PRIMARY KEY, invalidated_at REAL NOT NULL)")
+        conn.commit()
+
+    def _conn(self):
+        # SQLite connections cannot be shared between threads, so each thread opens its own.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at FROM recommendations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] < now:
+            conn.execute("DELETE FROM recommendations WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE recommendations SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, since=None):
+        """
+        Stores value. With since (a time.time() taken before value was computed), nothing is stored
+        if any process invalidated the key at or after it; the check and the write are one statement.
+        """
+        conn = self._conn()
+        now = time.time()
+        if since is None:
+            conn.execute(
+                "INSERT OR REPLACE INTO recommendations (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now)
+            )
+        elif since < now - INVALIDATION_WINDOW:
+            return False
+        else:
+            written = conn.execute(
+                "INSERT OR REPLACE INTO recommendations (key, value, expires_at, last_used) SELECT ?, ?, ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM invalidations WHERE key = ? AND invalidated_at >= ?)",
+                (key, json.dumps(value), now + self.ttl, now, key, since)
+            ).rowcount
+            if not written:
+                return False
+        # Counting rows is a scan, so the size bound is only enforced every 100 writes.
+        self._writes += 1
+        if self._writes % 100:
+            return True
+        conn.execute("DELETE FROM invalidations WHERE invalidated_at < ?", (now - INVALIDATION_WINDOW,))
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM recommendations WHERE key IN "
+                "(SELECT key FROM recommendations ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            )
+        return True
+
+    def delete(self, key):
+        conn = self._conn()
+        # Recorded before the entry goes, so a set() racing with this one either lands first and is
+        # deleted, or sees the invalidation and is skipped.
+        conn.execute("INSERT OR REPLACE INTO invalidations (key, invalidated_at) VALUES (?, ?)", (key, time.time()))
+        conn.execute("DELETE FROM recommendations WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM recommendations")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM recommendations").fetchone()[0]
+
+
+class RecommendationCache:
+    def __init__(self, backend=None):
+        """
+        Caches generated recommendation lists per user and counts hits and misses.
+        The engine invalidates a user's entry whenever their scores change, and passes the time it
+        started reading to set(), so a list computed from scores that changed meanwhile is not stored.
+        """
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.hits = 0
+        self.misses = 0
+        # `+= 1` is a read-modify-write; request threads would lose counts without it.
+        self._stats_lock = threading.Lock()
+
+    def get(self, user_id):
+        value = self.backend.get(str(user_id))
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, user_id, recommendations, since=None):
+        """
+        Returns False when the entry was not stored because the user was invalidated at or after since.
+        """
+        return self.backend.set(str(user_id), recommendations, since=since)
+
+    def invalidate(self, user_id):
+        self.backend.delete(str(user_id))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'size': len(self.backend),
+        }
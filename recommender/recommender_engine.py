@@ -1,31 +1,233 @@
-from pymongo import MongoClient
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Storage layouts for user scores:
+# - 'documents': one document per (user_id, item_type) in user_scores (the original layout).
+# - 'compact':   one document per user in user_profiles, {'_id': user_id, 'scores': {item_type: score}}.
+# - 'dual':      reads from user_scores, writes to both; used while migrate_scores.py copies existing data.
+#                Every user_scores write bumps the document's 'seq', and the profile field is set to the
+#                document's absolute score together with that seq, skipping the write when the profile
+#                already holds a newer one. migrate_scores.py copies with the same rule, so live writes and
+#                the copy can interleave in any order and the newest value of each score wins.
+SCORE_LAYOUTS = ('documents', 'compact', 'dual')
+
+# Score change for each kind of feedback from the recommendations page.
+FEEDBACK_SCORES = {
+    'see_more': 1,
+    'less_of_this_type': -1,
+    'delete': -2, # 'delete' is a strong negative signal
+}
+
+# Batch ids remembered per score document by apply_score_increments(batch_id=...). Only the batch
+# being retried can repeat, so a short history is enough.
+APPLIED_BATCHES_KEPT = 8
+
+# How long a deleted user's tombstone is kept in user_deletions. Buffered feedback older than the
+# deletion is dropped while it exists, so this bounds how long a feedback log may wait to be replayed.
+DELETION_TOMBSTONE_SECONDS = 7 * 24 * 3600
+
+def score_field(item_type):
+    """
+    Returns the nested field path for an item type in the compact layout.
+    '.' and a leading '$' are not allowed in field names, so they are replaced with full-width lookalikes.
+    """
+    return f'scores.{_field_key(item_type)}'
+
+def seq_field(item_type):
+    """
+    Returns the path of the user_scores seq copied alongside a score in the dual layout.
+    """
+    return f'seqs.{_field_key(item_type)}'
+
+def _field_key(item_type):
+    key = item_type.replace('.', '\uff0e')
+    if key.startswith('$'):
+        key = '\uff04' + key[1:]
+    return key
+
+def item_type_from_field(key):
+    """
+    Reverses the escaping done by score_field for a key of the 'scores' map.
+    """
+    if key.startswith('\uff04'):
+        key = '$' + key[1:]
+    return key.replace('\uff0e', '.')
+
+def profile_sync_operations(docs):
+    """
+    Builds the upserts that copy user_scores documents ({'user_id', 'item_type', 'score', 'seq'}) into
+    user_profiles. Each one only matches while the profile holds an older seq for that item type.
+    """
+    operations = []
+    for doc in docs:
+        seq = doc.get('seq', 0)
+        seq_key = seq_field(doc['item_type'])
+        operations.append(UpdateOne(
+            {'_id': doc['user_id'], '$or': [{seq_key: {'$lt': seq}}, {seq_key: {'$exists': False}}]},
+            {'$set': {score_field(doc['item_type']): doc['score'], seq_key: seq}},
+            upsert=True))
+    return operations
+
+def write_profile_sync(profiles, operations):
+    """
+    Runs profile_sync_operations against user_profiles. An upsert whose filter did not match a profile
+    holding a newer seq fails on the duplicate _id, which is the expected outcome. An upsert that lost
+    a race to create the profile fails the same way, so duplicates are retried once against the
+    profile that now exists.
+    """
+    for _ in range(2):
+        if not operations:
+            return
+        try:
+            profiles.bulk_write(operations, ordered=False)
+            return
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            if any(error['code'] != 11000 for error in errors):
+                raise
+            operations = [operations[error['index']] for error in errors]
+
+def build_products(item_types, pref_color):
+    """
+    Turns ranked item types into product entries in the user's preferred color.
+    Module-level so the batch precompute workers can use it without an engine.
+    """
+    recommended_products = []
+    for item_type in item_types:
+        # For simplicity, we create mock product data. In a real system, this would
+        # query a product catalog for available items of this type and color.
+        recommended_products.append({
+            "name": f"{pref_color.capitalize()} {item_type.capitalize()}",
+            "type": item_type,
+            "color": pref_color,
+            "image_url": "https://via.placeholder.com/200" # Placeholder image
+        })
+    return recommended_products
 
 class RecommenderEngine:
-    def __init__(self, mongo_uri='mongodb://localhost:27017/'):
+    def __init__(self, mongo_uri='mongodb://localhost:27017/', cache=None, layout='documents', collaborative=None,
+                 precomputed_max_age=None, event_listeners=None):
         """
         Initializes the recommendation engine and connects to MongoDB.
+        An optional RecommendationCache keeps generated lists until the user's scores change.
+        layout selects how scores are stored, see SCORE_LAYOUTS.
+        An optional CollaborativeIndex is loaded from the stored scores and kept in sync with every write.
+        When precomputed_max_age is set (seconds), lists written by precompute.py are served if they are
+        younger than that, and a user's list is dropped as soon as their scores change.
+        event_listeners are passed to the MongoClient, e.g. a MongoCommandMetrics for latency histograms.
         """
-        self.client = MongoClient(mongo_uri)
+        if layout not in SCORE_LAYOUTS:
+            raise ValueError(f"Unknown score layout '{layout}'. Expected one of {SCORE_LAYOUTS}.")
+        self.client = MongoClient(mongo_uri, event_listeners=event_listeners or [])
         self.db = self.client['fashion_app']
         self.preferences = self.db['preferences']
         # A new collection to store user scores for item types
         self.user_scores = self.db['user_scores']
-        print("RecommenderEngine initialized.")
+        # One document per user holding the full score map (compact layout)
+        self.user_profiles = self.db['user_profiles']
+        # Materialized lists written by the offline precompute job
+        self.recommendations = self.db['recommendations']
+        # {'_id': user_id, 'deleted_at'} for recently deleted users, see apply_score_increments
+        self.user_deletions = self.db['user_deletions']
+        self.precomputed_max_age = precomputed_max_age
+        self.layout = layout
+        self.cache = cache
+        self.ensure_indexes()
+        self.collaborative = collaborative
+        if collaborative is not None:
+            collaborative.load(self.iter_all_scores())
+        logger.info("RecommenderEngine initialized (layout=%s).", layout)
+
+    def ensure_indexes(self):
+        """
+        Creates the indexes used by both layouts. create_index is a no-op when the index already exists,
+        so this is safe to run on every startup. The compact layout only needs the built-in _id index.
+        """
+        # Serves the per-user find({'user_id', 'score': {'$gt': 0}}).sort('score', -1) without a collection scan.
+        self.user_scores.create_index([('user_id', 1), ('score', -1)], name='user_id_score')
+        # Serves the (user_id, item_type) upserts and the streaming migration's sort.
+        self.user_scores.create_index([('user_id', 1), ('item_type', 1)], name='user_id_item_type')
+        self.preferences.create_index([('user_id', 1)], name='user_id')
+        self.user_deletions.create_index([('deleted_at', 1)], name='deleted_at_ttl',
+                                         expireAfterSeconds=DELETION_TOMBSTONE_SECONDS)
 
     def initialize_scores_from_quiz(self, user_id, quiz_items):
         """
         Sets the initial scores for a user based on their quiz answers.
         This gives a starting score of 1 to each preferred item type.
+        All items are written in a single unordered bulk write instead of one round trip per item.
         """
-        for item_type in quiz_items:
-            # Using update_one with upsert ensures that we don't create duplicate scores
-            # if this is ever called multiple times. It sets the initial score to 1.
-            self.user_scores.update_one(
-                {'user_id': user_id, 'item_type': item_type},
-                {'$set': {'score': 1}},
-                upsert=True
-            )
-        print(f"Initialized scores for user {user_id} with items: {quiz_items}")
+        self._write(self._quiz_operations(user_id, quiz_items))
+        self._sync_profiles([user_id])
+        self._set_collaborative_scores(user_id, quiz_items)
+        self._invalidate(user_id)
+        logger.debug("Initialized scores for user %s with items: %s", user_id, quiz_items)
+
+    def initialize_scores_bulk(self, records, batch_size=1000):
+        """
+        Initializes scores for many users at once.
+        Expects an iterable of {'user_id', 'quiz_items'} records and flushes them
+        as unordered bulk writes of at most batch_size operations.
+        Returns the number of users initialized.
+        """
+        operations = {}
+        pending = 0
+        user_count = 0
+        user_ids = []
+        for record in records:
+            for name, ops in self._quiz_operations(record['user_id'], record['quiz_items']).items():
+                operations.setdefault(name, []).extend(ops)
+                pending += len(ops)
+            self._set_collaborative_scores(record['user_id'], record['quiz_items'])
+            user_ids.append(record['user_id'])
+            user_count += 1
+            if pending >= batch_size:
+                self._write(operations)
+                self._sync_profiles(user_ids)
+                self._invalidate(*user_ids)
+                operations = {}
+                pending = 0
+                user_ids = []
+
+        self._write(operations)
+        self._sync_profiles(user_ids)
+        self._invalidate(*user_ids)
+        logger.info("Initialized scores for %d users in bulk", user_count)
+        return user_count
+
+    def _quiz_operations(self, user_id, quiz_items):
+        """
+        Builds the upsert operations that set a score of 1 for each quiz item, keyed by collection name.
+        Using upserts ensures that we don't create duplicate scores if this is ever called multiple times.
+        """
+        item_types = list(dict.fromkeys(quiz_items))
+        operations = {}
+        if self.layout != 'compact':
+            update = {'$set': {'score': 1}}
+            if self.layout == 'dual':
+                update['$inc'] = {'seq': 1}
+            operations['user_scores'] = [
+                UpdateOne(
+                    {'user_id': user_id, 'item_type': item_type},
+                    update,
+                    upsert=True
+                )
+                for item_type in item_types
+            ]
+        if self.layout == 'compact' and item_types:
+            operations['user_profiles'] = [
+                UpdateOne(
+                    {'_id': user_id},
+                    {'$set': {score_field(item_type): 1 for item_type in item_types}},
+                    upsert=True
+                )
+            ]
+        return operations
 
     def update_score(self, user_id, item_type, score_change):
         """
@@ -33,12 +235,184 @@ class RecommenderEngine:
         A positive score_change indicates a positive interaction (e.g., 'see more').
         A negative score_change indicates a negative interaction (e.g., 'less of this type').
         """
-        self.user_scores.update_one(
-            {'user_id': user_id, 'item_type': item_type},
-            {'$inc': {'score': score_change}},
-            upsert=True
-        )
-        print(f"Updated score for user {user_id}, item_type {item_type} by {score_change}")
+        if self.layout == 'dual':
+            doc = self.user_scores.find_one_and_update(
+                {'user_id': user_id, 'item_type': item_type},
+                {'$inc': {'score': score_change, 'seq': 1}},
+                projection={'user_id': 1, 'item_type': 1, 'score': 1, 'seq': 1, '_id': 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            write_profile_sync(self.user_profiles, profile_sync_operations([doc]))
+        elif self.layout == 'documents':
+            self.user_scores.update_one(
+                {'user_id': user_id, 'item_type': item_type},
+                {'$inc': {'score': score_change}},
+                upsert=True
+            )
+        else:
+            self.user_profiles.update_one(
+                {'_id': user_id},
+                {'$inc': {score_field(item_type): score_change}},
+                upsert=True
+            )
+        if self.collaborative is not None:
+            self.collaborative.add_score(user_id, item_type, score_change)
+        self._invalidate(user_id)
+        logger.debug("Updated score for user %s, item_type %s by %s", user_id, item_type, score_change)
+
+    def apply_score_increments(self, increments, batch_id=None, buffered_at=None):
+        """
+        Applies many score changes in one unordered bulk write.
+        Expects a mapping of (user_id, item_type) -> score_change, as produced by the feedback aggregator.
+
+        With a batch_id the write is idempotent: every updated document records the ids of the last
+        APPLIED_BATCHES_KEPT batches that changed it and skips a batch it has already seen, so a batch
+        whose write failed part-way (or whose acknowledgement was lost) can be retried with the same id.
+
+        buffered_at maps each key to the epoch time its first increment was accepted. Increments of a
+        user deleted since then (by any process, see delete_user_history) are dropped, so feedback
+        buffered by another worker cannot recreate a deleted user's scores.
+        """
+        increments = {key: change for key, change in increments.items() if change != 0}
+        if buffered_at is not None:
+            started = datetime.now(timezone.utc)
+            increments = self._drop_deleted(increments, buffered_at)
+        guard = {} if batch_id is None else {'applied_batches': {'$ne': batch_id}}
+
+        def update(fields):
+            if batch_id is None:
+                return {'$inc': fields}
+            return {'$inc': fields, '$push': {'applied_batches': {'$each': [batch_id], '$slice': -APPLIED_BATCHES_KEPT}}}
+
+        # The guarded update cannot upsert: a document that already saw the batch would not match
+        # the filter and a duplicate would be inserted. Missing documents are created first instead.
+        upsert = batch_id is None
+        ensure = {}
+        operations = {}
+        if self.layout != 'compact':
+            keys = [{'user_id': user_id, 'item_type': item_type} for user_id, item_type in increments]
+            if not upsert:
+                ensure['user_scores'] = [UpdateOne(key, {'$setOnInsert': {'score': 0}}, upsert=True) for key in keys]
+            seq = {'seq': 1} if self.layout == 'dual' else {}
+            operations['user_scores'] = [
+                UpdateOne(dict(key, **guard), update({'score': score_change, **seq}), upsert=upsert)
+                for key, score_change in zip(keys, increments.values())
+            ]
+        if self.layout == 'compact':
+            # All of a user's changes go into a single $inc on their profile document.
+            by_user = {}
+            for (user_id, item_type), score_change in increments.items():
+                by_user.setdefault(user_id, {})[score_field(item_type)] = score_change
+            if not upsert:
+                ensure['user_profiles'] = [UpdateOne({'_id': user_id}, {'$setOnInsert': {'scores': {}}}, upsert=True)
+                                           for user_id in by_user]
+            operations['user_profiles'] = [
+                UpdateOne(dict({'_id': user_id}, **guard), update(fields), upsert=upsert)
+                for user_id, fields in by_user.items()
+            ]
+        self._write(ensure)
+        self._write(operations)
+        self._sync_profiles({user_id for user_id, _ in increments})
+        if self.collaborative is not None:
+            if batch_id is None:
+                for (user_id, item_type), score_change in increments.items():
+                    self.collaborative.add_score(user_id, item_type, score_change)
+            else:
+                # Part of a retried batch may have been skipped, so take the stored totals instead.
+                self._refresh_collaborative(increments)
+        if buffered_at is not None:
+            # A delete that ran between the tombstone check and the write: remove what was just recreated.
+            for user_id in self._deleted_users({user_id for user_id, _ in increments}, buffered_at, since=started):
+                self._delete_scores(user_id)
+                if self.collaborative is not None:
+                    self.collaborative.remove_user(user_id)
+        self._invalidate(*{user_id for user_id, _ in increments})
+        logger.debug("Applied %d score increments in bulk", len(increments))
+
+    def _deleted_users(self, user_ids, buffered_at, since=None):
+        """
+        Returns the users among user_ids with a tombstone newer than one of their buffered increments.
+        """
+        query = {'_id': {'$in': list(user_ids)}}
+        if since is not None:
+            query['deleted_at'] = {'$gte': since}
+        deleted = {}
+        for tombstone in self.user_deletions.find(query):
+            deleted_at = tombstone['deleted_at']
+            if deleted_at.tzinfo is None:
+                deleted_at = deleted_at.replace(tzinfo=timezone.utc)
+            deleted[tombstone['_id']] = deleted_at.timestamp()
+        return {user_id for (user_id, _), at in buffered_at.items()
+                if user_id in deleted and at <= deleted[user_id]}
+
+    def _drop_deleted(self, increments, buffered_at):
+        deleted = self._deleted_users({user_id for user_id, _ in increments}, buffered_at)
+        if deleted:
+            logger.info("Dropping buffered feedback of %d users deleted after it was given", len(deleted))
+        return {key: change for key, change in increments.items() if key[0] not in deleted}
+
+    def _refresh_collaborative(self, keys):
+        """
+        Copies the stored scores of the given (user_id, item_type) pairs into the collaborative index.
+        """
+        user_ids = list({user_id for user_id, _ in keys})
+        stored = {}
+        if self.layout == 'compact':
+            for profile in self.user_profiles.find({'_id': {'$in': user_ids}}, {'scores': 1}):
+                for key, score in profile.get('scores', {}).items():
+                    stored[(profile['_id'], item_type_from_field(key))] = score
+        else:
+            for doc in self.user_scores.find({'user_id': {'$in': user_ids}}, {'user_id': 1, 'item_type': 1, 'score': 1, '_id': 0}):
+                stored[(doc['user_id'], doc['item_type'])] = doc['score']
+        for user_id, item_type in keys:
+            self.collaborative.set_score(user_id, item_type, stored.get((user_id, item_type), 0))
+
+    def _sync_profiles(self, user_ids):
+        """
+        In the dual layout, copies the users' current user_scores documents into their profiles.
+        """
+        if self.layout != 'dual' or not user_ids:
+            return
+        docs = self.user_scores.find({'user_id': {'$in': list(user_ids)}},
+                                     {'user_id': 1, 'item_type': 1, 'score': 1, 'seq': 1, '_id': 0})
+        write_profile_sync(self.user_profiles, profile_sync_operations(docs))
+
+    def _write(self, operations):
+        """
+        Runs one unordered bulk write per collection for a {collection_name: [operations]} mapping.
+        """
+        for name, ops in operations.items():
+            if ops:
+                self.db[name].bulk_write(ops, ordered=False)
+
+    def iter_all_scores(self):
+        """
+        Streams every stored (user_id, item_type, score) triple, used to load the collaborative index.
+        """
+        if self.layout == 'compact':
+            for profile in self.user_profiles.find({}, {'scores': 1}):
+                for key, score in profile.get('scores', {}).items():
+                    yield profile['_id'], item_type_from_field(key), score
+        else:
+            for doc in self.user_scores.find({}, {'user_id': 1, 'item_type': 1, 'score': 1, '_id': 0}):
+                yield doc['user_id'], doc['item_type'], doc['score']
+
+    def get_scores(self, user_id):
+        """
+        Returns the user's positive scores as (item_type, score) pairs, highest first.
+        """
+        if self.layout == 'compact':
+            profile = self.user_profiles.find_one({'_id': user_id}, {'scores': 1})
+            scores = profile.get('scores', {}) if profile else {}
+            positive = [(item_type_from_field(key), score) for key, score in scores.items() if score > 0]
+            return sorted(positive, key=lambda pair: pair[1], reverse=True)
+
+        user_scores_cursor = self.user_scores.find(
+            {'user_id': user_id, 'score': {'$gt': 0}},
+            {'item_type': 1, 'score': 1, '_id': 0}
+        ).sort('score', -1)
+        return [(doc['item_type'], doc['score']) for doc in user_scores_cursor]
 
     def generate_recommendations(self, user_id):
         """
@@ -46,53 +420,114 @@ class RecommenderEngine:
 
         This is a simplified hybrid model:
         - Content-Based: It recommends items based on the user's highest-scored item types.
-        - Collaborative (Placeholder): In a real system, we would also find users with similar
-          taste profiles (scores) and recommend items they liked. This part is not implemented
-          due to the need for a larger user-item interaction dataset.
+        - Collaborative: When a CollaborativeIndex is configured, it finds users with similar
+          taste profiles (cosine similarity of score vectors) and appends item types they liked.
+
+        Results are served from the cache when one is configured, then from a fresh
+        precomputed list, and only generated live when neither has one. A list is only cached if the
+        user was not invalidated (by this or any other worker) after its scores started being read.
         """
-        # Fetch user's scores and sort by score descending
-        user_scores_cursor = self.user_scores.find({'user_id': user_id, 'score': {'$gt': 0}}).sort('score', -1)
+        read_started = time.time()
+        if self.cache is not None:
+            cached = self.cache.get(user_id)
+            if cached is not None:
+                return cached
 
-        top_item_types = [doc['item_type'] for doc in user_scores_cursor]
+        if self.precomputed_max_age is not None:
+            precomputed = self.get_precomputed_recommendations(user_id)
+            if precomputed is not None:
+                if self.cache is not None:
+                    self.cache.set(user_id, precomputed, since=read_started)
+                return precomputed
+
+        # Fetch user's scores sorted by score descending
+        top_item_types = [item_type for item_type, _ in self.get_scores(user_id)]
 
         if not top_item_types:
-            print(f"No positive scores found for user {user_id}. Cannot generate recommendations.")
+            logger.debug("No positive scores found for user %s. Cannot generate recommendations.", user_id)
             return []
 
         # Fetch the user's general color preference from the quiz data
         user_prefs = self.preferences.find_one({'user_id': user_id})
         pref_color = user_prefs.get('color', 'black') if user_prefs else 'black'
 
-        # --- Collaborative Filtering Placeholder ---
-        # In a real system, you would do something like this:
-        # 1. Find a set of 'similar_users' to the current user based on their score vectors.
-        # 2. Get the items liked by these similar users.
-        # 3. Filter out items the current user has already interacted with.
-        # 4. Combine these collaboratively-filtered items with the content-based items below.
-        # For now, we will stick to the content-based approach.
+        # --- Collaborative Filtering ---
+        # Item types liked by users with similar score vectors, which this user has not scored yet.
+        # They are blended in after the content-based types.
+        if self.collaborative is not None:
+            for item_type in self.collaborative.recommend_item_types(user_id):
+                if item_type not in top_item_types:
+                    top_item_types.append(item_type)
 
         # --- Content-Based Recommendation Generation ---
-        recommended_products = []
-        for item_type in top_item_types:
-            # For simplicity, we create mock product data. In a real system, this would
-            # query a product catalog for available items of this type and color.
-            recommended_products.append({
-                "name": f"{pref_color.capitalize()} {item_type.capitalize()}",
-                "type": item_type,
-                "color": pref_color,
-                "image_url": "https://via.placeholder.com/200" # Placeholder image
-            })
-
-        print(f"Generated {len(recommended_products)} recommendations for user {user_id}")
+        recommended_products = build_products(top_item_types, pref_color)
+
+        if self.cache is not None:
+            self.cache.set(user_id, recommended_products, since=read_started)
+        logger.debug("Generated %d recommendations for user %s", len(recommended_products), user_id)
         return recommended_products
 
+    def get_precomputed_recommendations(self, user_id):
+        """
+        Returns the materialized list for a user with a single _id lookup,
+        or None if there is none or it is older than precomputed_max_age.
+        """
+        doc = self.recommendations.find_one({'_id': user_id}, {'items': 1, 'generated_at': 1})
+        if doc is None or 'items' not in doc or time.time() - doc['generated_at'] > self.precomputed_max_age:
+            return None
+        return doc['items']
+
     def delete_user_history(self, user_id):
         """
         Deletes all score history for a given user.
+        Returns the number of score entries removed.
+
+        A tombstone in user_deletions is written first, so feedback that other workers buffered
+        before this call is dropped when they flush it (see apply_score_increments).
+        """
+        # BSON dates keep milliseconds; round up so feedback accepted earlier in the same millisecond still counts as older.
+        deleted_at = datetime.now(timezone.utc) + timedelta(milliseconds=1)
+        self.user_deletions.update_one({'_id': user_id}, {'$set': {'deleted_at': deleted_at}}, upsert=True)
+        deleted_count = self._delete_scores(user_id)
+        if self.collaborative is not None:
+            self.collaborative.remove_user(user_id)
+        self._invalidate(user_id)
+        logger.info("Deleted %d score entries for user %s", deleted_count, user_id)
+        return deleted_count
+
+    def _delete_scores(self, user_id):
+        deleted_count = 0
+        if self.layout != 'documents':
+            profile = self.user_profiles.find_one_and_delete({'_id': user_id})
+            deleted_count = len(profile.get('scores', {})) if profile else 0
+        if self.layout != 'compact':
+            deleted_count = self.user_scores.delete_many({'user_id': user_id}).deleted_count
+        return deleted_count
+
+    def _set_collaborative_scores(self, user_id, quiz_items):
+        if self.collaborative is not None:
+            for item_type in dict.fromkeys(quiz_items):
+                self.collaborative.set_score(user_id, item_type, 1)
+
+    def _invalidate(self, *user_ids):
+        """
+        Drops cached and precomputed lists for users whose scores changed.
         """
-        result = self.user_scores.delete_many({'user_id': user_id})
-        print(f"Deleted {result.deleted_count} score entries for user {user_id}")
-        return result.deleted_count
+        if not user_ids:
+            return
+        if self.cache is not None:
+            for user_id in user_ids:
+                self.cache.invalidate(user_id)
+        if self.precomputed_max_age is not None:
+            # A tombstone rather than a delete: precompute.py may already have read the old scores,
+            # and must not write its list back over a newer invalidation.
+            invalidated_at = time.time()
+            self.recommendations.bulk_write([
+                UpdateOne({'_id': user_id},
+                          {'$set': {'invalidated_at': invalidated_at}, '$unset': {'items': '', 'generated_at': ''}},
+                          upsert=True)
+                for user_id in user_ids
+            ], ordered=False)
 
 if __name__ == '__main__':
     # Example usage (for testing purposes)
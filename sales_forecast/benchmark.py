@@ -0,0 +1,57 @@
+import argparse
+import os
+import time
+import numpy as np
+from forecaster import DemandForecaster, SEASON_LENGTH
+
+def synthetic_demand(series, days, seed=0):
+    """
+    Poisson daily demand with a per-series base rate, linear trend and weekly pattern.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(days)
+    base = rng.gamma(2.0, 5.0, size=(series, 1))
+    trend = rng.normal(0, 0.01, size=(series, 1)) * base
+    weekly = 1 + 0.3 * np.sin(2 * np.pi * (t + rng.integers(0, SEASON_LENGTH, size=(series, 1))) / SEASON_LENGTH)
+    return rng.poisson(np.maximum((base + trend * t) * weekly, 0)).astype(np.float64)
+
+def benchmark(series=10000, days=365, workers=(1, os.cpu_count()), new_days=7):
+    """
+    Times a full fit per worker count and an incremental update with new_days of data.
+    The holdout error compares the forecast of the last new_days with what actually happened.
+
+    :return: {'fit': {workers: series_per_sec}, 'update_series_per_sec', 'holdout_mae', 'naive_mae'}
+    """
+    demand = synthetic_demand(series, days + new_days)
+    history, recent = demand[:, :days], demand[:, days:]
+    keys = [(f"item{i}", 'any') for i in range(series)]
+    first_day = 19000
+
+    report = {'fit': {}}
+    for count in workers:
+        forecaster = DemandForecaster()
+        report['fit'][count] = forecaster.fit(keys, first_day, history, workers=count)
+
+    prediction = forecaster.forecast(new_days)
+    report['holdout_mae'] = float(np.abs(prediction - recent).mean())
+    # Baseline: repeat the mean of the last week
+    report['naive_mae'] = float(np.abs(history[:, -SEASON_LENGTH:].mean(axis=1, keepdims=True) - recent).mean())
+
+    started = time.perf_counter()
+    forecaster.update(keys, first_day + days, recent)
+    report['update_series_per_sec'] = series / max(time.perf_counter() - started, 1e-9)
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Series fitted per second by the batched demand forecaster.")
+    parser.add_argument('--series', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()])
+    args = parser.parse_args()
+
+    results = benchmark(args.series, args.days, tuple(args.workers))
+    print(f"{'workers':<10}{'series/sec':>12}")
+    for count, rate in results['fit'].items():
+        print(f"{count:<10}{rate:>12.0f}")
+    print(f"Incremental update: {results['update_series_per_sec']:.0f} series/sec")
+    print(f"Holdout MAE: {results['holdout_mae']:.2f} (last-week mean: {results['naive_mae']:.2f})")
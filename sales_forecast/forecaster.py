@@ -0,0 +1,296 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+
+# Reviews are mapped onto the quiz's item types with the same keywords the trend aggregator uses.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trend_analysis.trend_aggregator import ITEM_TYPES
+
+logger = logging.getLogger(__name__)
+
+COLORS = ('red', 'blue', 'green', 'black')
+
+SEASON_LENGTH = 7
+# Candidate (alpha, beta, gamma) smoothing parameters. Every series is run with all of them at once
+# and keeps the one with the lowest one-step-ahead squared error.
+PARAMETER_GRID = np.array([
+    (alpha, beta, gamma)
+    for alpha in (0.05, 0.1, 0.2, 0.4, 0.7)
+    for beta in (0.0, 0.02, 0.1)
+    for gamma in (0.0, 0.1, 0.3)
+], dtype=np.float64)
+DEFAULT_PARAMETERS = (0.2, 0.02, 0.1)
+
+def day_number(value):
+    """
+    Days since 1970-01-01 (UTC) for a datetime; the seasonal slot of a day is day_number % SEASON_LENGTH.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() // 86400)
+
+def day_from_number(number):
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=number)
+
+def load_demand(app_db, trends_db=None, start_day=None, end_day=None, review_weight=1.0):
+    """
+    Builds daily demand series per (item_type, color) from add_to_cart events and reviews.
+
+    Every cart event counts as one unit. Reviews carry no item metadata, so their text and product_id
+    are scanned for a quiz item type and color (color 'any' when none is named), and they count as
+    review_weight units on the day they were inserted. end_day is exclusive and defaults to today,
+    so a partially recorded day is never fitted.
+
+    :return: (keys, first_day, demand) with demand shaped (len(keys), days).
+    """
+    end_day = end_day if end_day is not None else day_number(datetime.now(timezone.utc))
+    time_range = {'$lt': day_from_number(end_day)}
+    if start_day is not None:
+        time_range['$gte'] = day_from_number(start_day)
+
+    series, days, units = [], [], []
+    for event in app_db['cart_events'].find({'created_at': time_range}, {'item_type': 1, 'color': 1, 'created_at': 1}):
+        if event.get('item_type'):
+            series.append((event['item_type'], event.get('color') or 'any'))
+            days.append(day_number(event['created_at']))
+            units.append(1.0)
+
+    if trends_db is not None and review_weight:
+        id_range = {'$lt': ObjectId.from_datetime(day_from_number(end_day))}
+        if start_day is not None:
+            id_range['$gte'] = ObjectId.from_datetime(day_from_number(start_day))
+        for review in trends_db['reviews'].find({'_id': id_range}, {'review_text': 1, 'product_id': 1}):
+            words = f"{review.get('product_id', '')} {review.get('review_text', '')}".lower().replace('_', ' ').split()
+            item_type = next((ITEM_TYPES[word] for word in words if word in ITEM_TYPES), None)
+            if item_type:
+                color = next((word for word in words if word in COLORS), 'any')
+                series.append((item_type, color))
+                days.append(day_number(review['_id'].generation_time))
+                units.append(review_weight)
+
+    keys = sorted(set(series))
+    if start_day is None:
+        start_day = min(days) if days else end_day
+    demand = np.zeros((len(keys), max(end_day - start_day, 0)), dtype=np.float64)
+    if keys:
+        rows = {key: row for row, key in enumerate(keys)}
+        np.add.at(demand, ([rows[key] for key in series], np.array(days) - start_day), units)
+    return keys, start_day, demand
+
+def smooth(demand, first_day, alpha, beta, gamma, level, trend, season):
+    """
+    Runs additive Holt-Winters over demand one day at a time, vectorized across all series.
+
+    Parameters and states may carry extra leading dimensions (e.g. one per grid candidate) that
+    broadcast against the series axis. season holds one slot per weekday, indexed by day_number %
+    SEASON_LENGTH. States are updated in place.
+
+    :return: Sum of squared one-step-ahead errors per series.
+    """
+    sse = np.zeros(np.broadcast(level, alpha).shape)
+    for t in range(demand.shape[1]):
+        slot = (first_day + t) % SEASON_LENGTH
+        observed = demand[:, t]
+        seasonal = season[..., slot]
+        error = observed - (level + trend + seasonal)
+        sse += error * error
+        new_level = alpha * (observed - seasonal) + (1 - alpha) * (level + trend)
+        trend[...] = beta * (new_level - level) + (1 - beta) * trend
+        season[..., slot] = gamma * (observed - new_level) + (1 - gamma) * seasonal
+        level[...] = new_level
+    return sse
+
+def initial_state(demand, first_day):
+    """
+    Starting level, trend and weekday offsets estimated from the first two weeks of each series.
+    """
+    n = demand.shape[0]
+    first = demand[:, :SEASON_LENGTH]
+    level = first.mean(axis=1) if first.shape[1] else np.zeros(n)
+    trend = np.zeros(n)
+    if demand.shape[1] >= 2 * SEASON_LENGTH:
+        trend = (demand[:, SEASON_LENGTH:2 * SEASON_LENGTH].mean(axis=1) - level) / SEASON_LENGTH
+    season = np.zeros((n, SEASON_LENGTH))
+    for t in range(first.shape[1]):
+        season[:, (first_day + t) % SEASON_LENGTH] = first[:, t] - level
+    return level, trend, season
+
+def fit_chunk(demand, first_day, grid=PARAMETER_GRID):
+    """
+    Worker entry point: fits one block of series against every grid candidate at once.
+    Runs in a pool process, so it only takes and returns plain arrays.
+    """
+    n, g = demand.shape[0], len(grid)
+    level, trend, season = initial_state(demand, first_day)
+    # Shape (candidates, series[, slots]) so each time step is a handful of array operations.
+    levels = np.repeat(level[None, :], g, axis=0)
+    trends = np.repeat(trend[None, :], g, axis=0)
+    seasons = np.repeat(season[None, :, :], g, axis=0)
+    alpha, beta, gamma = (grid[:, i][:, None] for i in range(3))
+    sse = smooth(demand, first_day, alpha, beta, gamma, levels, trends, seasons)
+
+    best = sse.argmin(axis=0)
+    columns = np.arange(n)
+    return {
+        'params': grid[best],
+        'level': levels[best, columns],
+        'trend': trends[best, columns],
+        'season': seasons[best, columns],
+        'sse': sse[best, columns],
+    }
+
+class DemandForecaster:
+    def __init__(self):
+        """
+        Holds one fitted Holt-Winters model per (item_type, color) series as stacked arrays.
+        """
+        self.keys = []
+        self.next_day = None
+        self.params = np.zeros((0, 3))
+        self.level = np.zeros(0)
+        self.trend = np.zeros(0)
+        self.season = np.zeros((0, SEASON_LENGTH))
+        self.sse = np.zeros(0)
+        self.observations = 0
+
+    def fit(self, keys, first_day, demand, workers=1, chunk_size=500):
+        """
+        Fits every series from scratch, choosing smoothing parameters from PARAMETER_GRID per series.
+        Series are fitted in blocks of chunk_size (small enough for the per-step arrays to stay in
+        cache); with workers > 1 the blocks are spread over a process pool.
+
+        :return: Series fitted per second.
+        """
+        started = time.perf_counter()
+        blocks = [demand[i:i + chunk_size] for i in range(0, demand.shape[0], chunk_size)] or [demand]
+        if workers > 1 and len(blocks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(fit_chunk, blocks, [first_day] * len(blocks)))
+        else:
+            results = [fit_chunk(block, first_day) for block in blocks]
+
+        self.keys = list(keys)
+        for name in ('params', 'level', 'trend', 'season', 'sse'):
+            setattr(self, name, np.concatenate([result[name] for result in results]))
+        self.next_day = first_day + demand.shape[1]
+        self.observations = demand.shape[1]
+        rate = len(self.keys) / max(time.perf_counter() - started, 1e-9)
+        logger.info("Fitted %d series over %d days (%.0f series/sec)", len(self.keys), demand.shape[1], rate)
+        return rate
+
+    def update(self, keys, first_day, demand):
+        """
+        Advances the fitted models over newly arrived days without refitting their parameters.
+        first_day must be the day after the last one seen; series not seen before start from their
+        first new value with DEFAULT_PARAMETERS.
+        """
+        if self.next_day is None:
+            return self.fit(keys, first_day, demand)
+        if first_day != self.next_day:
+            raise ValueError(f"Update starts on day {first_day}, expected {self.next_day}.")
+
+        known = set(self.keys)
+        incoming = {key: row for row, key in enumerate(keys)}
+        new_keys = [key for key in keys if key not in known]
+        if new_keys:
+            level, trend, season = initial_state(demand[[incoming[key] for key in new_keys]], first_day)
+            self.keys += new_keys
+            self.params = np.vstack([self.params, np.tile(DEFAULT_PARAMETERS, (len(new_keys), 1))])
+            self.level = np.concatenate([self.level, level])
+            self.trend = np.concatenate([self.trend, trend])
+            self.season = np.vstack([self.season, season])
+            self.sse = np.concatenate([self.sse, np.zeros(len(new_keys))])
+
+        # Rows in the order of self.keys; series with no new events get a day of zero demand.
+        aligned = np.zeros((len(self.keys), demand.shape[1]))
+        positions = {key: row for row, key in enumerate(self.keys)}
+        aligned[[positions[key] for key in keys]] = demand
+
+        alpha, beta, gamma = self.params[:, 0], self.params[:, 1], self.params[:, 2]
+        self.sse += smooth(aligned, first_day, alpha, beta, gamma, self.level, self.trend, self.season)
+        self.next_day = first_day + demand.shape[1]
+        self.observations += demand.shape[1]
+
+    def forecast(self, horizon=14):
+        """
+        Expected daily demand for the next horizon days, shaped (series, horizon) and never negative.
+        """
+        steps = np.arange(1, horizon + 1)
+        slots = (self.next_day + steps - 1) % SEASON_LENGTH
+        prediction = self.level[:, None] + self.trend[:, None] * steps + self.season[:, slots]
+        return np.maximum(prediction, 0.0)
+
+    def save(self, path):
+        meta = {'keys': self.keys, 'next_day': self.next_day, 'observations': self.observations}
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as outfile:
+            np.savez(outfile, params=self.params, level=self.level, trend=self.trend, season=self.season,
+                     sse=self.sse, meta=np.array(json.dumps(meta)))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        forecaster = cls()
+        with np.load(path) as state:
+            meta = json.loads(str(state['meta']))
+            for name in ('params', 'level', 'trend', 'season', 'sse'):
+                setattr(forecaster, name, state[name])
+        forecaster.keys = [tuple(key) for key in meta['keys']]
+        forecaster.next_day = meta['next_day']
+        forecaster.observations = meta['observations']
+        return forecaster
+
+def save_forecasts(app_db, forecaster, horizon=14):
+    """
+    Writes one document per series to 'demand_forecasts' with the daily forecast for the next horizon days.
+    """
+    prediction = forecaster.forecast(horizon)
+    start = day_from_number(forecaster.next_day)
+    operations = [
+        UpdateOne({'_id': f"{item_type}:{color}"},
+                  {'$set': {'item_type': item_type, 'color': color, 'start_day': start,
+                            'daily': prediction[row].round(3).tolist()}},
+                  upsert=True)
+        for row, (item_type, color) in enumerate(forecaster.keys)
+    ]
+    if operations:
+        app_db['demand_forecasts'].bulk_write(operations, ordered=False)
+    return len(operations)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fit or update demand forecasts per (item_type, color).")
+    parser.add_argument('--state', default=os.getenv("FORECAST_STATE_PATH", "forecast_state.npz"))
+    parser.add_argument('--days', type=int, default=365, help="History used for a full fit.")
+    parser.add_argument('--horizon', type=int, default=14)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--refit', action='store_true', help="Ignore saved state and fit from scratch.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    app_db, trends_db = client['fashion_app'], client['trends']
+
+    if os.path.exists(args.state) and not args.refit:
+        forecaster = DemandForecaster.load(args.state)
+        keys, first_day, demand = load_demand(app_db, trends_db, start_day=forecaster.next_day)
+        if demand.shape[1]:
+            forecaster.update(keys, first_day, demand)
+            logger.info("Updated %d series with %d new days", len(forecaster.keys), demand.shape[1])
+    else:
+        today = day_number(datetime.now(timezone.utc))
+        keys, first_day, demand = load_demand(app_db, trends_db, start_day=today - args.days, end_day=today)
+        forecaster = DemandForecaster()
+        forecaster.fit(keys, first_day, demand, workers=args.workers)
+
+    forecaster.save(args.state)
+    logger.info("Wrote %d forecasts to demand_forecasts", save_forecasts(app_db, forecaster, args.horizon))
@@ -0,0 +1,267 @@
+import argparse
+import atexit
+import gc
+import importlib
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from observability.metrics import metrics_wsgi_app
+
+logger = logging.getLogger(__name__)
+
+# Services this entry point can run: (module, directory added to sys.path, default port).
+# recommender/api.py uses flat imports of its siblings, so its directory goes on the path first.
+SERVICES = {
+    'app': ('app.app', None, 5000),
+    'recommender': ('api', 'recommender', 5001),
+}
+
+class _RequestTracker:
+    """
+    WSGI middleware counting the requests in progress, so a stopping worker can wait for them.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.active = 0
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self._idle:
+            self.active += 1
+        try:
+            response = self.app(environ, start_response)
+            try:
+                yield from response
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+        finally:
+            with self._idle:
+                self.active -= 1
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout):
+        with self._idle:
+            return self._idle.wait_for(lambda: self.active == 0, timeout)
+
+class PreforkServer:
+    def __init__(self, module, host='127.0.0.1', port=5000, workers=2, preload=True, metrics_port=None,
+                 graceful_timeout=10.0, backlog=128):
+        """
+        Serves a Flask app from several worker processes forked from one parent.
+
+        The parent binds the listening socket, imports the app module and, with preload, calls the
+        module's preload() hook (the try-on app loads the vision libraries and the decoded garments
+        there). gc.freeze() then moves everything loaded so far out of the collector's reach, so the
+        workers share those pages copy-on-write instead of dirtying them on their first collection.
+        Each worker calls the module's init_worker() hook to open its own MongoDB clients and start
+        its own background threads, then serves the shared socket with a threaded werkzeug server;
+        the kernel spreads connections across the workers. A worker that dies is replaced.
+
+        Every worker keeps its own metrics, so /metrics on the shared port answers for whichever
+        worker took the connection. With metrics_port, worker i also serves its metrics alone on
+        metrics_port + i, and each of those ports should be scraped as its own target.
+
+        :param module: Import path of the module defining `app`, e.g. 'app.app'.
+        :param workers: Number of worker processes.
+        :param preload: Import the app and call its preload() hook in the parent before forking.
+        :param metrics_port: First port of the per-worker metrics listeners (None disables them).
+        :param graceful_timeout: Seconds workers get to finish after SIGTERM before they are killed.
+                                 A worker stops accepting connections at once and waits up to half of
+                                 this for requests in progress, leaving the rest for its exit handlers
+                                 (e.g. the last feedback flush).
+        """
+        self.module_name = module
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.preload = preload
+        self.metrics_port = metrics_port
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+        self.module = None
+        self.socket = None
+        self._children = {}  # pid -> (worker index, spawn time)
+        self._stopping = threading.Event()
+
+    def _load_module(self):
+        started = time.perf_counter()
+        module = importlib.import_module(self.module_name)
+        logger.info("Imported %s in %.0f ms", self.module_name, (time.perf_counter() - started) * 1000)
+        return module
+
+    def _bind(self):
+        sock = socket.socket(socket.AF_INET6 if ':' in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        sock.set_inheritable(True)
+        self.port = sock.getsockname()[1]
+        return sock
+
+    def run(self):
+        started = time.perf_counter()
+        self.socket = self._bind()
+        if self.preload:
+            self.module = self._load_module()
+            hook = getattr(self.module, 'preload', None)
+            if hook is not None:
+                hook_started = time.perf_counter()
+                hook()
+                logger.info("Preloaded shared assets in %.0f ms", (time.perf_counter() - hook_started) * 1000)
+            if threading.active_count() > 1:
+                logger.warning("%d threads are running in the parent before fork; they will not exist in the workers.",
+                               threading.active_count())
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info("Serving %s on http://%s:%d with %d workers (parent ready in %.0f ms)", self.module_name,
+                    self.host, self.port, self.workers, (time.perf_counter() - started) * 1000)
+
+        try:
+            while not self._stopping.wait(0.5):
+                self._reap(respawn=True)
+        finally:
+            self._shutdown()
+
+    def _request_stop(self, signum, frame):
+        self._stopping.set()
+
+    def _spawn(self, index):
+        pid = os.fork()
+        if pid:
+            self._children[pid] = (index, time.monotonic())
+            return
+        # Worker process: never return into the parent's supervision loop.
+        code = 0
+        try:
+            self._worker_main(index)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 0
+        except BaseException:
+            logger.exception("Worker %d crashed", index)
+            code = 1
+        finally:
+            # os._exit skips interpreter shutdown, so run the exit handlers (event log flush etc.) here.
+            atexit._run_exitfuncs()
+            logging.shutdown()
+            os._exit(code)
+
+    def _worker_main(self, index):
+        from werkzeug.serving import make_server
+
+        started = time.perf_counter()
+        os.environ['SERVING_WORKER'] = str(index)
+
+        def stop(signum, frame):
+            raise SystemExit(0)
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        module = self.module or self._load_module()
+        hook = getattr(module, 'init_worker', None)
+        if hook is not None:
+            hook()
+        if self.metrics_port is not None:
+            metrics_server = make_server(self.host, self.metrics_port + index, metrics_wsgi_app(), threaded=True)
+            threading.Thread(target=metrics_server.serve_forever, name='metrics-listener', daemon=True).start()
+
+        requests = _RequestTracker(module.app)
+        server = make_server(self.host, self.port, requests, threaded=True, fd=self.socket.fileno())
+
+        def drain(signum, frame):
+            # shutdown() waits for serve_forever() to return, and the handler runs on the thread inside
+            # serve_forever(), so it is called from another thread.
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            threading.Thread(target=server.shutdown, name='worker-shutdown', daemon=True).start()
+        signal.signal(signal.SIGTERM, drain)
+        signal.signal(signal.SIGINT, drain)
+
+        logger.info("Worker %d (pid %d) ready in %.0f ms", index, os.getpid(), (time.perf_counter() - started) * 1000)
+        try:
+            server.serve_forever()
+            if not requests.wait_idle(self.graceful_timeout / 2):
+                logger.warning("Worker %d stopping with %d requests still running", index, requests.active)
+        finally:
+            server.server_close()
+
+    def _reap(self, respawn):
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            index, spawned_at = self._children.pop(pid, (None, None))
+            if index is None:
+                continue
+            if respawn and not self._stopping.is_set():
+                logger.warning("Worker %d (pid %d) exited with status %d; starting a new one",
+                               index, pid, os.waitstatus_to_exitcode(status))
+                if time.monotonic() - spawned_at < 1.0:
+                    # Crashing on startup; do not spin.
+                    time.sleep(1.0)
+                self._spawn(index)
+
+    def _shutdown(self):
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap(respawn=False)
+            time.sleep(0.05)
+        for pid in list(self._children):
+            logger.warning("Worker pid %d did not stop in %.0fs; killing it", pid, self.graceful_timeout)
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self._children.clear()
+        self.socket.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Production entry point: serves app/app.py or recommender/api.py from pre-forked worker processes.")
+    parser.add_argument('service', choices=SERVICES)
+    parser.add_argument('--host', default=os.getenv("SERVING_HOST", "127.0.0.1"))
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=int(os.getenv("SERVING_WORKERS", "0")) or os.cpu_count() or 1)
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        help="Import the app in every worker instead of once in the parent.")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve worker i's metrics alone on this port + i.")
+    parser.add_argument('--graceful-timeout', type=float, default=10.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Startup timings are always reported.
+    logger.setLevel(logging.INFO)
+    # werkzeug logs every request at INFO unless told otherwise; keep access logs behind LOG_LEVEL too.
+    logging.getLogger('werkzeug').setLevel(logging.getLogger().level)
+    module, directory, default_port = SERVICES[args.service]
+    if directory is not None:
+        sys.path.insert(0, os.path.join(ROOT, directory))
+    # Read by the apps, e.g. to warn about per-worker caches.
+    os.environ['SERVING_WORKERS'] = str(args.workers)
+    PreforkServer(module, host=args.host, port=args.port if args.port is not None else default_port,
+                  workers=args.workers, preload=args.preload, metrics_port=args.metrics_port,
+                  graceful_timeout=args.graceful_timeout).run()
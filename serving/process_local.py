@@ -0,0 +1,41 @@
+import os
+import threading
+
+class ProcessLocal:
+    def __init__(self, factory):
+        """
+        Holds an object that must not cross a fork, such as a MongoClient (its monitor threads and
+        sockets belong to the process that opened them) or anything running a background thread.
+
+        The factory is called on the first get() in each process, so an app module can be imported
+        by a pre-fork parent and every worker still builds its own instance after the fork.
+        Objects that need closing should register their atexit handler inside the factory, so the
+        handler only exists in the process that owns the object.
+
+        :param factory: Callable without arguments that builds the object.
+        """
+        self.factory = factory
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            # A thread of the parent may hold the lock at fork time; the child must not inherit it held.
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def get(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._value = self.factory()
+                    self._pid = pid
+        return self._value
+
+    def peek(self):
+        """
+        Returns the object if this process has already built it, otherwise None.
+        """
+        return self._value if self._pid == os.getpid() else None
@@ -0,0 +1,68 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from common import ITEM_TYPES, use_mongo_stand_in, latency_stats, quiet
+
+def run(concurrency=(1, 8, 32), requests_per_level=2000, users=1000, mongo_uri=None, seed=0):
+    """
+    Drives recommender/api.py over HTTP with concurrent clients.
+
+    The app is served by a threaded werkzeug server on a free local port. Each level sends
+    requests_per_level requests from `level` client threads: 80% GET /recommendations/<id> and
+    20% POST /feedback. With the default in-memory cache most GETs are cache hits until feedback
+    invalidates them, as in production.
+    """
+    import requests
+    from werkzeug.serving import make_server
+
+    client_class = use_mongo_stand_in(mongo_uri)
+    client_class(mongo_uri or 'mongodb://localhost:27017/').drop_database('fashion_app')
+    with quiet():
+        import api
+        api.engine.get().initialize_scores_bulk(
+            {'user_id': f"user{i}", 'quiz_items': ITEM_TYPES[:1 + i % 3]} for i in range(users))
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = make_server('127.0.0.1', 0, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    local = threading.local()
+
+    def one_request(index):
+        rng = random.Random(seed * 1000003 + index)
+        session = getattr(local, 'session', None) or requests.Session()
+        local.session = session
+        user_id = f"user{rng.randrange(users)}"
+        started = time.perf_counter()
+        if rng.random() < 0.8:
+            endpoint = 'recommendations'
+            response = session.get(f"{base_url}/recommendations/{user_id}")
+        else:
+            endpoint = 'feedback'
+            response = session.post(f"{base_url}/feedback", json={
+                'user_id': user_id, 'item_type': rng.choice(ITEM_TYPES), 'feedback_type': 'see_more'})
+        response.raise_for_status()
+        return endpoint, time.perf_counter() - started
+
+    metrics = {}
+    try:
+        for level in concurrency:
+            started = time.perf_counter()
+            with quiet(), ThreadPoolExecutor(max_workers=level) as executor:
+                results = list(executor.map(one_request, range(requests_per_level)))
+            elapsed = time.perf_counter() - started
+            metrics[f"api.c{level}.requests_per_sec"] = requests_per_level / max(elapsed, 1e-9)
+            for endpoint in ('recommendations', 'feedback'):
+                latencies = [latency for name, latency in results if name == endpoint]
+                if latencies:
+                    stats = latency_stats(f"api.{endpoint}.c{level}", latencies, elapsed)
+                    # Per-endpoint throughput is already covered by requests_per_sec for the mix.
+                    stats.pop(f"api.{endpoint}.c{level}.ops_per_sec")
+                    metrics.update(stats)
+            print(f"api concurrency {level}: {metrics[f'api.c{level}.requests_per_sec']:.0f} req/s, "
+                  f"recommendations p99 {metrics[f'api.recommendations.c{level}.p99_ms']:.1f} ms")
+    finally:
+        server.shutdown()
+    return metrics
@@ -0,0 +1,77 @@
+import csv
+import gzip
+import multiprocessing
+import os
+import random
+import tempfile
+from common import ITEM_TYPES, COLORS
+
+WORDS = ['love', 'fabric', 'fit', 'quality', 'soft', 'elegant', 'modest', 'length', 'comfortable', 'stitching']
+
+def write_reviews_csv(path, rows, seed=0):
+    """
+    Writes a reviews CSV with the headers collect_reviews_from_csv expects (gzip when path ends in .gz).
+    """
+    rng = random.Random(seed)
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', newline='', encoding='utf-8') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['review_id', 'product_id', 'user_id', 'rating', 'review_text'])
+        for i in range(rows):
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+            writer.writerow([f"r{i}", f"{rng.choice(COLORS)}_{rng.choice(ITEM_TYPES)}_{rng.randrange(500)}",
+                             f"user{rng.randrange(100000)}", rng.randint(1, 5), f"{text}, a lovely {rng.choice(ITEM_TYPES)}"])
+
+class DiscardingCollection:
+    """
+    Accepts bulk writes and only counts them. mongomock resolves every upsert with a linear scan, which
+    would make the numbers measure the stand-in; this keeps parsing, chunking and the write pipeline.
+    """
+    def __init__(self):
+        self.operations = 0
+
+    def bulk_write(self, operations, ordered=True):
+        self.operations += len(operations)
+
+def _ingest(csv_path, chunk_size, workers, mongo_uri, results):
+    # Runs in a fresh process so peak RSS reflects this ingestion only.
+    from common import use_mongo_stand_in, peak_rss_mb, quiet
+    use_mongo_stand_in(mongo_uri)
+    if mongo_uri:
+        os.environ['MONGO_URI'] = mongo_uri
+    import trend_collector
+    with quiet():
+        collector = trend_collector.TrendCollector(twitter_client=object())
+        if mongo_uri:
+            collector.reviews_collection.drop()
+        else:
+            collector.reviews_collection = DiscardingCollection()
+        baseline_rss = peak_rss_mb()
+        summary = collector.collect_reviews_from_csv(csv_path, chunk_size=chunk_size, workers=workers, resume=False)
+    results.put({'rows_per_sec': summary['rows_per_sec'], 'peak_rss_mb': peak_rss_mb(),
+                 'rss_growth_mb': peak_rss_mb() - baseline_rss, 'rows': summary['rows']})
+
+def run(rows=(10000, 100000), chunk_size=5000, workers=4, compressed=(False, True), mongo_uri=None, seed=0):
+    """
+    TrendCollector.collect_reviews_from_csv rows/sec and peak RSS on generated CSVs.
+    Each ingestion runs in its own process, so RSS growth shows whether memory stays flat as files grow.
+    Without mongo_uri the writes go to a DiscardingCollection.
+    """
+    metrics = {}
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in rows:
+            for gz in compressed:
+                label = f"{count}.{'gz' if gz else 'csv'}"
+                path = os.path.join(workdir, f"reviews_{label}")
+                write_reviews_csv(path, count, seed)
+                results = context.Queue()
+                process = context.Process(target=_ingest, args=(path, chunk_size, workers, mongo_uri, results))
+                process.start()
+                result = results.get()
+                process.join()
+                metrics[f"ingestion.{label}.rows_per_sec"] = result['rows_per_sec']
+                metrics[f"ingestion.{label}.rss_growth_mb"] = result['rss_growth_mb']
+                print(f"ingestion {label}: {result['rows_per_sec']:.0f} rows/sec, "
+                      f"peak RSS {result['peak_rss_mb']:.0f} MB (+{result['rss_growth_mb']:.0f} MB)")
+    return metrics
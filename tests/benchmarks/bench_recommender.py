@@ -0,0 +1,48 @@
+import random
+import time
+from common import ITEM_TYPES, COLORS, use_mongo_stand_in, latency_stats, timed, quiet
+
+def populate(engine, users, rng):
+    """
+    Writes quiz scores and preferences for users synthetic users and returns the bulk rate in users/sec.
+    """
+    records = [{'user_id': f"user{i}", 'quiz_items': rng.sample(ITEM_TYPES, rng.randint(1, 3))} for i in range(users)]
+    engine.preferences.insert_many([{'user_id': record['user_id'], 'color': rng.choice(COLORS)} for record in records])
+    elapsed, _ = timed(engine.initialize_scores_bulk, records)
+    return users / max(elapsed, 1e-9)
+
+def run(users=(1000, 10000), ops=1000, layouts=('documents', 'compact'), mongo_uri=None, seed=0):
+    """
+    RecommenderEngine throughput and latency per score layout and user count.
+
+    Each configuration starts from an empty 'fashion_app' database, bulk-initializes the users, then
+    times ops single calls each of initialize_scores_from_quiz, update_score and
+    generate_recommendations on randomly chosen users (the cache is off, so every generate is live).
+    """
+    client_class = use_mongo_stand_in(mongo_uri)
+    from recommender_engine import RecommenderEngine
+
+    metrics = {}
+    for layout in layouts:
+        for count in users:
+            rng = random.Random(seed)
+            uri = mongo_uri or 'mongodb://localhost:27017/'
+            client_class(uri).drop_database('fashion_app')
+            with quiet():
+                engine = RecommenderEngine(uri, layout=layout)
+                prefix = f"recommender.{layout}.{count}"
+                metrics[f"{prefix}.init_bulk.users_per_sec"] = populate(engine, count, rng)
+
+                sample = [f"user{rng.randrange(count)}" for _ in range(ops)]
+                for name, call in (
+                    ('initialize', lambda user_id: engine.initialize_scores_from_quiz(user_id, rng.sample(ITEM_TYPES, 2))),
+                    ('update', lambda user_id: engine.update_score(user_id, rng.choice(ITEM_TYPES), rng.choice((1, -1)))),
+                    ('generate', engine.generate_recommendations),
+                ):
+                    latencies = []
+                    started = time.perf_counter()
+                    for user_id in sample:
+                        latencies.append(timed(call, user_id)[0])
+                    metrics.update(latency_stats(f"{prefix}.{name}", latencies, time.perf_counter() - started))
+            print(f"recommender {layout} {count} users: generate p50 {metrics[f'{prefix}.generate.p50_ms']:.2f} ms")
+    return metrics
@@ -0,0 +1,152 @@
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from common import ROOT
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Module and extra sys.path entry of each service, as serving/prefork.py loads them.
+SERVICES = {'app': ('app.app', ROOT), 'recommender': ('api', os.path.join(ROOT, 'recommender'))}
+
+IMPORT_SCRIPT = """
+import sys, time
+sys.path[:0] = [{root!r}, {directory!r}]
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+# Runs serving/prefork.py with the same Mongo stand-in as the other suites.
+SERVE_SCRIPT = """
+import runpy, sys
+sys.path.insert(0, {bench_dir!r})
+from common import use_mongo_stand_in
+use_mongo_stand_in({mongo_uri!r})
+sys.argv = ['serving.prefork'] + {args!r}
+runpy.run_module('serving.prefork', run_name='__main__', alter_sys=True)
+"""
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def import_seconds(service):
+    """
+    Time to import a service's module in a fresh interpreter; nothing is cached between runs but the OS page cache.
+    """
+    module, directory = SERVICES[service]
+    output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT.format(root=ROOT, directory=directory, module=module)],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def start_server(service, workers, env, mongo_uri=None):
+    port = free_port()
+    args = [service, '--port', str(port), '--workers', str(workers)]
+    process = subprocess.Popen([sys.executable, '-c', SERVE_SCRIPT.format(bench_dir=BENCH_DIR, mongo_uri=mongo_uri, args=args)],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, f"http://127.0.0.1:{port}"
+
+def wait_for_first_response(process, url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode} before answering")
+        try:
+            with urllib.request.urlopen(url, timeout=1.0) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError(f"No response from {url} within {timeout:.0f}s")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def worker_private_mb(parent_pid):
+    """
+    Mean private (unshared) memory of a server's worker processes, from /proc/<pid>/smaps_rollup.
+    Pages the workers still share copy-on-write with the pre-fork parent are not counted. None off Linux.
+    """
+    children = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as stat:
+                # The command name may contain spaces; the fields after it are space-separated.
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == parent_pid:
+            children.append(name)
+    sizes = []
+    for pid in children:
+        private = 0
+        try:
+            with open(f'/proc/{pid}/smaps_rollup') as rollup:
+                for line in rollup:
+                    if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                        private += int(line.split()[1])
+        except OSError:
+            continue
+        sizes.append(private / 1024)
+    return statistics.mean(sizes) if sizes else None
+
+def run(services=('app', 'recommender'), repeats=3, workers=2, mongo_uri=None):
+    """
+    Cold-start costs of the two Flask services.
+
+    import_ms is the median time to import each app module in a new interpreter. first_request_ms is
+    the time from launching `python -m serving.prefork <service>` with one worker until GET /metrics
+    answers. worker_private_mb is the memory each of `workers` preloaded workers does not share with
+    the parent once it has served a request, so it grows when shared assets stop being shared.
+    """
+    metrics = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, EVENT_SINKS='segments', EVENT_LOG_DIR=os.path.join(workdir, 'events'),
+                   FEEDBACK_LOG_PATH=os.path.join(workdir, 'feedback.log'), LOG_LEVEL='WARNING')
+        if mongo_uri:
+            env['MONGO_URI'] = mongo_uri
+        for service in services:
+            imports = [import_seconds(service) for _ in range(repeats)]
+            metrics[f"startup.{service}.import_ms"] = statistics.median(imports) * 1000
+
+            first_requests = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                process, base_url = start_server(service, 1, env, mongo_uri)
+                try:
+                    wait_for_first_response(process, f"{base_url}/metrics")
+                    first_requests.append(time.perf_counter() - started)
+                finally:
+                    stop_server(process)
+            metrics[f"startup.{service}.first_request_ms"] = statistics.median(first_requests) * 1000
+
+            if os.path.exists('/proc/self/smaps_rollup'):
+                process, base_url = start_server(service, workers, env, mongo_uri)
+                try:
+                    # Let every worker come up and serve, so each has touched what a request touches.
+                    for _ in range(4 * workers):
+                        wait_for_first_response(process, f"{base_url}/metrics")
+                    private = worker_private_mb(process.pid)
+                finally:
+                    stop_server(process)
+                if private is not None:
+                    metrics[f"startup.{service}.worker_private_mb"] = private
+
+            print(f"startup {service}: import {metrics[f'startup.{service}.import_ms']:.0f} ms, "
+                  f"first request {metrics[f'startup.{service}.first_request_ms']:.0f} ms"
+                  + (f", {metrics[f'startup.{service}.worker_private_mb']:.1f} MB private per worker"
+                     if f"startup.{service}.worker_private_mb" in metrics else ''))
+    return metrics
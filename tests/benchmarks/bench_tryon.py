@@ -0,0 +1,96 @@
+import time
+import numpy as np
+from common import latency_stats
+
+def synthetic_photo(megapixels, rng):
+    """
+    A 4:3 BGR image with smooth gradients, shapes and sensor-like noise, so JPEG sizes are realistic.
+    """
+    import cv2
+    h = int(round((megapixels * 1e6 * 3 / 4) ** 0.5))
+    w = int(round(h * 4 / 3))
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    img = np.dstack([(x / w) * 200, (y / h) * 180, ((x + y) / (w + h)) * 160]).astype(np.uint8)
+    for _ in range(12):
+        center = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+        axes = (int(rng.integers(w // 20, w // 5)), int(rng.integers(h // 20, h // 4)))
+        cv2.ellipse(img, center, axes, float(rng.uniform(0, 180)), 0, 360, rng.integers(0, 255, 3).tolist(), -1)
+    noise = rng.integers(-8, 9, img.shape, dtype=np.int16)
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+def synthetic_garment(rng, w=600, h=800):
+    """
+    A BGRA shirt-like shape with an opaque body and a soft, partially transparent edge.
+    """
+    import cv2
+    garment = np.zeros((h, w, 4), dtype=np.uint8)
+    garment[:, :, :3] = rng.integers(0, 255, 3)
+    alpha = np.zeros((h, w), dtype=np.uint8)
+    cv2.rectangle(alpha, (w // 6, h // 8), (5 * w // 6, h - 10), 255, -1)
+    garment[:, :, 3] = cv2.GaussianBlur(alpha, (31, 31), 0)
+    return garment
+
+STAGES = ('decode', 'pose', 'warp', 'blend', 'encode')
+
+def run(megapixels=(0.3, 2, 8, 12), repeats=5, seed=0):
+    """
+    Times TryOnEngine.tryon_bytes end to end on synthetic JPEG photos of increasing size, the way
+    the app calls it, with per-stage times (decode, pose, warp, blend, encode) taken from the engine's
+    own tryon_stage_seconds observations.
+
+    Synthetic photos contain no person, so the real pose model would stop every run after detection.
+    The pose stage is therefore timed separately with the real model when it can be loaded, and the
+    full pipeline runs with a FixedPose estimator; when the model is unavailable (e.g. offline without
+    the MediaPipe model files) the real-model pose stage is reported under 'skipped'.
+    """
+    import cv2
+    from observability.metrics import record_observations
+    from virtual_tryon.fake_pose import FixedPose
+    from virtual_tryon.tryon_engine import TryOnEngine, encode_image
+
+    rng = np.random.default_rng(seed)
+    metrics = {}
+    skipped = {}
+    detector = None
+    try:
+        detector = TryOnEngine()
+        detector.warm_up()
+    except Exception as e:
+        skipped['detect'] = f"pose model unavailable: {e}"
+    engine = TryOnEngine(pose_estimator=FixedPose())
+
+    garment = synthetic_garment(rng)
+    for size in megapixels:
+        photo = encode_image(synthetic_photo(size, rng), 'jpeg', 90)
+        stages = {stage: [] for stage in STAGES + ('total', 'detect')}
+        for _ in range(repeats):
+            with record_observations() as observations:
+                started = time.perf_counter()
+                result = engine.tryon_bytes(photo, garment, 'jpeg', 90)
+                stages['total'].append(time.perf_counter() - started)
+            if result is None:
+                raise RuntimeError("tryon_bytes returned no image for the synthetic photo")
+            by_stage = {}
+            for _, (stage,), seconds in observations:
+                by_stage[stage] = by_stage.get(stage, 0.0) + seconds
+            for stage in STAGES:
+                stages[stage].append(by_stage.get(stage, 0.0))
+
+            if detector is not None:
+                user_img = cv2.imdecode(np.frombuffer(photo, dtype=np.uint8), cv2.IMREAD_COLOR)
+                started = time.perf_counter()
+                detector.detect_pose(user_img)
+                stages['detect'].append(time.perf_counter() - started)
+
+        label = f"{size:g}mp"
+        for stage, latencies in stages.items():
+            if latencies:
+                stats = latency_stats(f"tryon.{label}.{stage}", latencies)
+                stats.pop(f"tryon.{label}.{stage}.ops_per_sec")
+                metrics.update(stats)
+        print(f"tryon {label}: {metrics[f'tryon.{label}.total.p50_ms']:.1f} ms per image (p50)")
+
+    engine.close()
+    if detector is not None:
+        detector.close()
+    return metrics, skipped
@@ -0,0 +1,77 @@
+import contextlib
+import logging
+import os
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The services import their siblings with flat imports (e.g. `from recommender_engine import ...`),
+# so the benchmarks put each service directory on the path the way running it from there would.
+for path in (ROOT, os.path.join(ROOT, 'recommender'), os.path.join(ROOT, 'trend_analysis')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+ITEM_TYPES = ['skirt', 'pants', 'shirt', 'dress']
+COLORS = ['red', 'blue', 'green', 'black']
+
+def use_mongo_stand_in(mongo_uri=None):
+    """
+    Returns a MongoClient class for the benchmarks. Without mongo_uri, mongomock is patched in for
+    pymongo.MongoClient, so modules importing it afterwards run fully in memory. Those numbers measure
+    the Python side of each hot path, not database round trips; pass --mongo-uri to measure those too.
+    """
+    import pymongo
+    if mongo_uri:
+        return pymongo.MongoClient
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("The benchmarks need mongomock (pip install mongomock) or --mongo-uri pointing at a test server.")
+    pymongo.MongoClient = mongomock.MongoClient
+    return mongomock.MongoClient
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Silences stdout and the INFO and DEBUG log records of the code under test while measuring, so
+    progress reporting is not part of the timings.
+    """
+    logging.disable(logging.INFO)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+def latency_stats(prefix, latencies, elapsed=None):
+    """
+    Turns a list of per-operation latencies (seconds) into p50/p99 metrics and a throughput.
+    """
+    latencies = np.asarray(latencies)
+    total = elapsed if elapsed is not None else latencies.sum()
+    return {
+        f"{prefix}.p50_ms": float(np.percentile(latencies, 50) * 1000),
+        f"{prefix}.p99_ms": float(np.percentile(latencies, 99) * 1000),
+        f"{prefix}.ops_per_sec": float(len(latencies) / max(total, 1e-9)),
+    }
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far (Linux/macOS).
+    VmHWM is preferred on Linux: ru_maxrss survives exec, so a spawned child would report its parent's peak.
+    """
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+from common import ROOT
+
+# Sizes per profile. 'quick' finishes in a few minutes against the in-memory stand-in, whose queries
+# are linear scans; 'full' covers the whole requested range (up to 1M users) and needs --mongo-uri.
+PROFILES = {
+    'quick': {
+        'recommender': {'users': (1000,), 'ops': 300},
+        'api': {'concurrency': (1, 8, 32), 'requests_per_level': 600, 'users': 1000},
+        'tryon': {'megapixels': (0.3, 2, 8, 12), 'repeats': 3},
+        'ingestion': {'rows': (20000, 100000)},
+        'startup': {'repeats': 3, 'workers': 2},
+    },
+    'full': {
+        'recommender': {'users': (1000, 100000, 1000000), 'ops': 5000},
+        'api': {'concurrency': (1, 8, 32, 64), 'requests_per_level': 10000, 'users': 100000},
+        'tryon': {'megapixels': (0.3, 2, 8, 12), 'repeats': 10},
+        'ingestion': {'rows': (100000, 1000000)},
+        'startup': {'repeats': 10, 'workers': 4},
+    },
+}
+SUITES = tuple(PROFILES['quick'])
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+def cpu_model():
+    if os.path.exists('/proc/cpuinfo'):
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    return platform.processor() or 'unknown cpu'
+
+def environment(profile, mongo):
+    """
+    What a baseline's numbers depend on besides the code: profile, database, OS, architecture, CPU model
+    and core count. Results are only compared with a baseline recorded in the same environment.
+    """
+    return {'profile': profile, 'mongo': mongo, 'system': f"{platform.system()} {platform.machine()}",
+            'cpu': cpu_model(), 'cpus': os.cpu_count()}
+
+def baseline_path(env):
+    """
+    One baseline file per environment under baselines/, e.g. quick-mongomock-linux-x86_64-intel-xeon-...-1cpu.json.
+    """
+    name = f"{env['profile']}-{env['mongo']}-{env['system']}-{env['cpu']}-{env['cpus']}cpu"
+    name = re.sub(r'\(r\)|\(tm\)|@.*?(?=-\d+cpu$)', '', name.lower())
+    return os.path.join(BASELINE_DIR, re.sub(r'[^a-z0-9_.]+', '-', name).strip('-') + '.json')
+
+def run_suites(suites, profile, mongo_uri=None):
+    metrics, skipped = {}, {}
+    for suite in suites:
+        settings = dict(PROFILES[profile][suite])
+        started = time.perf_counter()
+        if suite == 'recommender':
+            import bench_recommender
+            metrics.update(bench_recommender.run(mongo_uri=mongo_uri, **settings))
+        elif suite == 'api':
+            import bench_api
+            metrics.update(bench_api.run(mongo_uri=mongo_uri, **settings))
+        elif suite == 'tryon':
+            import bench_tryon
+            suite_metrics, suite_skipped = bench_tryon.run(**settings)
+            metrics.update(suite_metrics)
+            skipped.update({f"tryon.{stage}": reason for stage, reason in suite_skipped.items()})
+        elif suite == 'ingestion':
+            import bench_ingestion
+            metrics.update(bench_ingestion.run(mongo_uri=mongo_uri, **settings))
+        elif suite == 'startup':
+            import bench_startup
+            metrics.update(bench_startup.run(mongo_uri=mongo_uri, **settings))
+        print(f"--- {suite} finished in {time.perf_counter() - started:.1f}s ---", flush=True)
+    return metrics, skipped
+
+def higher_is_better(name):
+    return name.endswith('_per_sec')
+
+def compare(metrics, baseline, tolerance):
+    """
+    Compares metrics with a baseline. A metric regresses when it is worse than the baseline by more
+    than tolerance (a fraction); throughputs (*_per_sec) should not drop, latencies (*_ms) and memory
+    (*_mb) should not grow. Metrics missing on either side are not compared.
+
+    :return: List of (name, baseline, current, change) for every regression.
+    """
+    regressions = []
+    for name, current in sorted(metrics.items()):
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        change = (current - reference) / reference
+        if (higher_is_better(name) and change < -tolerance) or (not higher_is_better(name) and change > tolerance):
+            regressions.append((name, reference, current, change))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Offline benchmarks for the recommender, try-on and review ingestion hot paths and service startup. "
+                    "Results are written as JSON and compared with a baseline; the exit status is 1 on regressions.")
+    parser.add_argument('suites', nargs='*', help=f"Suites to run (default: all of {', '.join(SUITES)}).")
+    parser.add_argument('--profile', choices=PROFILES, default='quick')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None,
+                        help="Baseline file (default: the one recorded for this environment under baselines/).")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed relative slowdown before a metric counts as a regression.")
+    parser.add_argument('--update-baseline', action='store_true', help="Store these results as the new baseline.")
+    parser.add_argument('--mongo-uri', default=None,
+                        help="Use a real MongoDB instead of the in-memory stand-in. "
+                             "Its fashion_app database and trends.reviews collection are dropped.")
+    args = parser.parse_args()
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites {sorted(unknown)}; choose from {', '.join(SUITES)}.")
+    args.suites = args.suites or list(SUITES)
+
+    env = environment(args.profile, 'server' if args.mongo_uri else 'mongomock')
+    args.baseline = args.baseline or baseline_path(env)
+
+    metrics, skipped = run_suites(args.suites, args.profile, args.mongo_uri)
+    results = {
+        'meta': {
+            'environment': env,
+            'suites': args.suites,
+            'python': platform.python_version(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'skipped': skipped,
+        },
+        'metrics': metrics,
+    }
+    with open(args.output, 'w', encoding='utf-8') as outfile:
+        json.dump(results, outfile, indent=2, sort_keys=True)
+    print(f"Wrote {len(metrics)} metrics to {args.output}")
+
+    if args.update_baseline:
+        baseline = {'meta': results['meta'], 'metrics': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as infile:
+                baseline = json.load(infile)
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        # Suites that were not run keep their previous baseline numbers.
+        previous = baseline['meta']
+        baseline['meta'] = dict(results['meta'],
+                                suites=[suite for suite in SUITES if suite in set(previous.get('suites', ())) | set(args.suites)],
+                                skipped=dict(previous.get('skipped', {}), **skipped))
+        baseline['metrics'].update(metrics)
+        with open(args.baseline, 'w', encoding='utf-8') as outfile:
+            json.dump(baseline, outfile, indent=2, sort_keys=True)
+            outfile.write('\n')
+        print(f"Updated baseline {os.path.relpath(args.baseline, ROOT)}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline for this environment ({os.path.relpath(args.baseline, ROOT)}); "
+              f"run with --update-baseline on this machine to record one. Nothing was compared.")
+        sys.exit(0)
+    with open(args.baseline, encoding='utf-8') as infile:
+        baseline = json.load(infile)
+    if baseline['meta'].get('environment') != env:
+        # Numbers from another machine or database say nothing about a regression here.
+        print(f"Baseline {args.baseline} was recorded in {baseline['meta'].get('environment')}, not {env}; "
+              f"nothing was compared.")
+        sys.exit(0)
+
+    regressions = compare(metrics, baseline['metrics'], args.tolerance)
+    compared = len(set(metrics) & set(baseline['metrics']))
+    if regressions:
+        print(f"{len(regressions)} of {compared} metrics regressed by more than {args.tolerance:.0%}:")
+        for name, reference, current, change in regressions:
+            print(f"  {name}: {reference:.3f} -> {current:.3f} ({change:+.0%})")
+        sys.exit(1)
+    print(f"No regressions in {compared} metrics (tolerance {args.tolerance:.0%}).")
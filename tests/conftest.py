@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Same layout as running each service from its own directory: recommender/ and trend_analysis/
+# import their siblings with flat imports, everything else imports from the repository root.
+for path in (ROOT, os.path.join(ROOT, 'recommender'), os.path.join(ROOT, 'trend_analysis')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+@pytest.fixture
+def mongo():
+    """
+    An in-memory MongoClient standing in for a server.
+    """
+    mongomock = pytest.importorskip('mongomock')
+    return mongomock.MongoClient()
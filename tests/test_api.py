@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+import pytest
+import api
+import recommender_engine
+from recommender_engine import RecommenderEngine
+
+@pytest.fixture
+def engine(monkeypatch, mongo):
+    monkeypatch.setattr(recommender_engine, 'MongoClient', lambda *args, **kwargs: mongo)
+    engine = RecommenderEngine()
+    monkeypatch.setattr(api, 'engine', SimpleNamespace(get=lambda: engine))
+    monkeypatch.setattr(api, 'feedback_aggregator', SimpleNamespace(get=lambda: None))
+    return engine
+
+@pytest.fixture
+def client(engine):
+    return api.app.test_client()
+
+def test_batch_initialization(client, engine):
+    response = client.post('/initialize/batch', json={'users': [
+        {'user_id': 'u1', 'quiz_items': ['skirt', 'dress']},
+        {'user_id': 'u2', 'quiz_items': ['pants']},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()['message'] == "Initialized 2 users."
+    assert sorted(engine.iter_all_scores()) == [('u1', 'dress', 1), ('u1', 'skirt', 1), ('u2', 'pants', 1)]
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'users': []},
+    {'users': 'u1'},
+    {'users': [{'user_id': 'u1'}]},
+    {'users': [{'user_id': 'u1', 'quiz_items': ['skirt']}, 'u2']},
+    {'users': [{'user_id': '', 'quiz_items': ['skirt']}]},
+])
+def test_batch_initialization_rejects_invalid_bodies(client, engine, body):
+    assert client.post('/initialize/batch', json=body).status_code == 400
+    # Nothing is written when any record is invalid.
+    assert list(engine.iter_all_scores()) == []
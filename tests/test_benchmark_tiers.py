@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from virtual_tryon.fake_pose import FixedPose
+
+cv2 = pytest.importorskip('cv2')
+benchmark_tiers = pytest.importorskip('virtual_tryon.benchmark_tiers')
+from virtual_tryon.tryon_engine import QUALITY_TIERS, TryOnEngine, torso_quad
+
+class RecordingPose(FixedPose):
+    """
+    FixedPose that remembers the size of every image it was given.
+    """
+    def __init__(self):
+        super().__init__()
+        self.shapes = []
+
+    def process(self, rgb_image):
+        self.shapes.append(rgb_image.shape[:2])
+        return super().process(rgb_image)
+
+@pytest.fixture
+def photos(tmp_path):
+    paths = []
+    for name, (h, w) in {'small': (480, 360), 'large': (2400, 1800)}.items():
+        path = str(tmp_path / f'{name}.jpg')
+        cv2.imwrite(path, np.full((h, w, 3), 90, dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+@pytest.mark.parametrize('quality', list(QUALITY_TIERS))
+def test_tier_sets_the_detection_size(quality):
+    pose = RecordingPose()
+    engine = TryOnEngine(quality=quality, pose_estimator=pose)
+    img = np.zeros((2400, 1800, 3), dtype=np.uint8)
+    result = engine.detect_pose(img)
+    engine.close()
+
+    max_side = QUALITY_TIERS[quality]['detection_max_side']
+    assert pose.shapes == [(max_side, round(1800 * max_side / 2400)) if max_side else (2400, 1800)]
+    # Landmarks are normalized, so the torso lands on the same full-resolution pixels at every tier.
+    reference = np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in pose.landmarks], dtype=np.float32)
+    np.testing.assert_allclose(torso_quad(result.landmarks, 1800, 2400), torso_quad(reference, 1800, 2400))
+
+def test_unknown_tier_is_rejected():
+    with pytest.raises(ValueError):
+        TryOnEngine(quality='turbo', pose_estimator=FixedPose())
+
+def test_benchmark_reports_every_tier(photos):
+    pose = RecordingPose()
+    report = benchmark_tiers.benchmark(photos, repeats=2, pose_estimator=pose)
+
+    assert list(report) == ['accurate', 'fast', 'balanced']
+    for row in report.values():
+        assert row['detected'] == 2
+        assert row['error'] == pytest.approx(0.0, abs=1e-6)
+        assert row['latency_ms'] > 0
+    # Only the large photo is downscaled, and only by the tiers with a detection size.
+    assert (2400, 1800) in pose.shapes and (640, 480) in pose.shapes and (1024, 768) in pose.shapes
+
+def test_benchmark_needs_at_least_one_repeat(photos):
+    with pytest.raises(ValueError):
+        benchmark_tiers.benchmark(photos, repeats=0, pose_estimator=FixedPose())
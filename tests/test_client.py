@@ -0,0 +1,128 @@
+import threading
+import pytest
+import recommender_engine
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Response
+from recommender.client import (CircuitBreaker, HttpTransport, InProcessTransport, RecommenderClient,
+                                RecommenderRequestError, RecommenderUnavailable)
+
+@pytest.fixture
+def server():
+    """
+    A stand-in recommender API answering every request with the status in `server.status`.
+    """
+    state = {'status': 200}
+
+    def app(environ, start_response):
+        return Response('[]', status=state['status'], mimetype='application/json')(environ, start_response)
+    httpd = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield state, f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+def client_for(url, failures=3):
+    return RecommenderClient(HttpTransport(url, retries=0), CircuitBreaker(failure_threshold=failures, reset_timeout=60))
+
+def test_client_errors_do_not_open_the_breaker(server):
+    state, url = server
+    client = client_for(url)
+    state['status'] = 404
+    for _ in range(5):
+        with pytest.raises(RecommenderRequestError):
+            client.initialize('u1', ['skirt'])
+    assert client.breaker.state == 'closed'
+    state['status'] = 200
+    assert client.get_recommendations('u1') == []
+    client.close()
+
+def test_server_errors_open_the_breaker(server):
+    state, url = server
+    client = client_for(url)
+    state['status'] = 500
+    for _ in range(3):
+        with pytest.raises(RecommenderUnavailable) as raised:
+            client.initialize('u1', ['skirt'])
+        assert not isinstance(raised.value, RecommenderRequestError)
+    assert client.breaker.state == 'open'
+    state['status'] = 200
+    with pytest.raises(RecommenderUnavailable, match="open"):
+        client.initialize('u1', ['skirt'])
+    client.close()
+
+def test_connection_errors_open_the_breaker(server):
+    _, url = server
+    client = client_for('http://127.0.0.1:9', failures=2)
+    for _ in range(2):
+        with pytest.raises(RecommenderUnavailable):
+            client.initialize('u1', ['skirt'])
+    assert client.breaker.state == 'open'
+    # Recommendations fall back to an empty list instead of raising.
+    assert client.get_recommendations('u1') == []
+    client.close()
+
+def test_in_process_transport_uses_the_api_configuration(monkeypatch, tmp_path, mongo):
+    monkeypatch.setattr(recommender_engine, 'MongoClient', lambda *args, **kwargs: mongo)
+    monkeypatch.setenv('SCORE_LAYOUT', 'compact')
+    monkeypatch.setenv('FEEDBACK_WRITE_BEHIND', '1')
+    monkeypatch.setenv('FEEDBACK_LOG_PATH', str(tmp_path / 'feedback.log'))
+    monkeypatch.setenv('FEEDBACK_MAX_STALENESS', '0')
+    monkeypatch.delenv('SERVING_WORKER', raising=False)
+
+    transport = InProcessTransport()
+    assert transport.engine.layout == 'compact'
+    assert transport.engine.cache is not None
+    transport.initialize('u1', ['skirt'])
+    transport.send_feedback('u1', 'dress', 'see_more')
+    transport.send_feedback('u1', 'dress', 'see_more')
+    # Write-behind: nothing reaches MongoDB until a read needs it.
+    assert transport.engine.get_scores('u1') == [('skirt', 1)]
+    assert [item['type'] for item in transport.get_recommendations('u1')] == ['dress', 'skirt']
+    transport.close()
+
+class RecordingTransport:
+    """
+    Records calls in order; send_feedback blocks until `release` is set.
+    """
+    def __init__(self):
+        self.calls = []
+        self.sending = threading.Event()
+        self.release = threading.Event()
+
+    def send_feedback(self, user_id, item_type, feedback_type):
+        self.sending.set()
+        self.release.wait(5)
+        self.calls.append(('feedback', user_id, item_type))
+
+    def delete_user(self, user_id):
+        self.calls.append(('delete', user_id))
+
+    def close(self):
+        pass
+
+def test_delete_user_waits_for_sent_feedback_and_drops_queued_feedback():
+    transport = RecordingTransport()
+    client = RecommenderClient(transport)
+    client.send_feedback('u1', 'dress', 'see_more')
+    queued = client.send_feedback('u1', 'skirt', 'see_more')
+    other = client.send_feedback('u2', 'pants', 'see_more')
+    assert transport.sending.wait(5)
+
+    deleting = threading.Thread(target=client.delete_user, args=('u1',))
+    deleting.start()
+    deleting.join(0.2)
+    # The first click is already on its way, so the delete waits for it.
+    assert deleting.is_alive() and ('delete', 'u1') not in transport.calls
+
+    transport.release.set()
+    deleting.join(5)
+    queued.result(5)
+    other.result(5)
+    assert [call for call in transport.calls if call[1] == 'u1'] == [('feedback', 'u1', 'dress'), ('delete', 'u1')]
+    assert ('feedback', 'u2', 'pants') in transport.calls
+
+    # Feedback given after the delete is sent as usual.
+    client.send_feedback('u1', 'shirt', 'see_more').result(5)
+    assert transport.calls[-1] == ('feedback', 'u1', 'shirt')
+    assert client._feedback_epochs == {}
+    client.close()
@@ -0,0 +1,26 @@
+from collaborative import CollaborativeIndex
+
+def test_neighbours_after_users_join():
+    index = CollaborativeIndex(initial_capacity=2)
+    index.load([('a', 'skirt', 3), ('b', 'skirt', 2), ('c', 'pants', 1)])
+    assert [user_id for user_id, _ in index.neighbours('a')] == ['b']
+
+    # Growing past the initial capacity keeps row -> user_id in step.
+    for i in range(10):
+        index.add_score(f"new{i}", 'pants', 1)
+    index.set_score('d', 'skirt', 5)
+    neighbours = dict(index.neighbours('a', k=3))
+    assert set(neighbours) == {'b', 'd'}
+    assert index.neighbours('c', k=20)[0][1] == 1.0
+    assert {user_id for user_id, _ in index.neighbours('c', k=20)} == {f"new{i}" for i in range(10)}
+
+def test_recommends_what_neighbours_like():
+    index = CollaborativeIndex()
+    index.load([('a', 'skirt', 2), ('b', 'skirt', 2), ('b', 'dress', 3), ('c', 'pants', 4)])
+    assert index.recommend_item_types('a') == ['dress']
+
+def test_removed_user_is_nobodys_neighbour():
+    index = CollaborativeIndex()
+    index.load([('a', 'skirt', 1), ('b', 'skirt', 1)])
+    index.remove_user('b')
+    assert index.neighbours('a') == []
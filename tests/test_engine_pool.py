@@ -0,0 +1,46 @@
+import threading
+import pytest
+from virtual_tryon.engine_pool import TryOnEnginePool, PoolExhausted
+
+class FakeEngine:
+    def __init__(self):
+        self.warm = False
+        self.closed = False
+
+    def warm_up(self):
+        self.warm = True
+
+    def close(self):
+        self.closed = True
+
+def test_engines_are_warmed_and_returned():
+    pool = TryOnEnginePool(size=2, engine_factory=FakeEngine)
+    assert all(engine.warm for engine in pool._engines)
+    with pool.engine() as first, pool.engine() as second:
+        assert first is not second
+        with pytest.raises(PoolExhausted):
+            pool.acquire(timeout=0.01)
+    with pool.engine():
+        pass
+
+def test_waiting_requests_are_bounded():
+    pool = TryOnEnginePool(size=1, max_waiting=1, engine_factory=FakeEngine)
+    held = pool.acquire()
+    waiter = threading.Thread(target=lambda: pool.release(pool.acquire(timeout=5)))
+    waiter.start()
+    while pool._waiting == 0:
+        threading.Event().wait(0.001)
+    with pytest.raises(PoolExhausted):
+        pool.acquire(timeout=0)
+    pool.release(held)
+    waiter.join()
+
+def test_shutdown_closes_idle_and_released_engines():
+    pool = TryOnEnginePool(size=2, engine_factory=FakeEngine)
+    checked_out = pool.acquire()
+    pool.shutdown()
+    assert [engine.closed for engine in pool._engines].count(True) == 1
+    pool.release(checked_out)
+    assert all(engine.closed for engine in pool._engines)
+    with pytest.raises(PoolExhausted):
+        pool.acquire()
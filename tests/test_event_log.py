@@ -0,0 +1,143 @@
+import gzip
+import threading
+import time
+import pytest
+from events import event_log
+from events.event_log import BufferFull, EventLog, MongoSink, SegmentSink, read_events
+
+class ListSink:
+    """
+    Keeps every batch it is given; raises while `failing` is set and blocks while `stalled` is clear.
+    """
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+        self.stalled = threading.Event()
+        self.stalled.set()
+
+    def write(self, events):
+        self.stalled.wait(5)
+        if self.failing:
+            raise ConnectionError("sink down")
+        self.batches.append(list(events))
+
+    @property
+    def events(self):
+        return [event for batch in self.batches for event in batch]
+
+def push_carts(log, first, count):
+    for i in range(first, first + count):
+        log.push('add_to_cart', user_id=f"u{i}", item_type='skirt', color='red')
+
+def user_ids(events):
+    return [event['user_id'] for event in events]
+
+def test_ring_buffer_wraps_around_in_order():
+    sink = ListSink()
+    log = EventLog([sink], capacity=4, batch_size=4, flush_interval=3600)
+    push_carts(log, 0, 3)
+    assert log.flush() == 3
+    # The read position is now 3, so the next four events wrap past the end of the ring.
+    push_carts(log, 3, 4)
+    log.close()
+
+    assert user_ids(sink.events) == [f"u{i}" for i in range(7)]
+    assert all(len(batch) <= 4 for batch in sink.batches)
+    assert log.stats() == {'pushed': 7, 'rejected': 0, 'flushed': 7, 'sink_errors': 0, 'buffered': 0, 'capacity': 4}
+
+def test_full_buffer_raises_without_block_timeout():
+    sink = ListSink()
+    log = EventLog([sink], capacity=2, batch_size=100, flush_interval=3600)
+    push_carts(log, 0, 2)
+    with pytest.raises(BufferFull):
+        push_carts(log, 2, 1)
+    log.close()
+    assert user_ids(sink.events) == ['u0', 'u1']
+    assert log.stats()['rejected'] == 1
+
+def test_push_waits_for_room_then_gives_up_on_a_stalled_sink():
+    sink = ListSink()
+    sink.stalled.clear()
+    log = EventLog([sink], capacity=2, batch_size=100, flush_interval=3600, block_timeout=0.2)
+    # The third push wakes the flusher, which takes u0 and u1 and then hangs in the sink.
+    push_carts(log, 0, 3)
+    push_carts(log, 3, 1)
+    started = time.monotonic()
+    with pytest.raises(BufferFull):
+        push_carts(log, 4, 1)
+    assert time.monotonic() - started >= 0.2
+
+    sink.stalled.set()
+    log.close()
+    assert user_ids(sink.events) == ['u0', 'u1', 'u2', 'u3']
+    assert log.stats()['rejected'] == 1
+
+def test_failing_sink_does_not_stop_the_others_and_recovers():
+    broken, healthy = ListSink(), ListSink()
+    broken.failing = True
+    log = EventLog([broken, healthy], capacity=16, batch_size=16, flush_interval=3600)
+    push_carts(log, 0, 2)
+    assert log.flush() == 2
+    assert user_ids(healthy.events) == ['u0', 'u1'] and broken.events == []
+    assert log.stats()['sink_errors'] == 1
+
+    # Once the sink is back it receives the following batches.
+    broken.failing = False
+    push_carts(log, 2, 2)
+    log.close()
+    assert user_ids(broken.events) == ['u2', 'u3']
+    assert user_ids(healthy.events) == ['u0', 'u1', 'u2', 'u3']
+    assert log.stats()['sink_errors'] == 1
+
+def test_invalid_events_are_rejected():
+    log = EventLog([ListSink()], flush_interval=3600)
+    with pytest.raises(ValueError):
+        log.push('page_view', user_id='u1')
+    with pytest.raises(ValueError):
+        log.push('feedback', user_id='u1', item_type='skirt', rating=5)
+    log.close()
+
+@pytest.fixture
+def segments(tmp_path):
+    # One event every 30 seconds over five one-minute partitions, alternating types.
+    sink = SegmentSink(str(tmp_path), partition_seconds=60)
+    sink.write([{'ts': float(ts), 'type': 'add_to_cart' if ts % 60 else 'feedback', 'user_id': f"u{ts}"}
+                for ts in range(0, 300, 30)])
+    return tmp_path
+
+def test_read_events_filters_by_time_range_and_type(segments, monkeypatch):
+    opened = []
+    gzip_open = gzip.open
+
+    def recording_open(path, *args, **kwargs):
+        opened.append(path)
+        return gzip_open(path, *args, **kwargs)
+    monkeypatch.setattr(event_log.gzip, 'open', recording_open)
+
+    events = list(read_events(str(segments), start=60, end=150, partition_seconds=60))
+    assert [event['ts'] for event in events] == [60.0, 90.0, 120.0]
+    # Only the partitions starting at 60 and 120 overlap [60, 150).
+    assert len(opened) == 2
+
+    carts = list(read_events(str(segments), start=60, end=150, event_types=['add_to_cart'], partition_seconds=60))
+    assert [event['ts'] for event in carts] == [90.0]
+    assert len(list(read_events(str(segments), partition_seconds=60))) == 10
+
+def test_read_events_skips_a_truncated_member(segments):
+    sink = SegmentSink(str(segments), partition_seconds=60)
+    path = sink.partition_path(0)
+    member = gzip.compress(b'{"ts":45.0,"type":"feedback","user_id":"late"}\n')
+    with open(path, 'ab') as outfile:
+        outfile.write(member[:len(member) // 2])
+    assert [event['user_id'] for event in read_events(str(segments), end=60, partition_seconds=60)] == ['u0', 'u30']
+
+def test_mongo_sink_writes_one_collection_per_type(mongo):
+    db = mongo['fashion_app']
+    MongoSink({'add_to_cart': db['cart_events']}).write([
+        {'ts': 0.0, 'type': 'add_to_cart', 'user_id': 'u1', 'item_type': 'skirt', 'color': 'red'},
+        {'ts': 1.0, 'type': 'feedback', 'user_id': 'u1', 'item_type': 'skirt', 'feedback_type': 'like'},
+    ])
+    document = db['cart_events'].find_one({}, {'_id': 0})
+    assert document['user_id'] == 'u1' and document['created_at'].year == 1970
+    assert 'ts' not in document and 'type' not in document
+    assert db['cart_events'].count_documents({}) == 1
@@ -0,0 +1,183 @@
+import json
+import os
+import time
+import pytest
+import factory
+import recommender_engine
+from collaborative import CollaborativeIndex
+from feedback_buffer import FeedbackAggregator
+from recommender_engine import RecommenderEngine
+
+@pytest.fixture
+def make_engine(monkeypatch, mongo):
+    monkeypatch.setattr(recommender_engine, 'MongoClient', lambda *args, **kwargs: mongo)
+    return lambda layout='documents', **kwargs: RecommenderEngine(layout=layout, **kwargs)
+
+def scores(engine):
+    return {(user_id, item_type): score for user_id, item_type, score in engine.iter_all_scores()}
+
+class LostAck:
+    """
+    Applies the write, then fails as if the acknowledgement never arrived.
+    """
+    def __init__(self, engine, failures=1):
+        self.engine = engine
+        self.failures = failures
+
+    def apply_score_increments(self, increments, batch_id=None, buffered_at=None):
+        self.engine.apply_score_increments(increments, batch_id=batch_id, buffered_at=buffered_at)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+
+class Unreachable:
+    def apply_score_increments(self, increments, batch_id=None, buffered_at=None):
+        raise ConnectionError("no servers available")
+
+def aggregator(engine, tmp_path, **kwargs):
+    return FeedbackAggregator(engine, log_path=str(tmp_path / 'feedback.log'), flush_interval=3600, fsync=False, **kwargs)
+
+@pytest.mark.parametrize('layout', ['documents', 'compact', 'dual'])
+def test_retried_batch_is_applied_once(make_engine, layout):
+    engine = make_engine(layout, collaborative=CollaborativeIndex())
+    increments = {('u1', 'skirt'): 2, ('u1', 'dress'): -1, ('u2', 'skirt'): 1}
+
+    engine.apply_score_increments(increments, batch_id='b1')
+    engine.apply_score_increments(increments, batch_id='b1')
+    engine.apply_score_increments({('u1', 'skirt'): 1}, batch_id='b2')
+
+    assert scores(engine) == {('u1', 'skirt'): 3, ('u1', 'dress'): -1, ('u2', 'skirt'): 1}
+    collaborative = engine.collaborative
+    assert collaborative._scores[collaborative._row('u1'), collaborative._col('skirt')] == 3
+
+def test_applied_batch_history_is_bounded(make_engine):
+    engine = make_engine()
+    for batch in range(recommender_engine.APPLIED_BATCHES_KEPT + 5):
+        engine.apply_score_increments({('u1', 'shirt'): 1}, batch_id=f"b{batch}")
+    doc = engine.user_scores.find_one({'user_id': 'u1'})
+    assert doc['score'] == recommender_engine.APPLIED_BATCHES_KEPT + 5
+    assert len(doc['applied_batches']) == recommender_engine.APPLIED_BATCHES_KEPT
+    assert engine.user_scores.count_documents({}) == 1
+
+def test_flush_writes_merged_increments(make_engine, tmp_path):
+    engine = make_engine()
+    buffer = aggregator(engine, tmp_path)
+    buffer.add('u1', 'skirt', 1)
+    buffer.add('u1', 'skirt', 1)
+    buffer.add('u2', 'pants', -1)
+
+    assert buffer.flush() == 2
+    assert scores(engine) == {('u1', 'skirt'): 2, ('u2', 'pants'): -1}
+    assert not os.path.exists(buffer.flushing_path)
+    buffer.close()
+
+def test_lost_acknowledgement_is_not_applied_twice(make_engine, tmp_path):
+    engine = make_engine()
+    buffer = aggregator(LostAck(engine), tmp_path)
+    buffer.add('u1', 'skirt', 1)
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+    buffer.add('u1', 'skirt', 1)
+
+    buffer.flush()
+    buffer.close()
+    assert scores(engine) == {('u1', 'skirt'): 2}
+
+def test_restart_after_crash_mid_flush(make_engine, tmp_path):
+    engine = make_engine()
+    buffer = aggregator(LostAck(engine), tmp_path)
+    buffer.add('u1', 'skirt', 1)
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+    buffer.add('u2', 'dress', 1)
+    # The process dies here: no close(), the logs stay behind.
+    buffer._stop.set()
+
+    restarted = aggregator(engine, tmp_path)
+    assert scores(engine) == {('u1', 'skirt'): 1, ('u2', 'dress'): 1}
+    restarted.close()
+    assert not os.path.exists(restarted.flushing_path)
+
+def test_rotated_log_without_batch_id_is_sent(make_engine, tmp_path):
+    engine = make_engine()
+    with open(tmp_path / 'feedback.log.flushing', 'w') as outfile:
+        outfile.write(json.dumps({'user_id': 'u1', 'item_type': 'skirt', 'score_change': 1}) + '\n')
+
+    aggregator(engine, tmp_path).close()
+    assert scores(engine) == {('u1', 'skirt'): 1}
+
+def test_start_without_database_keeps_log(make_engine, tmp_path):
+    with open(tmp_path / 'feedback.log', 'w') as outfile:
+        outfile.write(json.dumps({'user_id': 'u1', 'item_type': 'skirt', 'score_change': 1}) + '\n')
+        # Torn append of a process that died mid-write.
+        outfile.write('{"user_id": "u1", "item_t')
+
+    buffer = aggregator(Unreachable(), tmp_path)
+    buffer.add('u1', 'skirt', 1)
+    buffer.close()
+
+    engine = make_engine()
+    aggregator(engine, tmp_path).close()
+    assert scores(engine) == {('u1', 'skirt'): 2}
+
+def write_log(path, *records):
+    with open(path, 'w') as outfile:
+        for record in records:
+            outfile.write(json.dumps(record) + '\n')
+
+def test_logs_of_slots_beyond_the_workers_are_replayed(make_engine, tmp_path, monkeypatch):
+    monkeypatch.setenv('SERVING_WORKERS', '2')
+    base = str(tmp_path / 'feedback.log')
+    write_log(f"{base}.1", {'user_id': 'u1', 'item_type': 'skirt', 'score_change': 1})
+    # Left by a run with four workers: a live log, and a batch that died mid-write after applying.
+    write_log(f"{base}.3", {'user_id': 'u3', 'item_type': 'dress', 'score_change': 1})
+    write_log(f"{base}.2.flushing", {'batch_id': 'b2'}, {'user_id': 'u2', 'item_type': 'pants', 'score_change': 2})
+    write_log(base, {'user_id': 'u0', 'item_type': 'shirt', 'score_change': 1})
+    engine = make_engine()
+    engine.apply_score_increments({('u2', 'pants'): 2}, batch_id='b2')
+
+    assert factory.orphaned_logs(base, '0') == [base, f"{base}.2", f"{base}.3"]
+    factory.replay_orphaned_logs(engine, base, '0')
+
+    assert scores(engine) == {('u0', 'shirt'): 1, ('u2', 'pants'): 2, ('u3', 'dress'): 1}
+    assert sorted(os.listdir(tmp_path)) == ['feedback.log.1']
+
+def test_orphaned_log_is_kept_while_the_database_is_down(tmp_path, monkeypatch):
+    monkeypatch.setenv('SERVING_WORKERS', '1')
+    base = str(tmp_path / 'feedback.log')
+    write_log(f"{base}.1", {'user_id': 'u1', 'item_type': 'skirt', 'score_change': 1})
+    factory.replay_orphaned_logs(Unreachable(), base, '0')
+    assert os.path.exists(f"{base}.1.flushing")
+
+@pytest.mark.parametrize('layout', ['documents', 'compact', 'dual'])
+def test_feedback_buffered_by_another_worker_does_not_recreate_a_deleted_user(make_engine, tmp_path, layout):
+    engine = make_engine(layout)
+    other_worker = FeedbackAggregator(engine, log_path=str(tmp_path / 'feedback.log.1'), flush_interval=3600, fsync=False)
+    other_worker.add('u1', 'skirt', 1)
+    other_worker.add('u2', 'skirt', 1)
+
+    engine.delete_user_history('u1')
+    other_worker.add('u2', 'dress', 1)
+    other_worker.close()
+    assert scores(engine) == {('u2', 'skirt'): 1, ('u2', 'dress'): 1}
+
+    # Feedback given after the delete is kept (deletion times are rounded up to the next millisecond).
+    time.sleep(0.01)
+    after = FeedbackAggregator(engine, log_path=str(tmp_path / 'feedback.log.1'), flush_interval=3600, fsync=False)
+    after.add('u1', 'pants', 1)
+    after.close()
+    assert scores(engine)[('u1', 'pants')] == 1
+
+def test_delete_between_tombstone_check_and_write_is_honoured(make_engine, monkeypatch):
+    engine = make_engine('dual')
+    drop_deleted = engine._drop_deleted
+
+    def delete_after_check(increments, buffered_at):
+        remaining = drop_deleted(increments, buffered_at)
+        engine.delete_user_history('u1')
+        return remaining
+    monkeypatch.setattr(engine, '_drop_deleted', delete_after_check)
+
+    engine.apply_score_increments({('u1', 'skirt'): 1}, batch_id='b1', buffered_at={('u1', 'skirt'): 0.0})
+    assert scores(engine) == {}
+    assert engine.user_profiles.count_documents({}) == 0
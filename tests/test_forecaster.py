@@ -0,0 +1,104 @@
+from datetime import timedelta
+import numpy as np
+import pytest
+from bson import ObjectId
+from sales_forecast.forecaster import (DemandForecaster, SEASON_LENGTH, day_from_number, fit_chunk, load_demand,
+                                       save_forecasts)
+
+FIRST_DAY = 20000
+
+def weekly_demand(series=3, days=8 * SEASON_LENGTH, seed=0):
+    rng = np.random.default_rng(seed)
+    pattern = np.array([5.0, 3.0, 3.0, 4.0, 8.0, 12.0, 9.0])
+    slots = (FIRST_DAY + np.arange(days)) % SEASON_LENGTH
+    return pattern[slots] * (1 + np.arange(series))[:, None] + rng.normal(0, 0.1, (series, days))
+
+def test_load_demand_counts_events_per_day(mongo):
+    db = mongo['fashion_app']
+    day = day_from_number(FIRST_DAY)
+    db['cart_events'].insert_many([
+        {'item_type': 'skirt', 'color': 'red', 'created_at': day + timedelta(hours=1)},
+        {'item_type': 'skirt', 'color': 'red', 'created_at': day + timedelta(hours=2)},
+        {'item_type': 'dress', 'created_at': day + timedelta(days=1)},
+        # Outside [start_day, end_day).
+        {'item_type': 'skirt', 'color': 'red', 'created_at': day + timedelta(days=2)},
+    ])
+
+    keys, first_day, demand = load_demand(db, start_day=FIRST_DAY, end_day=FIRST_DAY + 2)
+
+    assert keys == [('dress', 'any'), ('skirt', 'red')]
+    assert first_day == FIRST_DAY
+    np.testing.assert_array_equal(demand, [[0, 1], [2, 0]])
+
+def test_load_demand_maps_review_keywords_to_item_types(mongo):
+    day = day_from_number(FIRST_DAY)
+    mongo['trends']['reviews'].insert_many([
+        {'_id': ObjectId.from_datetime(day + timedelta(hours=3)), 'product_id': 'p1', 'review_text': "Two red dresses"},
+        {'_id': ObjectId.from_datetime(day + timedelta(hours=4)), 'product_id': 'blue_shirts', 'review_text': "ok"},
+        {'_id': ObjectId.from_datetime(day + timedelta(hours=5)), 'product_id': 'p3', 'review_text': "nice hat"},
+    ])
+
+    keys, _, demand = load_demand(mongo['fashion_app'], mongo['trends'], start_day=FIRST_DAY, end_day=FIRST_DAY + 1,
+                                  review_weight=0.5)
+
+    assert keys == [('dress', 'red'), ('shirt', 'blue')]
+    np.testing.assert_array_equal(demand, [[0.5], [0.5]])
+
+def test_fit_learns_weekly_pattern():
+    demand = weekly_demand()
+    forecaster = DemandForecaster()
+    forecaster.fit([('skirt', c) for c in ('red', 'blue', 'green')], FIRST_DAY, demand)
+
+    prediction = forecaster.forecast(SEASON_LENGTH)
+    # The next week repeats the last one.
+    np.testing.assert_allclose(prediction, demand[:, -SEASON_LENGTH:], rtol=0.1)
+    assert (prediction >= 0).all()
+
+def test_chunked_and_parallel_fit_match_single_block():
+    demand = weekly_demand(series=7)
+    whole = fit_chunk(demand, FIRST_DAY)
+    forecaster = DemandForecaster()
+    forecaster.fit(list(range(7)), FIRST_DAY, demand, workers=2, chunk_size=3)
+
+    np.testing.assert_array_equal(forecaster.params, whole['params'])
+    np.testing.assert_allclose(forecaster.level, whole['level'])
+
+def test_update_matches_fit_over_all_days():
+    demand = weekly_demand(series=1)
+    split = 6 * SEASON_LENGTH
+    incremental = DemandForecaster()
+    incremental.fit([('shirt', 'black')], FIRST_DAY, demand[:, :split])
+    incremental.update([('shirt', 'black')], FIRST_DAY + split, demand[:, split:])
+
+    # One pass over every day with the parameters the partial fit chose.
+    whole = fit_chunk(demand, FIRST_DAY, grid=incremental.params[:1])
+    np.testing.assert_allclose(incremental.level, whole['level'])
+    np.testing.assert_allclose(incremental.season, whole['season'])
+    assert incremental.next_day == FIRST_DAY + demand.shape[1]
+
+def test_update_rejects_gap_and_adds_new_series():
+    forecaster = DemandForecaster()
+    forecaster.fit([('pants', 'red')], FIRST_DAY, weekly_demand(series=1))
+
+    with pytest.raises(ValueError):
+        forecaster.update([('pants', 'red')], forecaster.next_day + 1, np.ones((1, 1)))
+
+    forecaster.update([('dress', 'green')], forecaster.next_day, np.full((1, 3), 2.0))
+    assert forecaster.keys == [('pants', 'red'), ('dress', 'green')]
+    assert forecaster.forecast(1).shape == (2, 1)
+
+def test_save_and_load_round_trip(tmp_path, mongo):
+    forecaster = DemandForecaster()
+    forecaster.fit([('dress', 'red'), ('dress', 'blue')], FIRST_DAY, weekly_demand(series=2))
+    path = str(tmp_path / 'state.npz')
+    forecaster.save(path)
+
+    loaded = DemandForecaster.load(path)
+    assert loaded.keys == forecaster.keys
+    assert loaded.next_day == forecaster.next_day
+    np.testing.assert_array_equal(loaded.forecast(), forecaster.forecast())
+
+    db = mongo['fashion_app']
+    assert save_forecasts(db, loaded, horizon=3) == 2
+    stored = db['demand_forecasts'].find_one({'_id': 'dress:red'})
+    assert len(stored['daily']) == 3
@@ -0,0 +1,69 @@
+import os
+import threading
+import numpy as np
+import pytest
+from virtual_tryon.garment_store import GarmentStore, default_cache_dir
+
+cv2 = pytest.importorskip('cv2')
+
+def write_garment(clothes_dir, name, color, size=(600, 520)):
+    image = np.zeros(size + (4,), dtype=np.uint8)
+    image[:, :, :3] = color
+    image[:, :, 3] = 255
+    path = os.path.join(clothes_dir, f'{name}.png')
+    cv2.imwrite(path, image)
+    return path
+
+def test_levels_are_halved_and_shared(tmp_path):
+    write_garment(tmp_path, 'shirt', (10, 20, 30))
+    store = GarmentStore(str(tmp_path), str(tmp_path / 'cache'), check_interval=0)
+    asset = store.get('shirt')
+    assert [level.shape[:2] for level in asset.levels] == [(600, 520), (300, 260)]
+    assert isinstance(asset.levels[0], np.memmap)
+    # A second store (another worker) maps the same files instead of decoding again.
+    other = GarmentStore(str(tmp_path), str(tmp_path / 'cache')).get('shirt')
+    assert other.levels[0].filename == asset.levels[0].filename
+    with pytest.raises(KeyError):
+        store.get('../shirt')
+
+def test_changed_png_replaces_only_older_versions(tmp_path):
+    path = write_garment(tmp_path, 'shirt', (10, 20, 30))
+    write_garment(tmp_path, 'shirt.long', (1, 2, 3))
+    store = GarmentStore(str(tmp_path), str(tmp_path / 'cache'), check_interval=0)
+    first = store.get('shirt')
+    store.get('shirt.long')
+
+    write_garment(tmp_path, 'shirt', (200, 0, 0))
+    os.utime(path, ns=(first.mtime + 10 ** 9, first.mtime + 10 ** 9))
+    second = store.get('shirt')
+
+    assert second.mtime != first.mtime
+    assert second.levels[0][0, 0, 0] == 200
+    # The old mapping still reads; only the old version's directory is gone.
+    assert first.levels[0][0, 0, 0] == 10
+    versions = sorted(name for name in os.listdir(tmp_path / 'cache'))
+    assert versions == sorted([f'shirt.{second.mtime}', f"shirt.long.{store.get('shirt.long').mtime}"])
+
+def test_concurrent_builds_publish_one_complete_version(tmp_path):
+    write_garment(tmp_path, 'dress', (5, 5, 5), size=(1200, 1100))
+    stores = [GarmentStore(str(tmp_path), str(tmp_path / 'cache')) for _ in range(6)]
+    assets = [None] * len(stores)
+
+    def load(i):
+        assets[i] = stores[i].get('dress')
+    threads = [threading.Thread(target=load, args=(i,)) for i in range(len(stores))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(len(asset.levels) == 3 for asset in assets)
+    assert os.listdir(tmp_path / 'cache') == [f'dress.{assets[0].mtime}']
+
+def test_default_cache_dir_is_outside_the_clothes_dir(tmp_path):
+    clothes_dir = tmp_path / 'static' / 'clothes'
+    clothes_dir.mkdir(parents=True)
+    store = GarmentStore(str(clothes_dir))
+    assert store.cache_dir == default_cache_dir(str(clothes_dir)) == GarmentStore(str(clothes_dir)).cache_dir
+    assert not os.path.abspath(store.cache_dir).startswith(str(tmp_path))
+    assert default_cache_dir(str(tmp_path / 'other')) != store.cache_dir
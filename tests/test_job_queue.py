@@ -0,0 +1,110 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from virtual_tryon import job_queue
+from virtual_tryon.job_queue import QueueFull, TryOnJobQueue
+
+class ManualExecutor:
+    """
+    Holds submitted jobs until the test completes them; optionally refuses them like a broken pool.
+    """
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.futures = []
+
+    def submit(self, fn, *args):
+        if self.broken:
+            raise BrokenProcessPool("A child process terminated abruptly")
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+@pytest.fixture
+def executors(monkeypatch):
+    created = []
+
+    def create(queue):
+        created.append(ManualExecutor())
+        return created[-1]
+    monkeypatch.setattr(TryOnJobQueue, '_create_executor', create)
+    return created
+
+def test_same_photo_and_garment_share_a_job(executors):
+    queue = TryOnJobQueue('clothes', max_queue=4)
+    first = queue.submit(b'photo', 'shirt')
+    assert queue.submit(b'photo', 'shirt') == first
+    assert queue.submit(b'photo', 'dress') != first
+
+    executors[0].futures[0].set_result((b'result', []))
+    job = queue.get(first)
+    assert job.status == 'done' and job.result == b'result'
+    assert queue.metrics()['queue_depth'] == 1
+
+def test_full_queue_rejects(executors):
+    queue = TryOnJobQueue('clothes', max_queue=2)
+    queue.submit(b'a', 'shirt')
+    queue.submit(b'b', 'shirt')
+    with pytest.raises(QueueFull):
+        queue.submit(b'c', 'shirt')
+    executors[0].futures[0].set_exception(RuntimeError("boom"))
+    queue.submit(b'c', 'shirt')
+    assert queue.metrics()['failed'] == 1
+
+def test_broken_pool_releases_the_slot_and_is_replaced(executors):
+    queue = TryOnJobQueue('clothes', max_queue=1)
+    executors[0].broken = True
+
+    with pytest.raises(QueueFull):
+        queue.submit(b'photo', 'shirt')
+    assert queue.metrics()['queue_depth'] == 0
+    assert len(executors) == 2
+
+    # The resubmission is a new job on the new pool, not the dead one.
+    job_id = queue.submit(b'photo', 'shirt')
+    executors[1].futures[0].set_result((b'result', []))
+    assert queue.get(job_id).status == 'done'
+
+def test_finished_jobs_are_bounded(executors):
+    queue = TryOnJobQueue('clothes', max_finished=2)
+    ids = [queue.submit(bytes([i]), 'shirt') for i in range(3)]
+    for future in executors[0].futures:
+        future.set_result((b'x', []))
+    assert queue.get(ids[0]) is None
+    assert queue.get(ids[2]).status == 'done'
+
+def test_jobs_are_polled_from_another_process_through_job_dir(executors, tmp_path):
+    owner = TryOnJobQueue('clothes', job_dir=str(tmp_path), max_finished=1)
+    other = TryOnJobQueue('clothes', job_dir=str(tmp_path))
+    job_id = owner.submit(b'photo', 'shirt')
+    assert other.get(job_id).to_dict()['status'] == 'queued'
+
+    executors[0].futures[0].set_result((b'result', []))
+    job = other.get(job_id)
+    assert job.status == 'done' and job.result == b'result'
+    assert other.get('../' + job_id) is None
+
+    # Dropped from the owner's finished jobs, so its files go too.
+    second = owner.submit(b'photo 2', 'shirt')
+    executors[0].futures[1].set_result((b'result 2', []))
+    assert other.get(job_id) is None
+    assert other.get(second).result == b'result 2'
+
+def test_queued_job_of_a_dead_process_is_reported_failed(executors, tmp_path, monkeypatch):
+    queue = TryOnJobQueue('clothes', job_dir=str(tmp_path))
+    job_id = queue.submit(b'photo', 'shirt')
+    monkeypatch.setattr(job_queue, '_process_alive', lambda pid: False)
+    assert TryOnJobQueue('clothes', job_dir=str(tmp_path)).get(job_id).status == 'failed'
+
+def failing_init(*args):
+    raise RuntimeError("no model files")
+
+def test_workers_are_spawned_and_a_failed_start_is_reported(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_queue, '_init_worker', failing_init)
+    queue = TryOnJobQueue(str(tmp_path), max_workers=1)
+    assert queue._executor._mp_context.get_start_method() == 'spawn'
+    job_id = queue.submit(b'photo', 'shirt')
+    queue._executor.shutdown(wait=True)
+    assert queue.get(job_id).status == 'failed'
@@ -0,0 +1,62 @@
+import pytest
+import migrate_scores
+import recommender_engine
+from recommender_engine import RecommenderEngine, profile_sync_operations, write_profile_sync
+
+@pytest.fixture
+def engine(monkeypatch, mongo):
+    monkeypatch.setattr(recommender_engine, 'MongoClient', lambda *args, **kwargs: mongo)
+    engine = RecommenderEngine(layout='documents')
+    engine.initialize_scores_bulk([{'user_id': f"u{i}", 'quiz_items': ['skirt', 'dress']} for i in range(5)])
+    engine.update_score('u1', 'skirt', 3)
+    # The API runs in the dual layout while the migration copies.
+    engine.layout = 'dual'
+    return engine
+
+def profile_scores(engine):
+    engine.layout = 'compact'
+    try:
+        return {f"u{i}": engine.get_scores(f"u{i}") for i in range(5)}
+    finally:
+        engine.layout = 'dual'
+
+def document_scores(engine):
+    return {f"u{i}": engine.get_scores(f"u{i}") for i in range(5)}
+
+def during_copy(monkeypatch, action):
+    """
+    Runs action after the migration has read a batch's scores and before it writes them.
+    """
+    def write(profiles, operations):
+        action()
+        write_profile_sync(profiles, operations)
+    monkeypatch.setattr(migrate_scores, 'write_profile_sync', write)
+
+def test_migration_copies_every_user_and_can_be_rerun(engine):
+    assert migrate_scores.migrate(engine.db, batch_size=2) == 5
+    assert migrate_scores.migrate(engine.db, batch_size=2) == 5
+    assert profile_scores(engine) == document_scores(engine)
+    assert profile_scores(engine)['u1'] == [('skirt', 4), ('dress', 1)]
+
+def test_feedback_during_the_copy_is_not_lost(engine, monkeypatch):
+    during_copy(monkeypatch, lambda: engine.update_score('u1', 'dress', 5))
+    migrate_scores.migrate(engine.db, batch_size=10)
+    assert profile_scores(engine)['u1'] == [('dress', 6), ('skirt', 4)]
+    assert profile_scores(engine) == document_scores(engine)
+
+def test_profile_write_of_earlier_feedback_landing_after_the_copy_is_ignored(engine, monkeypatch):
+    # Feedback whose user_scores increment the migration reads, but whose profile write arrives afterwards.
+    doc = engine.user_scores.find_one_and_update({'user_id': 'u2', 'item_type': 'skirt'},
+                                                 {'$inc': {'score': 2, 'seq': 1}},
+                                                 projection={'_id': 0}, return_document=True)
+    migrate_scores.migrate(engine.db, batch_size=10)
+    engine.update_score('u2', 'skirt', 1)
+    write_profile_sync(engine.user_profiles, profile_sync_operations([doc]))
+    assert profile_scores(engine)['u2'] == [('skirt', 4), ('dress', 1)]
+    assert profile_scores(engine) == document_scores(engine)
+
+def test_user_deleted_during_the_copy_is_not_recreated(engine, monkeypatch):
+    during_copy(monkeypatch, lambda: engine.delete_user_history('u3'))
+    assert migrate_scores.migrate(engine.db, batch_size=10) == 4
+    assert engine.user_profiles.find_one({'_id': 'u3'}) is None
+    assert engine.user_scores.count_documents({'user_id': 'u3'}) == 0
@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+from observability.metrics import Registry
+from observability.mongo import MongoCommandMetrics
+
+def command_event(request_id, duration_micros=2000):
+    return SimpleNamespace(command={'find': 'user_scores'}, command_name='find', request_id=request_id,
+                           duration_micros=duration_micros)
+
+def test_listeners_share_the_registered_metrics():
+    registry = Registry()
+    first = MongoCommandMetrics(registry)
+    second = MongoCommandMetrics(registry)
+    assert second.duration is first.duration and second.failures is first.failures
+
+    for listener, request_id in ((first, 1), (second, 2)):
+        listener.started(command_event(request_id))
+        listener.failed(command_event(request_id))
+    assert 'mongo_command_failures_total{command="find",collection="user_scores"} 2' in registry.render()
@@ -0,0 +1,46 @@
+import os
+import numpy as np
+from virtual_tryon.pose_cache import ENTRY_OVERHEAD_BYTES, PoseCache, PoseResult, image_key
+
+def pose(mask_bytes=0):
+    mask = np.zeros(mask_bytes, dtype=np.uint8) if mask_bytes else None
+    return PoseResult(np.zeros((33, 4), dtype=np.float32), mask)
+
+def test_image_key_depends_on_content_only():
+    image = np.arange(12, dtype=np.uint8).reshape(2, 2, 3)
+    assert image_key(image) == image_key(image.copy())
+    assert image_key(image) != image_key(image + 1)
+
+def test_empty_results_are_evicted():
+    cache = PoseCache(max_bytes=10 * ENTRY_OVERHEAD_BYTES)
+    for i in range(100):
+        cache.put(f"k{i}", PoseResult(None))
+    assert cache.stats()['entries'] == 10
+    assert cache.get('k0') is None
+    assert cache.get('k99') is not None
+
+def test_evicted_entries_reload_from_disk(tmp_path):
+    cache = PoseCache(max_bytes=3000, spill_dir=str(tmp_path))
+    cache.put('a', pose(1000))
+    cache.put('b', pose(1000))
+    assert os.path.exists(tmp_path / 'a.npz')
+
+    reloaded = cache.get('a')
+    assert reloaded.segmentation_mask.nbytes == 1000
+    assert cache.stats()['disk_hits'] == 1
+
+def test_spill_dir_stays_within_budget(tmp_path):
+    cache = PoseCache(max_bytes=3000, spill_dir=str(tmp_path), spill_max_bytes=20000)
+    for i in range(50):
+        cache.put(f"k{i}", pose(1000))
+    sizes = [entry.stat().st_size for entry in os.scandir(tmp_path)]
+    assert 0 < sum(sizes) <= 20000
+    assert not os.path.exists(tmp_path / 'k0.npz')
+
+def test_existing_spill_dir_is_trimmed_on_start(tmp_path):
+    PoseCache(max_bytes=0, spill_dir=str(tmp_path), spill_max_bytes=10 ** 9)
+    for i in range(20):
+        with open(tmp_path / f"old{i}.npz", 'wb') as outfile:
+            outfile.write(b'x' * 1000)
+    PoseCache(max_bytes=0, spill_dir=str(tmp_path), spill_max_bytes=5000)
+    assert sum(entry.stat().st_size for entry in os.scandir(tmp_path)) <= 5000
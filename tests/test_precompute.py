@@ -0,0 +1,38 @@
+import pytest
+import precompute
+import recommender_engine
+from recommender_engine import RecommenderEngine
+
+@pytest.fixture
+def engine(monkeypatch, mongo):
+    monkeypatch.setattr(recommender_engine, 'MongoClient', lambda *args, **kwargs: mongo)
+    engine = RecommenderEngine(precomputed_max_age=3600)
+    engine.initialize_scores_bulk([{'user_id': f"u{i}", 'quiz_items': ['skirt']} for i in range(5)])
+    engine.preferences.insert_many([{'user_id': f"u{i}", 'color': 'red'} for i in range(5)])
+    return engine
+
+def test_precomputed_lists_are_served(engine):
+    assert precompute.run(engine, chunk_size=2, workers=1) == 5
+    assert engine.get_precomputed_recommendations('u3')[0]['name'] == 'Red Skirt'
+
+def test_list_read_before_a_score_change_is_not_written(engine, monkeypatch):
+    read_chunks = precompute.iter_user_chunks
+
+    def change_after_read(*args, **kwargs):
+        for chunk in read_chunks(*args, **kwargs):
+            # Feedback arrives after the chunk's scores were read, before its list is written.
+            engine.update_score('u1', 'dress', 5)
+            yield chunk
+    monkeypatch.setattr(precompute, 'iter_user_chunks', change_after_read)
+
+    assert precompute.run(engine, chunk_size=2, workers=1) == 4
+    assert engine.get_precomputed_recommendations('u1') is None
+    assert engine.generate_recommendations('u1')[0]['type'] == 'dress'
+
+def test_score_change_removes_precomputed_list(engine):
+    precompute.run(engine, chunk_size=10, workers=1)
+    engine.update_score('u2', 'pants', 1)
+    assert engine.get_precomputed_recommendations('u2') is None
+    # The next run writes a fresh list over the old tombstone.
+    precompute.run(engine, chunk_size=10, workers=1, resume=False)
+    assert engine.get_precomputed_recommendations('u2') is not None
@@ -0,0 +1,74 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP = """
+import time
+from flask import Flask
+app = Flask(__name__)
+
+@app.route('/')
+def index():
+    return 'ok'
+
+@app.route('/slow')
+def slow():
+    time.sleep(1.0)
+    return 'done'
+"""
+
+SERVE = """
+import sys
+sys.path[:0] = [{root!r}, {app_dir!r}]
+from serving.prefork import PreforkServer
+PreforkServer('slow_app', port={port}, workers=1, graceful_timeout=10).run()
+"""
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / 'slow_app.py').write_text(APP)
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-c', SERVE.format(root=ROOT, app_dir=str(tmp_path), port=port)])
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            break
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                pytest.fail("server did not start")
+            time.sleep(0.05)
+    yield process, url
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+
+def test_sigterm_lets_requests_in_progress_finish(server):
+    process, url = server
+    responses = []
+    request = threading.Thread(target=lambda: responses.append(urllib.request.urlopen(f"{url}/slow", timeout=10).read()))
+    request.start()
+    time.sleep(0.3)
+
+    started = time.monotonic()
+    process.send_signal(signal.SIGTERM)
+    request.join()
+    assert responses == [b'done']
+    assert process.wait(timeout=10) == 0
+    # The worker exited once the request was done, not at the graceful timeout.
+    assert time.monotonic() - started < 5
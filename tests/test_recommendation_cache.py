@@ -0,0 +1,109 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+import recommender_engine
+from recommendation_cache import INVALIDATION_WINDOW, RecommendationCache, MemoryCacheBackend, SharedCacheBackend
+from recommender_engine import RecommenderEngine
+
+RECOMMENDER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'recommender')
+
+class SlowBackend(MemoryCacheBackend):
+    def get(self, key):
+        # Give other threads a chance to interleave with the counter update.
+        threading.Event().wait(0)
+        return super().get(key)
+
+def test_counters_are_exact_under_concurrency():
+    cache = RecommendationCache(SlowBackend())
+    cache.set('hit', [1])
+
+    def lookups():
+        for i in range(2000):
+            cache.get('hit' if i % 2 else 'miss')
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (8000, 8000)
+    assert stats['hit_rate'] == 0.5
+
+def test_shared_backend_sees_other_instances_invalidations(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    first = RecommendationCache(SharedCacheBackend(path))
+    second = RecommendationCache(SharedCacheBackend(path))
+
+    first.set('u1', [{'type': 'skirt'}])
+    assert second.get('u1') == [{'type': 'skirt'}]
+    second.invalidate('u1')
+    assert first.get('u1') is None
+
+def test_ttl_expires_entries():
+    cache = RecommendationCache(MemoryCacheBackend(ttl=-1))
+    cache.set('u1', [])
+    assert cache.get('u1') is None
+
+def api_cache_mode(**env):
+    # A fresh interpreter, as the setting is read when api.py is imported.
+    env = dict(os.environ, **env)
+    env.pop('RECOMMENDATION_CACHE', None)
+    return subprocess.run([sys.executable, '-c', 'import api; print(api.cache_mode)'], cwd=RECOMMENDER_DIR,
+                          env=env, capture_output=True, text=True, check=True).stdout.strip()
+
+def test_api_defaults_to_shared_cache_with_several_workers():
+    assert api_cache_mode(SERVING_WORKERS='4') == 'shared'
+    assert api_cache_mode(SERVING_WORKERS='1') == 'memory'
+
+@pytest.fixture(params=['memory', 'shared'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCacheBackend()
+    return SharedCacheBackend(str(tmp_path / 'cache.db'))
+
+def test_list_read_before_an_invalidation_is_not_stored(backend):
+    cache = RecommendationCache(backend)
+    read_started = time.time()
+    cache.invalidate('u1')
+    assert cache.set('u1', ['stale'], since=read_started) is False
+    assert cache.get('u1') is None
+
+    assert cache.set('u1', ['fresh'], since=time.time()) is True
+    assert cache.get('u1') == ['fresh']
+
+def test_read_older_than_the_invalidation_window_is_not_stored(backend):
+    cache = RecommendationCache(backend)
+    assert cache.set('u1', ['old'], since=time.time() - INVALIDATION_WINDOW - 1) is False
+
+def test_engine_does_not_cache_a_list_computed_across_a_score_change(monkeypatch, mongo):
+    monkeypatch.setattr(recommender_engine, 'MongoClient', lambda *args, **kwargs: mongo)
+    engine = RecommenderEngine(cache=RecommendationCache())
+    engine.initialize_scores_from_quiz('u1', ['skirt'])
+    get_scores = engine.get_scores
+
+    def change_during_read(user_id):
+        scores = get_scores(user_id)
+        # Another worker's feedback lands after the scores were read, before the list is cached.
+        engine.update_score(user_id, 'dress', 5)
+        return scores
+    monkeypatch.setattr(engine, 'get_scores', change_during_read)
+    assert [item['type'] for item in engine.generate_recommendations('u1')] == ['skirt']
+
+    monkeypatch.undo()
+    assert [item['type'] for item in engine.generate_recommendations('u1')] == ['dress', 'skirt']
+
+def test_api_exports_cache_counters_and_size():
+    script = ('import api\n'
+              'from observability.metrics import REGISTRY\n'
+              'api.cache.get().get("u1")\n'
+              'print(REGISTRY.render())')
+    env = dict(os.environ, RECOMMENDATION_CACHE='memory')
+    output = subprocess.run([sys.executable, '-c', script], cwd=RECOMMENDER_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert 'recommendation_cache_misses_total 1' in output
+    assert 'recommendation_cache_hits_total 0' in output
+    assert 'recommendation_cache_entries 0' in output
@@ -0,0 +1,52 @@
+import pytest
+import recommender_engine
+from recommender_engine import RecommenderEngine
+
+@pytest.fixture
+def make_engine(monkeypatch, mongo):
+    monkeypatch.setattr(recommender_engine, 'MongoClient', lambda *args, **kwargs: mongo)
+    return lambda layout='documents', **kwargs: RecommenderEngine(layout=layout, **kwargs)
+
+def scores(engine):
+    return sorted(engine.iter_all_scores())
+
+@pytest.mark.parametrize('layout', ['documents', 'compact', 'dual'])
+def test_bulk_initialization_is_idempotent(make_engine, layout):
+    engine = make_engine(layout)
+    users = [{'user_id': f"u{i}", 'quiz_items': ['skirt', 'dress', 'skirt']} for i in range(5)]
+
+    assert engine.initialize_scores_bulk(users, batch_size=3) == 5
+    first = scores(engine)
+    assert engine.initialize_scores_bulk(users, batch_size=3) == 5
+
+    assert scores(engine) == first
+    assert len(first) == 10 and {score for _, _, score in first} == {1}
+    if layout != 'compact':
+        assert engine.user_scores.count_documents({}) == 10
+    if layout != 'documents':
+        assert engine.user_profiles.count_documents({}) == 5
+
+def test_bulk_initialization_resets_scores_to_the_quiz(make_engine):
+    engine = make_engine()
+    engine.initialize_scores_bulk([{'user_id': 'u1', 'quiz_items': ['skirt']}])
+    engine.update_score('u1', 'skirt', 3)
+    engine.initialize_scores_bulk([{'user_id': 'u1', 'quiz_items': ['skirt']}])
+    assert engine.get_scores('u1') == [('skirt', 1)]
+
+@pytest.mark.parametrize('item_type', ['t.shirt', '$skirt', '$a.b'])
+def test_compact_layout_escapes_dots_and_dollars(make_engine, item_type):
+    engine = make_engine('compact')
+    engine.initialize_scores_from_quiz('u1', [item_type])
+    engine.update_score('u1', item_type, 2)
+    engine.apply_score_increments({('u1', item_type): 1}, batch_id='b1')
+
+    stored = engine.user_profiles.find_one({'_id': 'u1'})['scores']
+    assert list(stored) == [recommender_engine.score_field(item_type)[len('scores.'):]]
+    assert '.' not in list(stored)[0] and not list(stored)[0].startswith('$')
+    assert engine.get_scores('u1') == [(item_type, 4)]
+    assert list(engine.iter_all_scores()) == [('u1', item_type, 4)]
+
+def test_score_field_round_trips():
+    for item_type in ['dress', 't.shirt', '$skirt', 'mid$dle', '..']:
+        key = recommender_engine.score_field(item_type)[len('scores.'):]
+        assert recommender_engine.item_type_from_field(key) == item_type
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from bson import ObjectId
+from trend_aggregator import TrendAggregator
+
+@pytest.fixture
+def db(mongo):
+    return mongo['trends']
+
+def review(text, seconds_ago=0):
+    generated = datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+    # from_datetime leaves the rest of the id zero; keep ids generated in the same second apart.
+    return {'_id': ObjectId(ObjectId.from_datetime(generated).binary[:4] + ObjectId().binary[4:]),
+            'review_text': text, 'rating': 5}
+
+def test_consume_counts_each_document_once(db):
+    aggregator = TrendAggregator(db)
+    db['reviews'].insert_many([review("lovely linen dress"), review("short skirt")])
+    assert aggregator.consume() == 2
+    assert aggregator.consume() == 0
+    assert aggregator.estimate('item_type', 'dress') == 1
+
+def test_late_commit_below_the_cursor_is_consumed(db):
+    aggregator = TrendAggregator(db, overlap_seconds=300)
+    db['reviews'].insert_one(review("lovely linen dress"))
+    aggregator.consume()
+
+    # Its _id was generated a minute before the one already consumed, but it committed afterwards.
+    db['reviews'].insert_one(review("another dress", seconds_ago=60))
+    # Outside the overlap: missed by design.
+    db['reviews'].insert_one(review("old skirt", seconds_ago=3600))
+    assert aggregator.consume() == 1
+    assert aggregator.estimate('item_type', 'dress') == 2
+    assert aggregator.estimate('item_type', 'skirt') == 0
+
+def test_snapshot_keeps_the_overlap_ids(db, tmp_path):
+    snapshot_path = str(tmp_path / 'trends.npz')
+    aggregator = TrendAggregator(db, snapshot_path=snapshot_path)
+    db['reviews'].insert_one(review("lovely linen dress"))
+    aggregator.consume()
+    aggregator.save_snapshot()
+
+    restored = TrendAggregator(db, snapshot_path=snapshot_path)
+    assert restored.consume() == 0
+    assert restored.estimate('item_type', 'dress') == 1
@@ -0,0 +1,76 @@
+import json
+import os
+import pytest
+import trend_collector
+from fake_twitter import FakeSearchClient
+from trend_collector import TrendCollector
+
+@pytest.fixture
+def collector(monkeypatch, mongo):
+    monkeypatch.setattr(trend_collector, 'MongoClient', lambda *args, **kwargs: mongo)
+    return TrendCollector(twitter_client=object())
+
+@pytest.fixture
+def reviews_csv(tmp_path):
+    path = tmp_path / 'reviews.csv'
+    lines = ['review_id,product_id,user_id,rating,review_text']
+    lines += [f"r{i},p{i % 3},u{i},{i % 5 + 1},fine" for i in range(10)]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+def fail_chunk(monkeypatch, first_review_id):
+    write = TrendCollector._write_reviews
+
+    def write_reviews(self, operations):
+        if operations[0]._filter['review_id'] == first_review_id:
+            return len(operations)
+        return write(self, operations)
+    monkeypatch.setattr(TrendCollector, '_write_reviews', write_reviews)
+
+def test_reviews_are_imported_and_checkpoint_removed(collector, reviews_csv):
+    summary = collector.collect_reviews_from_csv(reviews_csv, chunk_size=3, workers=2)
+    assert summary['rows'] == 10 and summary['failed_rows'] == 0
+    assert collector.reviews_collection.count_documents({}) == 10
+    assert collector.reviews_collection.find_one({'review_id': 'r4'})['rating'] == 5
+    assert not os.path.exists(f"{reviews_csv}.checkpoint")
+
+def test_checkpoint_stops_at_first_failed_chunk(collector, reviews_csv, monkeypatch):
+    # Chunks are r0-r2, r3-r5, r6-r8 and r9; the second one fails.
+    fail_chunk(monkeypatch, 'r3')
+    summary = collector.collect_reviews_from_csv(reviews_csv, chunk_size=3, workers=1)
+    assert summary['failed_rows'] == 3
+
+    with open(f"{reviews_csv}.checkpoint", encoding='utf-8') as infile:
+        checkpoint = json.load(infile)
+    assert checkpoint['rows'] == 3
+    with open(reviews_csv, 'rb') as infile:
+        infile.seek(checkpoint['offset'])
+        assert infile.readline().startswith(b'r3,')
+
+    # The next run starts again at r3 and, with nothing failing, finishes and removes the checkpoint.
+    monkeypatch.undo()
+    summary = collector.collect_reviews_from_csv(reviews_csv, chunk_size=3, workers=1)
+    assert (summary['rows'], summary['failed_rows']) == (10, 0)
+    assert collector.reviews_collection.count_documents({}) == 10
+    assert not os.path.exists(f"{reviews_csv}.checkpoint")
+
+def test_checkpoint_kept_when_the_last_chunk_fails(collector, reviews_csv, monkeypatch):
+    fail_chunk(monkeypatch, 'r9')
+    collector.collect_reviews_from_csv(reviews_csv, chunk_size=3, workers=2)
+    with open(f"{reviews_csv}.checkpoint", encoding='utf-8') as infile:
+        assert json.load(infile)['rows'] == 9
+
+def test_tweet_backlog_longer_than_max_pages_is_not_skipped(collector):
+    collector.twitter_client = FakeSearchClient(tweets_per_query=250, start_id=1000)
+
+    assert collector.collect_tweets_incremental(['#linen'], max_pages=1, workers=1) == {'#linen': 100}
+    cursor = collector.twitter_cursors.find_one({'_id': '#linen'})
+    assert 'since_id' not in cursor and cursor['until_id'] == '1151'
+
+    collector.twitter_client.add_tweets('#linen', 30)
+    assert collector.collect_tweets_incremental(['#linen'], max_pages=5, workers=1) == {'#linen': 150}
+    # Pagination finished below the first run's newest tweet, so since_id starts there.
+    assert collector.twitter_cursors.find_one({'_id': '#linen'}) == {'_id': '#linen', 'since_id': '1250'}
+
+    assert collector.collect_tweets_incremental(['#linen'], max_pages=5, workers=1) == {'#linen': 30}
+    assert collector.twitter_collection.count_documents({}) == 280
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from virtual_tryon.fake_pose import FixedPose
+
+cv2 = pytest.importorskip('cv2')
+tryon_engine = pytest.importorskip('virtual_tryon.tryon_engine')
+
+@pytest.fixture
+def engine():
+    engine = tryon_engine.TryOnEngine(pose_estimator=FixedPose(), batch_workers=2)
+    yield engine
+    engine.close()
+
+def photo():
+    # Smooth, so JPEG keeps it close to the original.
+    y, x = np.mgrid[0:240, 0:320]
+    return np.dstack([x * 0.5, y * 0.5, np.full_like(x, 128)]).astype(np.uint8)
+
+def garment(color):
+    garment = np.zeros((80, 60, 4), dtype=np.uint8)
+    garment[:, :, :3] = color
+    garment[:, :, 3] = 255
+    return garment
+
+def decode(data):
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+def test_caller_array_is_not_modified(engine):
+    user_img = photo()
+    original = user_img.copy()
+
+    result = decode(engine.tryon_bytes(user_img, garment((0, 0, 255)), 'jpeg', 100))
+
+    np.testing.assert_array_equal(user_img, original)
+    # The torso is red, the corners are untouched.
+    assert result[120, 160, 2] > 200 and result[120, 160, :2].max() < 60
+    assert np.abs(result[5, 5].astype(int) - original[5, 5]).max() < 10
+
+def test_render_into_output_buffer(engine):
+    user_img = photo()
+    out = np.empty_like(user_img)
+    rendered = engine.render(user_img, garment((255, 0, 0)), out=out)
+    assert rendered is out
+    assert not np.array_equal(out, user_img)
+    assert engine.render(user_img, garment((255, 0, 0))) is user_img
+    np.testing.assert_array_equal(user_img, out)
+
+def test_batch_matches_single_renders_and_reuses_threads(engine):
+    user_img = photo()
+    garments = [garment(color) for color in ((0, 0, 255), (0, 255, 0), (255, 0, 0))]
+
+    batch = engine.tryon_batch(user_img, garments, 'jpeg', 90)
+    executor = engine._batch_executor
+    again = engine.tryon_batch(user_img, garments, 'jpeg', 90)
+
+    assert batch == again == [engine.tryon_bytes(user_img, g, 'jpeg', 90) for g in garments]
+    assert engine._batch_executor is executor
+    assert engine.pose.calls == 2 + len(garments)
+
+def full_frame_blend(user_img, clothing_img, dst_points, premultiplied=False):
+    # The straightforward version: warp the garment over the whole frame and blend in floating point.
+    h, w = user_img.shape[:2]
+    M = cv2.getPerspectiveTransform(tryon_engine.source_quad(clothing_img), dst_points)
+    warped = cv2.warpPerspective(clothing_img, M, (w, h), borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    alpha = warped[:, :, 3:4] / 255.0
+    garment = warped[:, :, :3] if premultiplied else warped[:, :, :3] * alpha
+    return np.round(garment + user_img * (1 - alpha)).astype(np.uint8)
+
+@pytest.mark.parametrize('dst_points', [
+    [[100, 50], [220, 60], [210, 200], [110, 190]],
+    # Partly outside the frame, so the bounding box is clipped.
+    [[-40, -20], [150, 10], [140, 170], [-30, 150]],
+])
+def test_roi_blend_matches_full_frame_blend(engine, dst_points):
+    from virtual_tryon.garment_store import GarmentAsset, premultiply
+    dst_points = np.float32(dst_points)
+    rng = np.random.default_rng(0)
+    clothing = rng.integers(0, 256, (80, 60, 4), dtype=np.uint8)
+    # Opaque body with a soft edge, so partial alpha is covered too.
+    clothing[:, :, 3] = 255
+    clothing[:8, :, 3] = np.linspace(0, 255, 8, dtype=np.uint8)[:, None]
+
+    straight = engine.composite(photo(), clothing, dst_points)
+    expected = full_frame_blend(photo(), clothing, dst_points)
+    assert np.abs(straight.astype(int) - expected).max() <= 1
+
+    asset = GarmentAsset('shirt', [premultiply(clothing)])
+    premultiplied = engine.composite(photo(), asset, dst_points)
+    expected = full_frame_blend(photo(), asset.levels[0], dst_points, premultiplied=True)
+    assert np.abs(premultiplied.astype(int) - expected).max() <= 1
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from virtual_tryon.fake_pose import FixedPose
+
+cv2 = pytest.importorskip('cv2')
+video_tryon = pytest.importorskip('virtual_tryon.video_tryon')
+from virtual_tryon.tryon_engine import TryOnEngine, torso_quad
+
+H, W = 240, 320
+
+@pytest.fixture
+def pose():
+    return FixedPose()
+
+@pytest.fixture
+def engine(pose):
+    engine = TryOnEngine(static_image_mode=False, pose_estimator=pose)
+    yield engine
+    engine.close()
+
+def frames(count):
+    for _ in range(count):
+        yield np.full((H, W, 3), 40, dtype=np.uint8)
+
+def garment():
+    garment = np.zeros((80, 60, 4), dtype=np.uint8)
+    garment[:, :, 2] = 255
+    garment[:, :, 3] = 255
+    return garment
+
+def quad_of(pose):
+    landmarks = np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in pose.landmarks], dtype=np.float32)
+    return torso_quad(landmarks, W, H)
+
+def test_quad_is_smoothed_between_detections(engine, pose):
+    video = video_tryon.VideoTryOn(garment(), engine=engine, smoothing=0.6)
+    stream = video.run(frames(3))
+
+    first = next(stream)
+    np.testing.assert_allclose(video._quad, quad_of(pose))
+    assert first[H // 2, W // 2, 2] == 255
+
+    previous = video._quad.copy()
+    pose.move(dx=0.1)
+    next(stream)
+    np.testing.assert_allclose(video._quad, 0.6 * previous + 0.4 * quad_of(pose), rtol=1e-5)
+
+def test_missed_detection_resets_the_smoothed_quad(engine, pose):
+    video = video_tryon.VideoTryOn(garment(), engine=engine, smoothing=0.6)
+    stream = video.run(frames(3))
+    next(stream)
+
+    pose.present = False
+    missed = next(stream)
+    assert video._quad is None
+    assert (missed == 40).all()
+
+    # The person reappears elsewhere: the garment goes straight there instead of sliding over.
+    pose.present = True
+    pose.move(dx=-0.2)
+    next(stream)
+    np.testing.assert_allclose(video._quad, quad_of(pose))
+
+def test_detection_interval_adapts_to_the_frame_budget(engine, pose):
+    # No frame fits a nanosecond budget, so detection backs off to every max_detect_interval frames.
+    video = video_tryon.VideoTryOn(garment(), engine=engine, target_fps=1e9, max_detect_interval=4)
+    for _ in video.run(frames(20)):
+        pass
+    assert video.detect_interval == 4
+    assert pose.calls == video.detections < 20
+
+    # Every frame is far within a 1000-second budget, so it returns to detecting on every frame.
+    video.target_fps = 1e-3
+    for _ in video.run(frames(5)):
+        pass
+    assert video.detect_interval == 1
+
+def test_stats_count_frames_and_detections(engine, pose):
+    video = video_tryon.VideoTryOn(garment(), engine=engine)
+    for _ in video.run(frames(6)):
+        pass
+    stats = video.stats()
+    assert (stats['frames'], stats['detections'], stats['detect_interval']) == (6, 6, 1)
+    assert stats['fps'] > 0
+    assert 0 < stats['composite_ms'] <= stats['frame_ms']
+    assert 0 < stats['pose_ms']
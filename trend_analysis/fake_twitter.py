@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta, timezone
+import tweepy
+
+class FakeSearchClient:
+    def __init__(self, tweets_per_query=250, start_id=1000):
+        """
+        Local stand-in for tweepy.Client.search_recent_tweets.
+
+        Every query gets its own stream of tweets with increasing ids. Results are returned newest first,
+        paginated with next_token, and filtered by since_id and until_id like the real endpoint. add_tweets()
+        simulates new tweets arriving between runs; calls counts requests made.
+        """
+        self._next_id = start_id
+        self._tweets = {}
+        self.tweets_per_query = tweets_per_query
+        self.calls = 0
+
+    def add_tweets(self, query, count):
+        tweets = self._tweets.setdefault(query, [])
+        for _ in range(count):
+            self._next_id += 1
+            tweets.append({
+                'id': str(self._next_id),
+                'text': f"{query} look #{self._next_id}",
+                'edit_history_tweet_ids': [str(self._next_id)],
+                'created_at': (datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=self._next_id))
+                              .strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'author_id': str(self._next_id % 97),
+                'lang': 'en',
+                'public_metrics': {'like_count': self._next_id % 50, 'retweet_count': self._next_id % 7,
+                                   'reply_count': 0, 'quote_count': 0},
+            })
+
+    def search_recent_tweets(self, query, max_results=10, since_id=None, until_id=None, next_token=None, tweet_fields=None,
+                            **kwargs):
+        self.calls += 1
+        if query not in self._tweets:
+            self.add_tweets(query, self.tweets_per_query)
+        matching = [t for t in reversed(self._tweets[query])
+                    if (since_id is None or int(t['id']) > int(since_id))
+                    and (until_id is None or int(t['id']) < int(until_id))]
+        start = int(next_token) if next_token else 0
+        page = matching[start:start + max_results]
+        meta = {'result_count': len(page)}
+        if page:
+            meta['newest_id'] = page[0]['id']
+            meta['oldest_id'] = page[-1]['id']
+        if start + max_results < len(matching):
+            meta['next_token'] = str(start + max_results)
+        return tweepy.Response(data=[tweepy.Tweet(t) for t in page] or None, includes={}, errors=[], meta=meta)
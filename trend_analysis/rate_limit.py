@@ -0,0 +1,40 @@
+import threading
+import time
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        """
+        Thread-safe token bucket shared by every query worker.
+
+        :param rate: Tokens added per second.
+        :param capacity: Maximum tokens held, i.e. the largest burst allowed.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until tokens are available and takes them.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause_until(self, timestamp):
+        """
+        Empties the bucket until the given wall-clock time, e.g. the API's rate-limit reset.
+        """
+        with self._lock:
+            delay = max(0.0, timestamp - time.time())
+            self._tokens = -delay * self.rate
+            self._updated = time.monotonic()
@@ -0,0 +1,298 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from bson import ObjectId
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+# Item types offered in the style quiz; plurals found in text are mapped back to these.
+ITEM_TYPES = {'skirt': 'skirt', 'skirts': 'skirt', 'pants': 'pants', 'shirt': 'shirt', 'shirts': 'shirt',
+              'dress': 'dress', 'dresses': 'dress'}
+
+DIMENSIONS = ('hashtag', 'keyword', 'item_type')
+METRICS = ('count', 'engagement')
+
+STOPWORDS = {'this', 'that', 'with', 'have', 'from', 'they', 'will', 'your', 'just', 'what', 'when', 'were',
+             'been', 'than', 'them', 'then', 'very', 'also', 'into', 'only', 'some', 'more', 'about', 'would',
+             'there', 'their', 'which', 'could', 'https', 'really', 'other'}
+
+logger = logging.getLogger(__name__)
+
+HASHTAG_RE = re.compile(r'#(\w+)')
+WORD_RE = re.compile(r'[a-z]{4,}')
+
+class CountMinSketch:
+    def __init__(self, width=2048, depth=4, table=None):
+        """
+        Count-Min sketch with float counters, so it can hold weighted sums as well as counts.
+        Estimates never undercount; with the defaults they overcount by at most ~0.13% of the
+        sketch's total with 98% probability.
+        Hashing is keyed on blake2b, so indexes are stable across processes and restarts.
+        """
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.float64)
+
+    def indexes(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8 * self.depth).digest()
+        return np.frombuffer(digest, dtype=np.uint64) % np.uint64(self.width)
+
+    def add(self, key, value=1.0):
+        self.table[np.arange(self.depth), self.indexes(key)] += value
+
+    def estimate(self, key):
+        return float(self.table[np.arange(self.depth), self.indexes(key)].min())
+
+class TrendAggregator:
+    def __init__(self, db, snapshot_path=None, bucket_seconds=3600, window_buckets=24, width=2048, depth=4, top_k=20,
+                 overlap_seconds=300):
+        """
+        Maintains sliding-window trend counts over twitter_posts and reviews without rescanning them.
+
+        The window is a ring of window_buckets time buckets. Each bucket holds one Count-Min table per
+        metric (mentions and engagement-weighted mentions), keyed by 'dimension:term'. A running sum of
+        the live buckets answers window queries, and an expired bucket is subtracted from it before
+        being reused, so memory is fixed at window_buckets x 2 x depth x width counters. For each
+        dimension, a bounded candidate set of heavy hitters is ranked by its sketch estimates.
+
+        consume() reads only documents whose _id is past the per-collection cursor, less overlap_seconds.
+        ObjectIds are assigned before a write commits, so a slow writer can commit a document whose _id
+        sorts below one already consumed; re-reading the overlap picks it up, and the ids consumed within
+        it are remembered so nothing is counted twice. save_snapshot() persists the tables, candidates,
+        cursors and those ids, which __init__ reloads from snapshot_path.
+
+        :param db: The 'trends' database.
+        :param bucket_seconds: Width of one time bucket.
+        :param window_buckets: Number of buckets in the window (default: 24 hourly buckets).
+        :param top_k: Heavy hitters kept per dimension; twice as many candidates are tracked.
+        :param overlap_seconds: How far before the cursor each pass re-reads; a write that commits later
+                                than this after its _id was generated is missed.
+        """
+        self.sources = {'twitter_posts': db['twitter_posts'], 'reviews': db['reviews']}
+        self.snapshot_path = snapshot_path
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self.top_k = top_k
+        self.overlap_seconds = overlap_seconds
+        self.width = width
+        self.depth = depth
+
+        self.buckets = np.zeros((window_buckets, len(METRICS), depth, width), dtype=np.float64)
+        self.window = np.zeros((len(METRICS), depth, width), dtype=np.float64)
+        # Bucket number (epoch seconds // bucket_seconds) held by each ring slot, -1 when empty
+        self.bucket_ids = np.full(window_buckets, -1, dtype=np.int64)
+        self.head = -1
+        self.candidates = {dimension: {} for dimension in DIMENSIONS}
+        self.cursors = {name: None for name in self.sources}
+        # Ids already consumed within overlap_seconds of each cursor
+        self.recent_ids = {name: set() for name in self.sources}
+        self._sketch = CountMinSketch(width, depth)
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load_snapshot()
+
+    # --- Ingestion ---
+
+    def consume(self, batch_size=1000):
+        """
+        Aggregates all documents added since the last call and returns how many were processed.
+        """
+        processed = 0
+        overlap = timedelta(seconds=self.overlap_seconds)
+        for name, collection in self.sources.items():
+            recent = self.recent_ids[name]
+            cursor = ObjectId(self.cursors[name]) if self.cursors[name] else None
+            query = {'_id': {'$gte': ObjectId.from_datetime(cursor.generation_time - overlap)}} if cursor else {}
+            while True:
+                documents = list(collection.find(query).sort('_id', 1).limit(batch_size))
+                if not documents:
+                    break
+                for document in documents:
+                    document_id = str(document['_id'])
+                    if document_id in recent:
+                        continue
+                    if name == 'twitter_posts':
+                        self._add_tweet(document)
+                    else:
+                        self._add_review(document)
+                    recent.add(document_id)
+                    processed += 1
+                    if cursor is None or document['_id'] > cursor:
+                        cursor = document['_id']
+                query = {'_id': {'$gt': documents[-1]['_id']}}
+            if cursor is not None:
+                self.cursors[name] = str(cursor)
+                oldest = cursor.generation_time - overlap
+                self.recent_ids[name] = {i for i in recent if ObjectId(i).generation_time >= oldest}
+        return processed
+
+    def _add_tweet(self, tweet):
+        metrics = tweet.get('metrics') or {}
+        engagement = (1 + metrics.get('like_count', 0) + 2 * metrics.get('retweet_count', 0)
+                      + metrics.get('reply_count', 0) + metrics.get('quote_count', 0))
+        self.add_text(tweet.get('text') or '', self._event_time(tweet, 'created_at'), engagement)
+
+    def _add_review(self, review):
+        rating = review.get('rating')
+        engagement = rating if isinstance(rating, (int, float)) else 0
+        self.add_text(review.get('review_text') or '', self._event_time(review), engagement)
+
+    @staticmethod
+    def _event_time(document, field=None):
+        value = document.get(field) if field else None
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            return value.timestamp()
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                pass
+        # Reviews carry no timestamp; the ObjectId records when the document was inserted.
+        if isinstance(document.get('_id'), ObjectId):
+            return document['_id'].generation_time.timestamp()
+        return time.time()
+
+    def add_text(self, text, timestamp, engagement=1.0):
+        """
+        Extracts hashtags, keywords and item types from text and adds them at the given time.
+        """
+        text = text.lower()
+        hashtags = set(HASHTAG_RE.findall(text))
+        words = set(WORD_RE.findall(HASHTAG_RE.sub(' ', text))) - STOPWORDS
+        item_types = {ITEM_TYPES[word] for word in re.findall(r'[a-z]+', text) if word in ITEM_TYPES}
+        for dimension, terms in (('hashtag', hashtags), ('keyword', words), ('item_type', item_types)):
+            for term in terms:
+                self.add(dimension, term, timestamp, engagement)
+
+    def add(self, dimension, term, timestamp, engagement=1.0):
+        bucket_id = int(timestamp // self.bucket_seconds)
+        if bucket_id > self.head:
+            self._advance(bucket_id)
+        if bucket_id <= self.head - self.window_buckets:
+            # Older than the window
+            return
+        slot = bucket_id % self.window_buckets
+        self.bucket_ids[slot] = bucket_id
+
+        key = f"{dimension}:{term}"
+        rows = np.arange(self.depth)
+        columns = self._sketch.indexes(key)
+        values = np.array([1.0, engagement])[:, None]
+        self.buckets[slot][:, rows, columns] += values
+        self.window[:, rows, columns] += values
+
+        candidates = self.candidates[dimension]
+        candidates[term] = float(self.window[0, rows, columns].min())
+        if len(candidates) > 4 * self.top_k:
+            for stale in sorted(candidates, key=candidates.get)[:len(candidates) - 2 * self.top_k]:
+                del candidates[stale]
+
+    def _advance(self, bucket_id):
+        """
+        Moves the head of the window to bucket_id, expiring every bucket that falls out of it.
+        """
+        for slot in range(self.window_buckets):
+            held = self.bucket_ids[slot]
+            if held >= 0 and held <= bucket_id - self.window_buckets:
+                self.window -= self.buckets[slot]
+                self.buckets[slot] = 0
+                self.bucket_ids[slot] = -1
+        self.head = max(self.head, bucket_id)
+
+    # --- Queries ---
+
+    def estimate(self, dimension, term, metric='count', now=None):
+        """
+        Estimated mentions (or engagement) of a term over the window ending now.
+        """
+        self._advance(int((now or time.time()) // self.bucket_seconds))
+        key = f"{dimension}:{term}"
+        return float(self.window[METRICS.index(metric), np.arange(self.depth), self._sketch.indexes(key)].min())
+
+    def top(self, dimension, k=10, metric='count', now=None):
+        """
+        Returns the k heaviest terms of a dimension as [(term, estimate), ...], highest first.
+        Only the bounded candidate set is scored, so the cost does not depend on collection size.
+        """
+        self._advance(int((now or time.time()) // self.bucket_seconds))
+        metric_index = METRICS.index(metric)
+        rows = np.arange(self.depth)
+        scored = []
+        for term in self.candidates[dimension]:
+            value = float(self.window[metric_index, rows, self._sketch.indexes(f"{dimension}:{term}")].min())
+            if value > 0:
+                scored.append((term, value))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+    def trends(self, k=10, metric='engagement', now=None):
+        return {dimension: self.top(dimension, k, metric, now) for dimension in DIMENSIONS}
+
+    # --- Snapshots ---
+
+    def _config(self):
+        return {'bucket_seconds': self.bucket_seconds, 'window_buckets': self.window_buckets,
+                'width': self.width, 'depth': self.depth}
+
+    def save_snapshot(self):
+        """
+        Writes the sketches, candidates and cursors to snapshot_path atomically.
+        """
+        meta = {'config': self._config(), 'head': self.head, 'cursors': self.cursors, 'candidates': self.candidates,
+                'recent_ids': {name: sorted(ids) for name, ids in self.recent_ids.items()}}
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, 'wb') as outfile:
+            np.savez(outfile, buckets=self.buckets, bucket_ids=self.bucket_ids, meta=np.array(json.dumps(meta)))
+        os.replace(temp_path, self.snapshot_path)
+
+    def load_snapshot(self):
+        with np.load(self.snapshot_path) as snapshot:
+            meta = json.loads(str(snapshot['meta']))
+            if meta['config'] != self._config():
+                logger.warning("Ignoring trend snapshot %s: saved with different settings %s", self.snapshot_path, meta['config'])
+                return
+            self.buckets = snapshot['buckets']
+            self.bucket_ids = snapshot['bucket_ids']
+        self.window = self.buckets.sum(axis=0)
+        self.head = meta['head']
+        self.cursors.update(meta['cursors'])
+        self.recent_ids.update({name: set(ids) for name, ids in meta.get('recent_ids', {}).items()})
+        self.candidates.update(meta['candidates'])
+        logger.info("Loaded trend snapshot %s (cursors: %s)", self.snapshot_path, self.cursors)
+
+    def run(self, interval=60, snapshot_every=10):
+        """
+        Consumes new documents every interval seconds, saving a snapshot every snapshot_every passes.
+        """
+        passes = 0
+        try:
+            while True:
+                processed = self.consume()
+                passes += 1
+                if processed:
+                    logger.info("Aggregated %d new documents", processed)
+                if self.snapshot_path and passes % snapshot_every == 0:
+                    self.save_snapshot()
+                time.sleep(interval)
+        finally:
+            if self.snapshot_path:
+                self.save_snapshot()
+
+if __name__ == '__main__':
+    load_dotenv()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    aggregator = TrendAggregator(client['trends'], snapshot_path=os.getenv("TREND_SNAPSHOT_PATH", "trend_snapshot.npz"))
+    aggregator.consume()
+    aggregator.save_snapshot()
+    started = time.perf_counter()
+    trends = aggregator.trends()
+    print(f"Trends ({(time.perf_counter() - started) * 1000:.1f} ms):")
+    print(json.dumps(trends, indent=2))
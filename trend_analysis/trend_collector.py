@@ -1,13 +1,72 @@
 import os
+import sys
 import csv
+import gzip
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import tweepy
 from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from dotenv import load_dotenv
+from rate_limit import TokenBucket
+
+# The shared observability package lives at the repository root.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from observability.metrics import Counter, start_metrics_server, write_textfile
+
+logger = logging.getLogger(__name__)
+
+# Ingestion counters. The CLI serves them on METRICS_PORT while it runs and writes them to
+# METRICS_TEXTFILE (for node_exporter's textfile collector) when it finishes.
+REVIEWS_INGESTED = Counter('reviews_ingested_total', "Review rows written to the reviews collection.")
+REVIEWS_FAILED = Counter('reviews_failed_total', "Review rows that failed to write.")
+TWEETS_STORED = Counter('tweets_stored_total', "Tweets upserted into twitter_posts.")
+TWITTER_REQUESTS = Counter('twitter_requests_total', "Twitter search requests by outcome.", ('outcome',))
+
+TWEET_FIELDS = ["created_at", "author_id", "public_metrics", "lang"]
+
+def _to_number(value):
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+# Converters applied to review CSV columns; columns not listed are stored as stripped strings.
+REVIEW_FIELD_TYPES = {
+    'rating': _to_number,
+}
+
+class _OffsetLineReader:
+    """
+    Iterates decoded lines of a binary stream while tracking how many bytes have been consumed.
+    csv.reader pulls exactly the lines of one record at a time, so after each row the offset
+    is the position where the next row starts.
+    """
+    def __init__(self, stream, offset=0):
+        self.stream = stream
+        self.offset = offset
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.stream.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode('utf-8')
 
 class TrendCollector:
-    def __init__(self):
+    def __init__(self, twitter_client=None):
         """
         Initializes the Trend Collector, connects to MongoDB, and authenticates with the Twitter API.
+        A twitter_client (e.g. FakeSearchClient) can be passed instead, which skips authentication.
         """
         # Load environment variables from .env file
         load_dotenv()
@@ -17,7 +76,13 @@ class TrendCollector:
         self.db = self.mongo_client['trends']
         self.reviews_collection = self.db['reviews']
         self.twitter_collection = self.db['twitter_posts']
-        print("Successfully connected to MongoDB.")
+        # Newest tweet id seen per query, so each run only fetches what is new
+        self.twitter_cursors = self.db['twitter_cursors']
+        logger.info("Successfully connected to MongoDB.")
+
+        if twitter_client is not None:
+            self.twitter_client = twitter_client
+            return
 
         # Twitter API Authentication
         bearer_token = os.getenv("TWITTER_BEARER_TOKEN")
@@ -25,37 +90,144 @@ class TrendCollector:
             raise ValueError("TWITTER_BEARER_TOKEN environment variable not set.")
 
         self.twitter_client = tweepy.Client(bearer_token)
-        print("Successfully authenticated with Twitter API.")
+        logger.info("Successfully authenticated with Twitter API.")
 
-    def collect_reviews_from_csv(self, csv_path):
+    def collect_reviews_from_csv(self, csv_path, chunk_size=5000, workers=4, checkpoint_path=None, resume=True):
         """
-        Reads customer reviews from a CSV file and stores them in MongoDB.
+        Streams customer reviews from a CSV file (optionally gzip-compressed) into MongoDB.
         Assumes CSV has headers: review_id, product_id, user_id, rating, review_text
         Uses review_id to prevent duplicate entries.
+
+        Rows are read in fixed-size chunks and written as unordered bulk upserts by a small pool of
+        threads, so memory stays bounded regardless of file size and a failing chunk does not stop the
+        rest of the import. Fields are converted with REVIEW_FIELD_TYPES (rating becomes a number).
+        After every completed chunk the byte offset is saved to checkpoint_path; a later call resumes
+        from there. For .gz files the offset counts uncompressed bytes. Once a chunk has failed rows the
+        checkpoint stops at the start of that chunk and is kept after the run, so calling again retries
+        it (rows are upserted by review_id, so the chunks after it are simply written again).
+
+        :return: A summary dict with rows, failed_rows and rows_per_sec, or None if the file is missing.
         """
-        try:
-            with open(csv_path, mode='r', encoding='utf-8') as infile:
-                reader = csv.DictReader(infile)
-                operations = []
-                for row in reader:
-                    # Create an operation for each row
-                    operations.append(
-                        UpdateOne(
-                            {'review_id': row['review_id']},
-                            {'$set': row},
-                            upsert=True
-                        )
-                    )
-
-                if operations:
-                    # Bulk write is more efficient than many single writes
-                    self.reviews_collection.bulk_write(operations)
-                    print(f"Upserted {len(operations)} reviews from {csv_path}")
+        checkpoint_path = checkpoint_path or f"{csv_path}.checkpoint"
+        offset, rows_done = 0, 0
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, encoding='utf-8') as infile:
+                checkpoint = json.load(infile)
+            offset, rows_done = checkpoint['offset'], checkpoint['rows']
+            logger.info("Resuming %s at byte %d after %d rows", csv_path, offset, rows_done)
 
+        try:
+            raw = gzip.open(csv_path, 'rb') if csv_path.endswith('.gz') else open(csv_path, 'rb')
         except FileNotFoundError:
-            print(f"Error: The file {csv_path} was not found.")
+            logger.error("The file %s was not found.", csv_path)
+            return None
+
+        started = time.monotonic()
+        try:
+            failed_rows, rows_this_run = self._ingest_reviews(raw, offset, rows_done, chunk_size, workers, checkpoint_path)
         except Exception as e:
-            print(f"An error occurred while processing the CSV file: {e}")
+            # The checkpoint is kept, so calling again resumes after the last completed chunk.
+            logger.error("An error occurred while processing the CSV file: %s", e)
+            return None
+
+        if failed_rows:
+            logger.warning("%d rows failed; %s is kept so the next run retries from the first failed chunk.",
+                           failed_rows, checkpoint_path)
+        elif os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.monotonic() - started
+        summary = {
+            'rows': rows_done + rows_this_run,
+            'failed_rows': failed_rows,
+            'rows_per_sec': rows_this_run / max(elapsed, 1e-9),
+        }
+        logger.info("Upserted %d reviews from %s (%d failed, %.0f rows/sec)",
+                    summary['rows'], csv_path, failed_rows, summary['rows_per_sec'])
+        return summary
+
+    def _ingest_reviews(self, stream, offset, rows_done, chunk_size, workers, checkpoint_path):
+        """
+        Reads stream in chunks and writes them on a thread pool. Returns (failed_rows, rows_read).
+        """
+        started = time.monotonic()
+        rows_this_run = 0
+        failed_rows = 0
+        with stream, ThreadPoolExecutor(max_workers=workers) as executor:
+            header = next(csv.reader([stream.readline().decode('utf-8-sig')]))
+            if offset:
+                stream.seek(offset)
+            lines = _OffsetLineReader(stream, stream.tell())
+            reader = csv.DictReader(lines, fieldnames=header)
+
+            # Chunks finish out of order, but the checkpoint only advances past chunks whose
+            # predecessors are all fully written, so a resume never skips rows.
+            in_flight = deque()
+
+            def complete_oldest():
+                nonlocal failed_rows, rows_this_run
+                future, end_offset, size = in_flight.popleft()
+                failed = future.result()
+                checkpoint_held = failed_rows > 0
+                failed_rows += failed
+                rows_this_run += size
+                REVIEWS_INGESTED.inc(size - failed)
+                REVIEWS_FAILED.inc(failed)
+                if not failed and not checkpoint_held:
+                    self._save_checkpoint(checkpoint_path, end_offset, rows_done + rows_this_run)
+                elapsed = time.monotonic() - started
+                logger.info("Ingested %d reviews (%.0f rows/sec)", rows_done + rows_this_run, rows_this_run / max(elapsed, 1e-9))
+
+            chunk = []
+            for row in reader:
+                chunk.append(self._review_operation(row))
+                if len(chunk) >= chunk_size:
+                    in_flight.append((executor.submit(self._write_reviews, chunk), lines.offset, len(chunk)))
+                    chunk = []
+                    if len(in_flight) >= workers * 2:
+                        complete_oldest()
+            if chunk:
+                in_flight.append((executor.submit(self._write_reviews, chunk), lines.offset, len(chunk)))
+            while in_flight:
+                complete_oldest()
+        return failed_rows, rows_this_run
+
+    def _review_operation(self, row):
+        document = {}
+        for field, value in row.items():
+            if field is None:
+                # Extra columns beyond the header are dropped.
+                continue
+            value = (value or '').strip()
+            converter = REVIEW_FIELD_TYPES.get(field)
+            if converter is not None:
+                try:
+                    value = converter(value)
+                except ValueError:
+                    value = None
+            document[field] = value
+        return UpdateOne({'review_id': document.get('review_id')}, {'$set': document}, upsert=True)
+
+    def _write_reviews(self, operations):
+        """
+        Writes one chunk as an unordered bulk upsert and returns the number of rows that failed.
+        """
+        try:
+            self.reviews_collection.bulk_write(operations, ordered=False)
+            return 0
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            logger.warning("%d reviews in a chunk failed to write: %s", len(errors), errors[:1])
+            return len(errors)
+        except PyMongoError as e:
+            logger.warning("A chunk of %d reviews failed to write: %s", len(operations), e)
+            return len(operations)
+
+    @staticmethod
+    def _save_checkpoint(checkpoint_path, offset, rows):
+        tmp_path = f"{checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as outfile:
+            json.dump({'offset': offset, 'rows': rows}, outfile)
+        os.replace(tmp_path, checkpoint_path)
 
     def collect_tweets(self, query, count=100):
         """
@@ -63,46 +235,140 @@ class TrendCollector:
         Uses tweet ID to prevent duplicate entries.
         """
         try:
-            print(f"Searching for tweets with query: {query}")
+            logger.info("Searching for tweets with query: %s", query)
             # Use the search_recent_tweets method
             response = self.twitter_client.search_recent_tweets(
                 query,
                 max_results=count,
-                tweet_fields=["created_at", "author_id", "public_metrics", "lang"]
+                tweet_fields=TWEET_FIELDS
             )
 
             if not response.data:
-                print("No tweets found for the given query.")
+                logger.info("No tweets found for the given query.")
                 return
 
-            operations = []
-            for tweet in response.data:
-                tweet_doc = {
-                    'tweet_id': tweet.id,
-                    'text': tweet.text,
-                    'created_at': tweet.created_at,
-                    'author_id': tweet.author_id,
-                    'lang': tweet.lang,
-                    'metrics': tweet.public_metrics
-                }
-                operations.append(
-                    UpdateOne(
-                        {'tweet_id': tweet.id},
-                        {'$set': tweet_doc},
-                        upsert=True
-                    )
-                )
-
-            if operations:
-                self.twitter_collection.bulk_write(operations)
-                print(f"Upserted {len(operations)} tweets.")
+            stored = self._store_tweets(response.data)
+            logger.info("Upserted %d tweets.", stored)
 
         except tweepy.errors.TweepyException as e:
-            print(f"An error occurred while fetching tweets: {e}")
+            logger.error("An error occurred while fetching tweets: %s", e)
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            logger.exception("An unexpected error occurred: %s", e)
+
+    def collect_tweets_incremental(self, queries, max_pages=10, workers=4, rate_limiter=None):
+        """
+        Collects only new tweets for many queries concurrently, following pagination tokens.
+
+        Each query resumes from the since_id saved in twitter_cursors by its last complete run; each page
+        is written to twitter_posts as soon as it arrives. All workers share one token bucket (by default
+        the recent-search limit of 450 requests per 15 minutes), and a 429 pauses the bucket until the
+        API's reset time. since_id only advances once pagination reaches the last page. A run that runs
+        out of max_pages or hits an error saves the oldest tweet it stored as until_id instead, and the
+        next run pages on from there, so a backlog longer than max_pages is never skipped.
+
+        :param queries: Search queries, e.g. one per hashtag.
+        :param max_pages: Pages of up to 100 tweets fetched per query per run.
+        :param workers: Queries fetched in parallel.
+        :param rate_limiter: TokenBucket to share with other collectors.
+        :return: {query: tweets stored}
+        """
+        rate_limiter = rate_limiter or TokenBucket(rate=450 / 900, capacity=450)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {query: executor.submit(self._collect_query, query, max_pages, rate_limiter) for query in queries}
+        results = {query: future.result() for query, future in futures.items()}
+        logger.info("Collected %d new tweets for %d queries.", sum(results.values()), len(queries))
+        return results
+
+    def _collect_query(self, query, max_pages, rate_limiter):
+        cursor = self.twitter_cursors.find_one({'_id': query}) or {}
+        since_id = cursor.get('since_id')
+        # A run that stopped before the last page left until_id (the oldest tweet it stored) and the
+        # newest id it saw; this run continues below until_id instead of starting again from the top.
+        resume_below = cursor.get('until_id')
+        until_id = resume_below
+        newest_id = cursor.get('newest_id', since_id)
+        next_token = None
+        finished = False
+        stored = 0
+
+        for _ in range(max_pages):
+            rate_limiter.acquire()
+            try:
+                response = self.twitter_client.search_recent_tweets(
+                    query,
+                    max_results=100,
+                    since_id=since_id,
+                    until_id=resume_below,
+                    next_token=next_token,
+                    tweet_fields=TWEET_FIELDS
+                )
+            except tweepy.errors.TooManyRequests as e:
+                reset = float(e.response.headers.get('x-rate-limit-reset', time.time() + 60))
+                TWITTER_REQUESTS.labels('rate_limited').inc()
+                logger.warning("Rate limited on query '%s', pausing until %.0f", query, reset)
+                rate_limiter.pause_until(reset)
+                continue
+            except tweepy.errors.TweepyException as e:
+                TWITTER_REQUESTS.labels('error').inc()
+                logger.error("An error occurred while fetching tweets for '%s': %s", query, e)
+                break
+
+            TWITTER_REQUESTS.labels('ok').inc()
+            meta = response.meta or {}
+            if response.data:
+                stored += self._store_tweets(response.data)
+            # Results come newest first, so the first page's newest_id is the newest tweet of the run.
+            if meta.get('newest_id') and (newest_id is None or int(meta['newest_id']) > int(newest_id)):
+                newest_id = meta['newest_id']
+            if meta.get('oldest_id'):
+                until_id = meta['oldest_id']
+            next_token = meta.get('next_token')
+            if not next_token:
+                finished = True
+                break
+
+        if finished:
+            # Every tweet between since_id and newest_id is stored, so the next run starts above it.
+            self.twitter_cursors.update_one({'_id': query}, {'$set': {'since_id': newest_id},
+                                                             '$unset': {'until_id': '', 'newest_id': ''}}, upsert=True)
+        elif until_id is not None:
+            # Out of pages (or an error): since_id stays put and the next run resumes below until_id.
+            self.twitter_cursors.update_one({'_id': query}, {'$set': {'until_id': until_id, 'newest_id': newest_id}},
+                                            upsert=True)
+            logger.info("Query '%s' has more pages; the next run continues below tweet %s", query, until_id)
+        logger.info("Stored %d new tweets for query '%s'", stored, query)
+        return stored
+
+    def _store_tweets(self, tweets):
+        """
+        Upserts a page of tweets by tweet id and returns how many were written.
+        """
+        operations = []
+        for tweet in tweets:
+            tweet_doc = {
+                'tweet_id': tweet.id,
+                'text': tweet.text,
+                'created_at': tweet.created_at,
+                'author_id': tweet.author_id,
+                'lang': tweet.lang,
+                'metrics': tweet.public_metrics
+            }
+            operations.append(
+                UpdateOne(
+                    {'tweet_id': tweet.id},
+                    {'$set': tweet_doc},
+                    upsert=True
+                )
+            )
+        if operations:
+            self.twitter_collection.bulk_write(operations, ordered=False)
+            TWEETS_STORED.inc(len(operations))
+        return len(operations)
 
 if __name__ == '__main__':
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+    if os.getenv("METRICS_PORT"):
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
     try:
         collector = TrendCollector()
 
@@ -112,10 +378,10 @@ if __name__ == '__main__':
         collector.collect_reviews_from_csv(csv_path)
         print("--- Finished CSV Collection ---")
 
-        # 2. Collect from Twitter
-        twitter_query = '#modestfashion OR #abaya -is:retweet'
-        print(f"--- Starting Twitter Collection for query: '{twitter_query}' ---")
-        collector.collect_tweets(twitter_query, count=100)
+        # 2. Collect new tweets for each hashtag since the last run
+        twitter_queries = ['#modestfashion -is:retweet', '#abaya -is:retweet', '#hijabfashion -is:retweet']
+        print(f"--- Starting Twitter Collection for queries: {twitter_queries} ---")
+        collector.collect_tweets_incremental(twitter_queries)
         print("--- Finished Twitter Collection ---")
 
     except ValueError as e:
@@ -124,3 +390,6 @@ if __name__ == '__main__':
         print("Please ensure your TWITTER_BEARER_TOKEN is set in a .env file or as an environment variable.")
     except Exception as e:
         print(f"An unexpected error occurred during execution: {e}")
+    finally:
+        if os.getenv("METRICS_TEXTFILE"):
+            write_textfile(os.getenv("METRICS_TEXTFILE"))
@@ -0,0 +1,68 @@
+import argparse
+import glob
+import os
+import time
+import cv2
+import numpy as np
+from virtual_tryon.tryon_engine import TryOnEngine, QUALITY_TIERS, torso_quad
+
+def benchmark(image_paths, repeats=3, pose_estimator=None):
+    """
+    Measures pose detection latency per quality tier and the torso landmark error relative to the
+    'accurate' tier, which is used as the reference.
+
+    Error is the mean distance of the four torso corners (shoulders and hips) in pixels,
+    divided by the image diagonal so photos of different sizes are comparable.
+
+    :param image_paths: Photos of people.
+    :param repeats: Detections timed per photo and tier; at least 1.
+    :param pose_estimator: Passed to every tier's TryOnEngine instead of MediaPipe Pose (see TryOnEngine).
+    :return: {tier: {'latency_ms', 'error', 'detected'}}
+    """
+    if repeats < 1:
+        raise ValueError(f"repeats must be at least 1, got {repeats}.")
+    images = [(path, cv2.imread(path)) for path in image_paths]
+    images = [(path, img) for path, img in images if img is not None]
+
+    quads = {}
+    report = {}
+    for quality in ['accurate'] + [tier for tier in QUALITY_TIERS if tier != 'accurate']:
+        engine = TryOnEngine(quality=quality, pose_estimator=pose_estimator)
+        engine.warm_up()
+        latencies = []
+        quads[quality] = {}
+        for path, img in images:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                pose_result = engine.detect_pose(img)
+                latencies.append(time.perf_counter() - start)
+            if pose_result.landmarks is not None:
+                h, w = img.shape[:2]
+                quads[quality][path] = (torso_quad(pose_result.landmarks, w, h), np.hypot(w, h))
+        engine.close()
+
+        errors = [
+            np.linalg.norm(quad - quads['accurate'][path][0], axis=1).mean() / diagonal
+            for path, (quad, diagonal) in quads[quality].items() if path in quads['accurate']
+        ]
+        report[quality] = {
+            'latency_ms': 1000 * float(np.median(latencies)) if latencies else 0.0,
+            'error': float(np.mean(errors)) if errors else float('nan'),
+            'detected': len(quads[quality]),
+        }
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Latency vs landmark error for each pose quality tier.")
+    parser.add_argument('images', help="Directory of photos of people (jpg/png).")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.images, '*.jpg')) + glob.glob(os.path.join(args.images, '*.png')))
+    if not paths:
+        raise SystemExit(f"No images found in {args.images}.")
+
+    results = benchmark(paths, repeats=args.repeats)
+    print(f"{'tier':<10}{'median ms':>12}{'torso error':>14}{'detected':>10}")
+    for quality, row in results.items():
+        print(f"{quality:<10}{row['latency_ms']:>12.1f}{row['error']:>14.4f}{row['detected']:>10}/{len(paths)}")
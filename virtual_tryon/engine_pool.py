@@ -0,0 +1,92 @@
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class PoolExhausted(RuntimeError):
+    """
+    Raised when no TryOnEngine becomes free within the timeout, or too many requests are already waiting.
+    """
+
+class TryOnEnginePool:
+    def __init__(self, size=None, max_waiting=None, timeout=10.0, engine_factory=None):
+        """
+        A fixed set of pre-warmed TryOnEngine instances shared by all request threads.
+
+        :param size: Number of engines; defaults to the CPU count.
+        :param max_waiting: Requests allowed to queue for an engine before new ones are rejected; defaults to 2 * size.
+        :param timeout: Default seconds to wait for a free engine.
+        :param engine_factory: Callable that builds one engine; defaults to TryOnEngine.
+        """
+        self.size = size or os.cpu_count() or 1
+        self.max_waiting = max_waiting if max_waiting is not None else 2 * self.size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._engines = []
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        if engine_factory is None:
+            # Imported here so importing the pool (e.g. for PoolExhausted) does not load mediapipe.
+            from virtual_tryon.tryon_engine import TryOnEngine
+            engine_factory = TryOnEngine
+
+        for _ in range(self.size):
+            engine = engine_factory()
+            engine.warm_up()
+            self._engines.append(engine)
+            self._idle.put(engine)
+        logger.info("TryOnEnginePool initialized with %d engines.", self.size)
+
+    @contextmanager
+    def engine(self, timeout=None):
+        """
+        Checks out an engine for the duration of the with-block and always returns it afterwards.
+        """
+        engine = self.acquire(timeout)
+        try:
+            yield engine
+        finally:
+            self.release(engine)
+
+    def acquire(self, timeout=None):
+        with self._lock:
+            if self._closed:
+                raise PoolExhausted("TryOnEnginePool is shut down.")
+            if self._idle.empty() and self._waiting >= self.max_waiting:
+                raise PoolExhausted("Too many try-on requests are already waiting.")
+            self._waiting += 1
+        try:
+            return self._idle.get(timeout=self.timeout if timeout is None else timeout)
+        except queue.Empty:
+            raise PoolExhausted("No try-on engine became free in time.") from None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self, engine):
+        # Checked under the lock shutdown() sets it with, so an engine released while the pool shuts
+        # down is either drained by shutdown() or closed here, never left open in the idle queue.
+        with self._lock:
+            if not self._closed:
+                self._idle.put(engine)
+                return
+        engine.close()
+
+    def shutdown(self):
+        """
+        Rejects new checkouts and closes every idle engine; engines still checked out are closed when released.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        logger.info("TryOnEnginePool shut down.")
@@ -0,0 +1,32 @@
+from types import SimpleNamespace
+
+# Normalized (x, y) of the shoulders (11, 12) and hips (23, 24) of an upright torso.
+UPRIGHT_TORSO = {11: (0.65, 0.25), 12: (0.35, 0.25), 23: (0.62, 0.65), 24: (0.38, 0.65)}
+
+class FixedPose:
+    def __init__(self, torso=UPRIGHT_TORSO):
+        """
+        Local stand-in for MediaPipe Pose: every frame gets the same torso, so the try-on pipeline runs
+        without the model files.
+
+        move() shifts the torso between frames and setting present to False simulates frames where no
+        person is found; calls counts process() calls.
+        """
+        self.landmarks = [SimpleNamespace(x=0.5, y=0.5, z=0.0, visibility=1.0) for _ in range(33)]
+        for index, (x, y) in torso.items():
+            self.landmarks[index] = SimpleNamespace(x=x, y=y, z=0.0, visibility=1.0)
+        self.present = True
+        self.calls = 0
+
+    def move(self, dx=0.0, dy=0.0):
+        for index in UPRIGHT_TORSO:
+            self.landmarks[index].x += dx
+            self.landmarks[index].y += dy
+
+    def process(self, rgb_image):
+        self.calls += 1
+        landmarks = SimpleNamespace(landmark=self.landmarks) if self.present else None
+        return SimpleNamespace(pose_landmarks=landmarks, segmentation_mask=None)
+
+    def close(self):
+        pass
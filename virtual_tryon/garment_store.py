@@ -0,0 +1,186 @@
+import glob
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class GarmentAsset:
+    def __init__(self, item_type, levels, mtime=None):
+        """
+        A decoded garment ready for warping.
+
+        :param item_type: Name of the garment (the PNG file name without extension).
+        :param levels: Premultiplied-alpha BGRA arrays, largest first, each half the size of the previous one.
+        :param mtime: Modification time of the PNG the levels were built from.
+        """
+        self.item_type = item_type
+        self.levels = levels
+        self.mtime = mtime
+        self.src_quads = [
+            np.array([[0, 0], [w, 0], [w, h], [0, h]], dtype="float32")
+            for h, w in (level.shape[:2] for level in levels)
+        ]
+
+    def level_for(self, target_w, target_h):
+        """
+        Returns (image, source quad) for the smallest level that still covers the target size,
+        so small torsos warp from a small source instead of downsampling the full garment.
+        """
+        index = 0
+        for i, level in enumerate(self.levels):
+            h, w = level.shape[:2]
+            if w >= target_w and h >= target_h:
+                index = i
+        return self.levels[index], self.src_quads[index]
+
+def default_cache_dir(clothes_dir):
+    """
+    Returns the cache directory used for clothes_dir when none is configured. It is keyed by the absolute
+    path of clothes_dir, so every worker serving the same garments shares it.
+    """
+    digest = hashlib.sha1(os.path.abspath(clothes_dir).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), 'garment_cache', digest)
+
+class GarmentStore:
+    def __init__(self, clothes_dir, cache_dir=None, min_level_size=256, check_interval=2.0):
+        """
+        Decodes every garment PNG once and serves it as premultiplied-alpha arrays at a few resolutions.
+
+        Decoded levels are written as .npy files under cache_dir and memory-mapped, so every worker
+        process on the host shares one copy through the page cache. A garment is rebuilt when its PNG
+        changes on disk; files are checked at most every check_interval seconds.
+
+        The levels of one version of a garment live in cache_dir/<item_type>.<mtime_ns>/. A build writes
+        them to a private temporary directory and renames it into place, so other processes see either
+        every level or none, and two processes building at once never delete each other's files.
+
+        :param clothes_dir: Directory holding <item_type>.png files.
+        :param cache_dir: Where decoded levels are stored. Defaults to a directory per clothes_dir under the
+                          system temp directory; it must not be inside a directory served as static files.
+        :param min_level_size: Levels are halved until the shorter side would drop below this.
+        :param check_interval: Seconds between modification-time checks of a garment's PNG.
+        """
+        self.clothes_dir = clothes_dir
+        self.cache_dir = cache_dir or default_cache_dir(clothes_dir)
+        self.min_level_size = min_level_size
+        self.check_interval = check_interval
+        self._assets = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+    def preload(self):
+        """
+        Loads every garment in clothes_dir up front instead of on first use.
+        """
+        for path in glob.glob(os.path.join(self.clothes_dir, '*.png')):
+            self.get(os.path.splitext(os.path.basename(path))[0])
+        logger.info("GarmentStore preloaded %d garments.", len(self._assets))
+
+    def get(self, item_type):
+        """
+        Returns the GarmentAsset for an item type. Raises KeyError if there is no such garment.
+        """
+        item_type = item_type.lower()
+        asset = self._assets.get(item_type)
+        now = time.monotonic()
+        if asset is not None and now - self._checked_at.get(item_type, 0) < self.check_interval:
+            return asset
+
+        path = self._png_path(item_type)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise KeyError(item_type) from None
+
+        with self._lock:
+            self._checked_at[item_type] = now
+            asset = self._assets.get(item_type)
+            if asset is None or asset.mtime != mtime:
+                try:
+                    asset = self._load(item_type, path, mtime)
+                except FileNotFoundError:
+                    # Another process replaced this version while we were mapping it; the PNG changed again.
+                    asset = self._load(item_type, path, os.stat(path).st_mtime_ns)
+                self._assets[item_type] = asset
+            return asset
+
+    def _png_path(self, item_type):
+        # Only plain file names are accepted so item_type cannot point outside clothes_dir.
+        if os.path.basename(item_type) != item_type or item_type.startswith('.'):
+            raise KeyError(item_type)
+        return os.path.join(self.clothes_dir, f'{item_type}.png')
+
+    def _load(self, item_type, path, mtime):
+        version_dir = os.path.join(self.cache_dir, f'{item_type}.{mtime}')
+        if not os.path.isdir(version_dir):
+            self._build(item_type, path, version_dir)
+        level_paths = sorted(glob.glob(os.path.join(version_dir, '*.npy')),
+                             key=lambda p: int(os.path.basename(p).split('.')[0]))
+        levels = [np.load(level_path, mmap_mode='r') for level_path in level_paths]
+        logger.debug("Loaded garment %s with %d levels.", item_type, len(levels))
+        return GarmentAsset(item_type, levels, mtime)
+
+    def _build(self, item_type, path, version_dir):
+        # Only needed to decode a PNG the cache does not hold yet; serving mapped levels never loads OpenCV.
+        import cv2
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise KeyError(item_type)
+        if image.ndim == 2 or image.shape[2] == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA if image.ndim == 2 else cv2.COLOR_BGR2BGRA)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = f'{version_dir}.{os.getpid()}.{threading.get_ident()}.tmp'
+        os.makedirs(tmp_dir)
+        try:
+            level = premultiply(image)
+            index = 0
+            while True:
+                np.save(os.path.join(tmp_dir, f'{index}.npy'), level)
+                h, w = level.shape[:2]
+                if min(h, w) // 2 < self.min_level_size:
+                    break
+                # Premultiplied alpha downsamples without dark fringes at the garment's edges.
+                level = cv2.resize(level, (w // 2, h // 2), interpolation=cv2.INTER_AREA)
+                index += 1
+            try:
+                os.rename(tmp_dir, version_dir)
+            except OSError:
+                # Another process published the same version first; its levels are identical.
+                if not os.path.isdir(version_dir):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._remove_other_versions(item_type, version_dir)
+
+    def _remove_other_versions(self, item_type, keep):
+        """
+        Deletes levels built from older versions of this garment. Processes still mapping them keep
+        their pages until they reload; files of other garments and in-progress builds are left alone.
+        """
+        old_file = re.compile(re.escape(item_type) + r'\.\d+\.\d+\.npy')  # <item_type>.<mtime>.<level>.npy, the earlier flat layout
+        for entry in os.scandir(self.cache_dir):
+            name, _, version = entry.name.rpartition('.')
+            if name == item_type and version.isdigit() and entry.path != keep and entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            elif old_file.fullmatch(entry.name):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+def premultiply(image):
+    """
+    Returns a BGRA uint8 image with color channels multiplied by alpha (rounded).
+    """
+    alpha = image[:, :, 3:4].astype(np.uint16)
+    premultiplied = image.copy()
+    premultiplied[:, :, :3] = (image[:, :, :3] * alpha + 127) // 255
+    return premultiplied
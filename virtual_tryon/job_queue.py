@@ -0,0 +1,305 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from observability.metrics import record_observations, replay
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(RuntimeError):
+    """
+    Raised when the number of queued and running try-on jobs has reached max_queue,
+    or when the worker pool is down and cannot take the job.
+    """
+
+# Job files older than this are removed when a queue starts on a shared job_dir.
+JOB_FILE_TTL = 3600
+JOB_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+# One TryOnEngine and GarmentStore per worker process, created by the pool initializer.
+# The garment store memory-maps the same decoded files in every worker.
+_worker_engine = None
+_worker_garments = None
+
+def _init_worker(pose_cache_bytes, clothes_dir, garment_cache_dir, quality):
+    global _worker_engine, _worker_garments
+    from virtual_tryon.garment_store import GarmentStore
+    from virtual_tryon.pose_cache import PoseCache
+    from virtual_tryon.tryon_engine import TryOnEngine
+    _worker_engine = TryOnEngine(pose_cache=PoseCache(max_bytes=pose_cache_bytes), quality=quality)
+    _worker_engine.warm_up()
+    _worker_garments = GarmentStore(clothes_dir, garment_cache_dir)
+
+def _run_job(user_image, item_type, output_format, quality):
+    # Stage timings are recorded in this worker process; they travel back with the result so the
+    # serving process can add them to its own /metrics.
+    with record_observations() as observations:
+        result = _worker_engine.tryon_bytes(user_image, _worker_garments.get(item_type), output_format, quality)
+    return result, observations
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class TryOnJob:
+    def __init__(self, job_id, key):
+        self.job_id = job_id
+        self.key = key
+        self.status = 'queued'
+        self.future = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+
+    def to_dict(self):
+        status = self.status
+        if status == 'queued' and self.future is not None and self.future.running():
+            status = 'running'
+        info = {'job_id': self.job_id, 'status': status}
+        if self.error:
+            info['error'] = self.error
+        if self.finished_at is not None:
+            info['latency'] = self.finished_at - self.submitted_at
+        return info
+
+class TryOnJobQueue:
+    def __init__(self, clothes_dir, garment_cache_dir=None, max_workers=None, max_queue=32, max_finished=256,
+                 pose_cache_bytes=64 * 1024 * 1024, quality='accurate', job_dir=None):
+        """
+        Runs try-on jobs on a process pool so request threads only submit and poll.
+
+        Jobs live in the memory of the process that submitted them. When several serving processes
+        take polls for the same jobs (serving/prefork.py), give them a common job_dir: each job's
+        status is also written to <job_id>.json there and its result to <job_id>.result, and get()
+        falls back to those files for jobs another process owns. A queued job whose owning process
+        has died is reported as failed.
+
+        :param clothes_dir: Directory of garment PNGs, served to workers through a GarmentStore.
+        :param garment_cache_dir: Where the GarmentStore keeps decoded levels.
+        :param max_workers: Worker processes, each holding its own TryOnEngine; defaults to the CPU count.
+        :param max_queue: Maximum queued plus running jobs before submissions are rejected with QueueFull.
+        :param max_finished: Finished jobs kept for polling; the oldest are dropped first.
+        :param pose_cache_bytes: Pose cache budget in each worker process.
+        :param quality: Pose fidelity tier of the worker engines (see QUALITY_TIERS).
+        :param job_dir: Directory shared with the other serving processes, or None to keep jobs in memory only.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.job_dir = job_dir
+        if job_dir:
+            os.makedirs(job_dir, exist_ok=True)
+            self._remove_expired_files()
+        self.max_queue = max_queue
+        self.max_finished = max_finished
+        self._initargs = (pose_cache_bytes, clothes_dir, garment_cache_dir, quality)
+        self._executor = self._create_executor()
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_key = {}
+        self._finished = OrderedDict()
+        self._in_flight = 0
+        self._latencies = deque(maxlen=1000)
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.failed = 0
+        logger.info("TryOnJobQueue initialized with %d workers.", self.max_workers)
+
+    def submit(self, user_image, item_type, output_format='jpeg', quality=90):
+        """
+        Queues a try-on and returns its job id right away.
+        Submitting the same photo and garment again returns the existing job instead of a new one.
+        """
+        digest = hashlib.blake2b(user_image, digest_size=16)
+        digest.update(f"|{item_type}|{output_format}|{quality}".encode())
+        key = digest.hexdigest()
+
+        with self._lock:
+            existing = self._by_key.get(key)
+            if existing is not None and existing.status != 'failed':
+                self.deduplicated += 1
+                return existing.job_id
+            if self._in_flight >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull("Too many try-on jobs are queued.")
+            job = TryOnJob(uuid.uuid4().hex, key)
+            self._jobs[job.job_id] = job
+            self._by_key[key] = job
+            self._in_flight += 1
+            self.submitted += 1
+        self._write_status(job)
+
+        executor = self._executor
+        try:
+            future = executor.submit(_run_job, user_image, item_type, output_format, quality)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Nothing will ever finish this job, so it must not hold a slot or absorb resubmissions.
+            with self._lock:
+                # Anyone who was handed this job id meanwhile polls a failed job, not one stuck in 'queued'.
+                job.status = 'failed'
+                job.error = "The try-on workers are unavailable."
+                job.finished_at = time.monotonic()
+                if self._by_key.get(key) is job:
+                    del self._by_key[key]
+                self._in_flight -= 1
+                dropped = self._retire(job)
+                self.submitted -= 1
+                self.rejected += 1
+                if isinstance(e, BrokenProcessPool) and self._executor is executor:
+                    # A worker died (e.g. killed for memory). Jobs already on the old pool fail through
+                    # _finish; later submissions go to a fresh pool.
+                    logger.warning("Try-on worker pool is broken, starting a new one: %s", e)
+                    self._executor = self._create_executor()
+            self._publish(job, dropped)
+            raise QueueFull(f"The try-on workers are unavailable: {e}") from e
+        job.future = future
+        future.add_done_callback(lambda future: self._finish(job, future))
+        return job.job_id
+
+    def _create_executor(self):
+        # Workers are spawned rather than forked: the serving process runs request and flusher threads,
+        # and a forked child could inherit a lock one of them held.
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=self._initargs)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.job_dir and JOB_ID_RE.fullmatch(job_id):
+            job = self._read_status(job_id)
+        return job
+
+    def _job_path(self, job_id, suffix):
+        return os.path.join(self.job_dir, f"{job_id}.{suffix}")
+
+    def _write_status(self, job):
+        """
+        Publishes a job's state to job_dir. The result is written before the status that points to it,
+        and both through a rename, so a reader never sees a partial file.
+        """
+        if not self.job_dir:
+            return
+        info = {'status': job.status, 'error': job.error, 'pid': os.getpid(),
+                'latency': None if job.finished_at is None else job.finished_at - job.submitted_at}
+        try:
+            if job.result is not None:
+                self._write_file(self._job_path(job.job_id, 'result'), job.result)
+            self._write_file(self._job_path(job.job_id, 'json'), json.dumps(info).encode())
+        except OSError as e:
+            logger.warning("Could not write try-on job %s to %s: %s", job.job_id, self.job_dir, e)
+
+    @staticmethod
+    def _write_file(path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as outfile:
+            outfile.write(data)
+        os.replace(tmp_path, path)
+
+    def _read_status(self, job_id):
+        try:
+            with open(self._job_path(job_id, 'json'), 'rb') as infile:
+                info = json.load(infile)
+            result = None
+            if info['status'] == 'done':
+                with open(self._job_path(job_id, 'result'), 'rb') as infile:
+                    result = infile.read()
+        except (OSError, ValueError):
+            return None
+        job = TryOnJob(job_id, None)
+        job.status, job.error, job.result = info['status'], info['error'], result
+        if info['latency'] is not None:
+            job.finished_at = job.submitted_at + info['latency']
+        elif not _process_alive(info['pid']):
+            job.status = 'failed'
+            job.error = "The server process running this try-on stopped."
+        return job
+
+    def _remove_job_files(self, job_id):
+        for suffix in ('json', 'result'):
+            try:
+                os.remove(self._job_path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _remove_expired_files(self):
+        cutoff = time.time() - JOB_FILE_TTL
+        for entry in os.scandir(self.job_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _finish(self, job, future):
+        try:
+            result, observations = future.result()
+            replay(observations)
+            error = None if result is not None else "Could not find a person in the photo."
+        except Exception as e:
+            result, error = None, str(e)
+
+        with self._lock:
+            job.future = None
+            job.finished_at = time.monotonic()
+            job.result = result
+            job.error = error
+            job.status = 'done' if error is None else 'failed'
+            if error is not None:
+                self.failed += 1
+            self._latencies.append(job.finished_at - job.submitted_at)
+            self._in_flight -= 1
+            dropped = self._retire(job)
+        self._publish(job, dropped)
+
+    def _publish(self, job, dropped):
+        # Writes a finished job to job_dir and removes the files of the jobs _retire dropped.
+        self._write_status(job)
+        if self.job_dir:
+            for job_id in dropped:
+                self._remove_job_files(job_id)
+
+    def _retire(self, job):
+        # Called with self._lock held. Returns the ids of the jobs dropped to make room.
+        self._finished[job.job_id] = job
+        dropped_ids = []
+        while len(self._finished) > self.max_finished:
+            _, dropped = self._finished.popitem(last=False)
+            self._jobs.pop(dropped.job_id, None)
+            if self._by_key.get(dropped.key) is dropped:
+                del self._by_key[dropped.key]
+            dropped_ids.append(dropped.job_id)
+        return dropped_ids
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            def percentile(p):
+                return latencies[min(int(p * len(latencies)), len(latencies) - 1)] if latencies else 0.0
+            return {
+                'queue_depth': self._in_flight,
+                'max_queue': self.max_queue,
+                'workers': self.max_workers,
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'latency_p50': percentile(0.50),
+                'latency_p99': percentile(0.99),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        logger.info("TryOnJobQueue shut down.")
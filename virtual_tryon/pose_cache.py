@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Charged per cached entry on top of its arrays, for the key, the PoseResult and the dict slot.
+# Without it a photo with no person (no arrays at all) would cost nothing and never be evicted.
+ENTRY_OVERHEAD_BYTES = 512
+
+class PoseResult:
+    def __init__(self, landmarks, segmentation_mask=None):
+        """
+        Pose detection output in plain arrays, so it can be cached and shared between engines.
+
+        :param landmarks: float32 array of shape (33, 4) with normalized x, y, z and visibility, or None if no pose was found.
+        :param segmentation_mask: uint8 array (0-255) of the person mask at image resolution, or None.
+        """
+        self.landmarks = landmarks
+        self.segmentation_mask = segmentation_mask
+
+    @property
+    def nbytes(self):
+        size = 0
+        if self.landmarks is not None:
+            size += self.landmarks.nbytes
+        if self.segmentation_mask is not None:
+            size += self.segmentation_mask.nbytes
+        return size
+
+def image_key(image):
+    """
+    Content hash of a decoded image. Identical pixels give the same key regardless of file name or encoding.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(image.shape).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+class PoseCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, spill_dir=None, spill_max_bytes=None):
+        """
+        Process-wide LRU cache of pose results keyed by image content hash, bounded in bytes.
+
+        :param max_bytes: Memory budget for cached landmarks and masks.
+        :param spill_dir: Optional directory where evicted entries are written and reloaded from on a miss.
+        :param spill_max_bytes: Disk budget of spill_dir; defaults to 4 * max_bytes. When a write takes it
+            over budget the directory is rescanned and the least recently used files are deleted down to
+            90% of it. Processes sharing the directory only count their own writes between rescans.
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes if spill_max_bytes is not None else 4 * max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._spill_bytes = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._trim_spill_dir()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+        result = self._load_spilled(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self.put(key, result)
+        return result
+
+    def put(self, key, result):
+        spilled = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes + ENTRY_OVERHEAD_BYTES
+            self._entries[key] = result
+            self._bytes += result.nbytes + ENTRY_OVERHEAD_BYTES
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes + ENTRY_OVERHEAD_BYTES
+                self.evictions += 1
+                spilled.append((evicted_key, evicted))
+        # Disk writes happen outside the lock so other threads are not held up.
+        for evicted_key, evicted in spilled:
+            self._spill(evicted_key, evicted)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.npz")
+
+    def _spill(self, key, result):
+        if not self.spill_dir:
+            return
+        arrays = {}
+        if result.landmarks is not None:
+            arrays['landmarks'] = result.landmarks
+        if result.segmentation_mask is not None:
+            arrays['segmentation_mask'] = result.segmentation_mask
+        # Write to a temporary name first so a concurrent reader never sees a partial file.
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            # Reloaded from disk earlier and unchanged since; just mark it recently used.
+            os.utime(path)
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as outfile:
+            np.savez(outfile, **arrays)
+        os.replace(tmp_path, path)
+        with self._spill_lock:
+            self._spill_bytes += os.path.getsize(path)
+            over_budget = self._spill_bytes > self.spill_max_bytes
+        if over_budget:
+            self._trim_spill_dir()
+
+    def _trim_spill_dir(self):
+        """
+        Deletes the least recently used spill files until the directory is within 90% of spill_max_bytes.
+        """
+        with self._spill_lock:
+            files = []
+            for entry in os.scandir(self.spill_dir):
+                if not entry.name.endswith('.npz'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            target = self.spill_max_bytes * 0.9 if total > self.spill_max_bytes else total
+            removed = 0
+            for _, size, path in sorted(files):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            self._spill_bytes = total
+        if removed:
+            logger.debug("Removed %d pose cache files from %s", removed, self.spill_dir)
+
+    def _load_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        try:
+            with np.load(self._spill_path(key)) as data:
+                return PoseResult(
+                    data['landmarks'] if 'landmarks' in data else None,
+                    data['segmentation_mask'] if 'segmentation_mask' in data else None)
+        except (OSError, ValueError):
+            return None
@@ -1,18 +1,136 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import mediapipe as mp
 import numpy as np
+from virtual_tryon.garment_store import GarmentAsset
+from virtual_tryon.pose_cache import PoseResult, image_key
+from observability.metrics import Histogram
 
-class TryOnEngine:
+logger = logging.getLogger(__name__)
+
+PoseLandmark = mp.solutions.pose.PoseLandmark
+
+# Per-stage latency of the try-on pipeline, exposed on /metrics.
+STAGE_SECONDS = Histogram('tryon_stage_seconds', "Time spent in each try-on stage.", ('stage',))
+DECODE_STAGE = STAGE_SECONDS.labels('decode')
+POSE_STAGE = STAGE_SECONDS.labels('pose')
+WARP_STAGE = STAGE_SECONDS.labels('warp')
+BLEND_STAGE = STAGE_SECONDS.labels('blend')
+ENCODE_STAGE = STAGE_SECONDS.labels('encode')
+
+ENCODE_PARAMS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+def decode_image(image, flags):
+    """
+    Decodes encoded bytes; NumPy arrays and GarmentAssets are returned unchanged.
+    """
+    if not isinstance(image, (bytes, bytearray, memoryview)):
+        return image
+    return cv2.imdecode(np.frombuffer(image, dtype=np.uint8), flags)
+
+def encode_image(image, output_format='jpeg', quality=90):
+    """
+    Encodes a BGR image to JPEG or WebP bytes.
+    """
+    if output_format not in ENCODE_PARAMS:
+        raise ValueError(f"Unsupported output format '{output_format}'. Expected one of {list(ENCODE_PARAMS)}.")
+    extension, quality_flag = ENCODE_PARAMS[output_format]
+    ok, encoded = cv2.imencode(extension, image, [quality_flag, int(quality)])
+    if not ok:
+        raise ValueError(f"Could not encode image as {output_format}.")
+    return encoded.tobytes()
+
+def torso_quad(landmarks, w, h):
+    """
+    Returns the destination quadrilateral on the user's body in pixel coordinates.
+    This is a simplified model for a t-shirt, mapping its corners to the user's torso
+    (left shoulder, right shoulder, right hip, left hip).
+    """
+    indexes = [PoseLandmark.LEFT_SHOULDER.value, PoseLandmark.RIGHT_SHOULDER.value,
+               PoseLandmark.RIGHT_HIP.value, PoseLandmark.LEFT_HIP.value]
+    return (landmarks[indexes, :2] * np.array([w, h], dtype=np.float32)).astype(np.float32)
+
+def source_quad(clothing_img):
+    """
+    Source points are the corners of the clothing image.
+    Assuming the clothing image is a flat, frontal view of the item.
+    """
+    cloth_h, cloth_w = clothing_img.shape[:2]
+    return np.array([[0, 0], [cloth_w, 0], [cloth_w, cloth_h], [0, cloth_h]], dtype="float32")
+
+class ScratchBuffers:
     def __init__(self):
         """
+        Named buffers reused between calls, grown only when a larger one is needed.
+        Not thread-safe; each thread compositing concurrently needs its own instance.
+        """
+        self._buffers = {}
+
+    def get(self, name, shape, dtype):
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.size < size or buffer.dtype != dtype:
+            buffer = np.empty(size, dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+# Pose fidelity tiers: MediaPipe model complexity and the longest image side pose detection runs on
+# (None = full resolution). Landmarks are normalized, so they map back to full resolution unchanged.
+QUALITY_TIERS = {
+    'fast': {'model_complexity': 0, 'detection_max_side': 640},
+    'balanced': {'model_complexity': 1, 'detection_max_side': 1024},
+    'accurate': {'model_complexity': 2, 'detection_max_side': None},
+}
+
+class TryOnEngine:
+    def __init__(self, pose_cache=None, static_image_mode=True, quality='accurate', enable_segmentation=False,
+                 pose_estimator=None, batch_workers=None):
+        """
         Initializes the Try-On Engine with Mediapipe Pose.
+
+        :param pose_cache: Optional PoseCache shared between engines, so the same photo is only run through pose detection once.
+        :param static_image_mode: True for independent photos; False to track landmarks across video frames.
+        :param quality: One of QUALITY_TIERS: 'fast', 'balanced' or 'accurate'.
+        :param enable_segmentation: Also compute the person segmentation mask. Nothing in the
+                                    try-on pipeline uses it yet, so it is off unless a caller needs it.
+        :param pose_estimator: Object with MediaPipe Pose's process(rgb_image) and close() methods, used instead
+                               of building MediaPipe Pose for the tier; lets tests and benchmarks run the
+                               pipeline without the model files.
+        :param batch_workers: Threads tryon_batch composites with; defaults to the CPU count. The threads
+                              and their scratch buffers are created on the first batch and kept until close().
         """
-        self.pose = mp.solutions.pose.Pose(
-            static_image_mode=True,
-            model_complexity=2,
-            enable_segmentation=True,
+        if quality not in QUALITY_TIERS:
+            raise ValueError(f"Unknown quality tier '{quality}'. Expected one of {list(QUALITY_TIERS)}.")
+        tier = QUALITY_TIERS[quality]
+        self.quality = quality
+        self.detection_max_side = tier['detection_max_side']
+        self.pose = pose_estimator or mp.solutions.pose.Pose(
+            static_image_mode=static_image_mode,
+            model_complexity=tier['model_complexity'],
+            enable_segmentation=enable_segmentation,
             min_detection_confidence=0.5)
-        print("TryOnEngine initialized.")
+        self.pose_cache = pose_cache
+        self._closed = False
+        # Scratch buffers reused across calls by the compositing step
+        self._buffers = ScratchBuffers()
+        self.batch_workers = batch_workers or os.cpu_count() or 1
+        self._batch_executor = None
+        self._batch_lock = threading.Lock()
+        # One ScratchBuffers per batch thread, kept for the life of the executor.
+        self._batch_buffers = threading.local()
+        logger.info("TryOnEngine initialized (quality=%s).", quality)
+
+    def warm_up(self):
+        """
+        Runs the pose model once on a blank frame so the first real request does not pay for graph setup.
+        """
+        self.pose.process(np.zeros((256, 256, 3), dtype=np.uint8))
 
     def apply_tryon(self, user_image_path, clothing_image_path, output_path):
         """
@@ -23,82 +141,250 @@ class TryOnEngine:
         :param output_path: Path to save the resulting image.
         """
         # 1. Load images
-        user_img = cv2.imread(user_image_path)
-        clothing_img = cv2.imread(clothing_image_path, cv2.IMREAD_UNCHANGED)
+        with DECODE_STAGE.time():
+            user_img = cv2.imread(user_image_path)
+            clothing_img = cv2.imread(clothing_image_path, cv2.IMREAD_UNCHANGED)
 
         if user_img is None or clothing_img is None:
-            print("Error: Could not load one or both images.")
+            logger.warning("Could not load one or both images.")
             return
 
-        # 2. Detect pose
-        # Convert the BGR image to RGB.
-        rgb_user_img = cv2.cvtColor(user_img, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(rgb_user_img)
+        final_img = self.render(user_img, clothing_img)
+        if final_img is None:
+            return
+
+        # 6. Save result
+        with ENCODE_STAGE.time():
+            cv2.imwrite(output_path, final_img)
+        logger.debug("Saved final image to %s", output_path)
+
+    def tryon_bytes(self, user_image, clothing_image, output_format='jpeg', quality=90):
+        """
+        Applies a piece of clothing to a user's photo entirely in memory.
+
+        :param user_image: Encoded image bytes (JPEG/PNG/...) or a decoded BGR NumPy array.
+        :param clothing_image: Encoded PNG bytes, a decoded BGRA NumPy array or a GarmentAsset.
+        :param output_format: 'jpeg' or 'webp'.
+        :param quality: Encoder quality, 1-100.
+        :return: The encoded result, or None if the images could not be decoded or no pose was found.
+        """
+        # 1. Decode images
+        with DECODE_STAGE.time():
+            user_img = decode_image(user_image, cv2.IMREAD_COLOR)
+            clothing_img = decode_image(clothing_image, cv2.IMREAD_UNCHANGED)
+
+        if user_img is None or clothing_img is None:
+            logger.warning("Could not decode one or both images.")
+            return None
+
+        # A decoded photo belongs to this call and is drawn on directly; a caller's array is left
+        # untouched and the result goes to the engine's reusable output buffer instead.
+        out = self._buffers.get('output', user_img.shape, np.uint8) if user_img is user_image else None
+        final_img = self.render(user_img, clothing_img, out=out)
+        if final_img is None:
+            return None
+
+        # 6. Encode result
+        with ENCODE_STAGE.time():
+            return encode_image(final_img, output_format, quality)
+
+    def render(self, user_img, clothing_img, out=None):
+        """
+        Runs pose detection, warping and blending on decoded images.
+
+        The garment is drawn into out, which must have user_img's shape, and out is returned; without
+        out, user_img itself is modified in place and returned. None is returned if no pose was found.
+        """
+        # 2. Detect pose (or reuse the landmarks cached for these exact pixels)
+        with POSE_STAGE.time():
+            pose_result = self.detect_pose(user_img)
 
-        if not results.pose_landmarks:
-            print("Error: Could not detect pose landmarks in the user image.")
+        if pose_result.landmarks is None:
+            logger.info("Could not detect pose landmarks in the user image.")
             return
 
-        landmarks = results.pose_landmarks.landmark
         h, w, _ = user_img.shape
-        print("Successfully detected pose landmarks.")
 
         # 3. Calculate transformation
-        # Get coordinates of key landmarks for the torso
-        left_shoulder = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER.value].x * w, landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER.value].y * h]
-        right_shoulder = [landmarks[mp.solutions.pose.PoseLandmark.RIGHT_SHOULDER.value].x * w, landmarks[mp.solutions.pose.PoseLandmark.RIGHT_SHOULDER.value].y * h]
-        left_hip = [landmarks[mp.solutions.pose.PoseLandmark.LEFT_HIP.value].x * w, landmarks[mp.solutions.pose.PoseLandmark.LEFT_HIP.value].y * h]
-        right_hip = [landmarks[mp.solutions.pose.PoseLandmark.RIGHT_HIP.value].x * w, landmarks[mp.solutions.pose.PoseLandmark.RIGHT_HIP.value].y * h]
-
-        # Define the destination quadrilateral on the user's body.
-        # This is a simplified model for a t-shirt, mapping its corners to the user's torso.
-        dst_points = np.array([left_shoulder, right_shoulder, right_hip, left_hip], dtype="float32")
-
-        # Source points are the corners of the clothing image.
-        # Assuming the clothing image is a flat, frontal view of the item.
-        cloth_h, cloth_w, _ = clothing_img.shape
-        src_points = np.array([[0, 0], [cloth_w, 0], [cloth_w, cloth_h], [0, cloth_h]], dtype="float32")
-
-        # Calculate the perspective transformation matrix
-        M = cv2.getPerspectiveTransform(src_points, dst_points)
-        print("Calculated perspective transformation matrix.")
-
-        # 4. Warp clothing
-        # Warp the clothing image to fit the user's torso
-        warped_clothing = cv2.warpPerspective(clothing_img, M, (w, h))
-        print("Warped clothing image.")
-
-        # 5. Overlay and blend
-        # Create a mask from the alpha channel of the warped clothing image
-        alpha_channel = warped_clothing[:, :, 3]
-        mask = alpha_channel > 0
-
-        # To blend, we can convert the boolean mask to a 3-channel image
-        # where the mask is 1 (or 255) and the rest is 0.
-        mask_3_channel = np.zeros_like(user_img)
-        for i in range(3):
-            mask_3_channel[:,:,i] = mask
-
-        # Black out the area of the clothing on the user image
-        torso_region = cv2.bitwise_and(user_img, cv2.bitwise_not(mask_3_channel))
-
-        # Isolate the clothing from the warped image (without alpha channel)
-        warped_clothing_bgr = warped_clothing[:, :, :3]
-        clothing_region = cv2.bitwise_and(warped_clothing_bgr, mask_3_channel)
-
-        # Add the two images together to get the final result
-        final_img = cv2.add(torso_region, clothing_region)
-        print("Overlayed and blended images.")
+        dst_points = torso_quad(pose_result.landmarks, w, h)
 
-        # 6. Save result
-        cv2.imwrite(output_path, final_img)
-        print(f"Saved final image to {output_path}")
+        if out is not None and out is not user_img:
+            np.copyto(out, user_img)
+            user_img = out
 
-    def __del__(self):
+        # 4 & 5. Warp the clothing into the torso's bounding box and alpha-blend it in place
+        return self.composite(user_img, clothing_img, dst_points)
+
+    def tryon_batch(self, user_image, clothing_images, output_format='jpeg', quality=90):
+        """
+        Applies many garments to one photo. Pose detection runs once; warping, blending and
+        encoding for each garment run on the engine's batch_workers threads (OpenCV and NumPy
+        release the GIL). Each thread composites into its own reused copy of the photo.
+
+        :param user_image: Encoded image bytes or a decoded BGR NumPy array.
+        :param clothing_images: List of encoded PNG bytes, decoded BGRA arrays or GarmentAssets.
+        :param output_format: 'jpeg' or 'webp'.
+        :param quality: Encoder quality, 1-100.
+        :return: A list of encoded results in the same order as clothing_images (None for garments that
+                 could not be decoded), or None if the photo could not be decoded or no pose was found.
+        """
+        # 1. Decode the photo
+        with DECODE_STAGE.time():
+            user_img = decode_image(user_image, cv2.IMREAD_COLOR)
+        if user_img is None:
+            logger.warning("Could not decode the user image.")
+            return None
+
+        # 2. Detect pose once for every garment
+        with POSE_STAGE.time():
+            pose_result = self.detect_pose(user_img)
+        if pose_result.landmarks is None:
+            logger.info("Could not detect pose landmarks in the user image.")
+            return None
+
+        # 3. The torso quad is shared; only the source quad depends on the garment
+        h, w, _ = user_img.shape
+        dst_points = torso_quad(pose_result.landmarks, w, h)
+
+        def render_one(clothing_image):
+            with DECODE_STAGE.time():
+                clothing_img = decode_image(clothing_image, cv2.IMREAD_UNCHANGED)
+            if clothing_img is None:
+                return None
+            buffers = getattr(self._batch_buffers, 'buffers', None)
+            if buffers is None:
+                buffers = self._batch_buffers.buffers = ScratchBuffers()
+            # 4 & 5. Composite onto this thread's copy of the photo, then 6. encode it before the copy is reused
+            frame = buffers.get('frame', user_img.shape, np.uint8)
+            np.copyto(frame, user_img)
+            final_img = self.composite(frame, clothing_img, dst_points, buffers=buffers)
+            with ENCODE_STAGE.time():
+                return encode_image(final_img, output_format, quality)
+
+        results = list(self._executor().map(render_one, clothing_images))
+        logger.debug("Rendered %d garments with one pose detection.", len(results))
+        return results
+
+    def _executor(self):
+        with self._batch_lock:
+            if self._batch_executor is None:
+                self._batch_executor = ThreadPoolExecutor(max_workers=self.batch_workers,
+                                                          thread_name_prefix='tryon-batch')
+            return self._batch_executor
+
+    def detect_pose(self, user_img):
+        """
+        Runs pose detection on a BGR image and returns a PoseResult.
+        Large images are downscaled to the tier's detection_max_side first.
+        With a pose cache configured, results are keyed by the image's content hash and reused.
+        """
+        key = None
+        if self.pose_cache is not None:
+            # Tiers produce different landmarks for the same pixels, so the tier is part of the key.
+            key = f"{image_key(user_img)}:{self.quality}"
+            cached = self.pose_cache.get(key)
+            if cached is not None:
+                return cached
+
+        h, w = user_img.shape[:2]
+        detection_img = user_img
+        if self.detection_max_side and max(h, w) > self.detection_max_side:
+            factor = self.detection_max_side / max(h, w)
+            size = (max(1, round(w * factor)), max(1, round(h * factor)))
+            detection_img = cv2.resize(user_img, size, interpolation=cv2.INTER_AREA,
+                                       dst=self._buffers.get('detection', (size[1], size[0], 3), np.uint8))
+
+        # Convert the BGR image to RGB, reusing the same buffer between calls.
+        rgb_user_img = cv2.cvtColor(detection_img, cv2.COLOR_BGR2RGB,
+                                    dst=self._buffers.get('rgb', detection_img.shape, np.uint8))
+        results = self.pose.process(rgb_user_img)
+
+        landmarks = None
+        segmentation_mask = None
+        if results.pose_landmarks:
+            landmarks = np.array(
+                [[lm.x, lm.y, lm.z, lm.visibility] for lm in results.pose_landmarks.landmark], dtype=np.float32)
+        if getattr(results, 'segmentation_mask', None) is not None:
+            segmentation_mask = (results.segmentation_mask * 255).astype(np.uint8)
+            if segmentation_mask.shape != (h, w):
+                segmentation_mask = cv2.resize(segmentation_mask, (w, h), interpolation=cv2.INTER_LINEAR)
+        pose_result = PoseResult(landmarks, segmentation_mask)
+
+        if key is not None:
+            self.pose_cache.put(key, pose_result)
+        return pose_result
+
+    def composite(self, user_img, clothing_img, dst_points, buffers=None):
         """
-        Cleans up the Mediapipe Pose object.
+        Warps clothing_img onto dst_points and alpha-blends it into user_img in place.
+        clothing_img is a straight-alpha BGRA array or a premultiplied GarmentAsset; for an asset the
+        resolution level closest to the destination size is used.
+
+        Only the bounding box of the destination quad is warped and blended, so no full-frame
+        temporaries are allocated; blending uses integer arithmetic in reusable scratch buffers.
+        For opaque pixels (alpha 255) the garment replaces the photo exactly.
+        buffers defaults to the engine's own ScratchBuffers; concurrent callers must pass their own.
         """
-        self.pose.close()
+        buffers = buffers if buffers is not None else self._buffers
+        h, w = user_img.shape[:2]
+        # One pixel of margin on each side: bilinear sampling gives the pixels just outside the quad
+        # partial coverage.
+        x0, y0 = np.floor(dst_points.min(axis=0)).astype(int) - 1
+        x1, y1 = np.ceil(dst_points.max(axis=0)).astype(int) + 1
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, w), min(y1, h)
+        if x0 >= x1 or y0 >= y1:
+            return user_img
+
+        roi_w, roi_h = x1 - x0, y1 - y0
+        premultiplied = isinstance(clothing_img, GarmentAsset)
+        if premultiplied:
+            quad_size = dst_points.max(axis=0) - dst_points.min(axis=0)
+            clothing_img, src_points = clothing_img.level_for(*quad_size)
+        else:
+            src_points = source_quad(clothing_img)
+
+        # Shift the destination quad so the warp renders straight into ROI coordinates.
+        with WARP_STAGE.time():
+            M = cv2.getPerspectiveTransform(src_points, dst_points - np.float32([x0, y0]))
+            warped = cv2.warpPerspective(clothing_img, M, (roi_w, roi_h),
+                                         dst=buffers.get('warped', (roi_h, roi_w, 4), np.uint8),
+                                         borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        with BLEND_STAGE.time():
+            self._blend(user_img[y0:y1, x0:x1], warped, buffers, premultiplied)
+        return user_img
+
+    def _blend(self, roi, warped, buffers, premultiplied=False):
+        """
+        roi = round((garment * alpha + roi * (255 - alpha)) / 255), computed in uint16 scratch buffers.
+        For premultiplied garments garment * alpha is already stored, so it is scaled by 255 instead.
+        """
+        shape = roi.shape
+        alpha = buffers.get('alpha', shape[:2] + (1,), np.uint16)
+        blended = buffers.get('blended', shape, np.uint16)
+        background = buffers.get('background', shape, np.uint16)
+
+        np.copyto(alpha, warped[:, :, 3:4])
+        np.multiply(warped[:, :, :3], 255 if premultiplied else alpha, out=blended, dtype=np.uint16)
+        np.subtract(255, alpha, out=alpha)
+        np.multiply(roi, alpha, out=background)
+        np.add(blended, background, out=blended)
+        np.add(blended, 127, out=blended)
+        np.floor_divide(blended, 255, out=blended)
+        np.copyto(roi, blended, casting='unsafe')
+
+    def close(self):
+        """
+        Cleans up the Mediapipe Pose object and the batch threads. Safe to call more than once.
+        """
+        if not getattr(self, '_closed', True):
+            self._closed = True
+            self.pose.close()
+            if self._batch_executor is not None:
+                self._batch_executor.shutdown(wait=False)
+
+    def __del__(self):
+        self.close()
 
 if __name__ == '__main__':
     # --- Example Usage ---
@@ -0,0 +1,151 @@
+import argparse
+import time
+import cv2
+import numpy as np
+from virtual_tryon.tryon_engine import TryOnEngine, torso_quad
+
+def frames_from_source(source):
+    """
+    Yields BGR frames from a webcam index (e.g. 0) or a local video file path.
+    """
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video source {source}.")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        capture.release()
+
+class VideoTryOn:
+    def __init__(self, clothing_img, engine=None, target_fps=None, smoothing=0.6, max_detect_interval=5):
+        """
+        Streams a garment onto video frames using MediaPipe's tracking mode.
+
+        Landmarks are smoothed with an exponential moving average to remove jitter; the average is reset
+        when a detection finds nobody. When a target FPS is set and frames take longer than the budget,
+        pose detection runs only every few frames (up to max_detect_interval) while the garment is still
+        composited on every frame with the last landmarks.
+
+        :param clothing_img: BGRA garment array or GarmentAsset.
+        :param engine: TryOnEngine created with static_image_mode=False; one is created if omitted.
+        :param target_fps: Frames per second to sustain, or None to detect on every frame.
+        :param smoothing: Weight of the previous landmarks in the moving average (0 disables smoothing).
+        :param max_detect_interval: Largest number of frames between pose detections.
+        """
+        self.clothing_img = clothing_img
+        self.engine = engine or TryOnEngine(static_image_mode=False)
+        self.target_fps = target_fps
+        self.smoothing = smoothing
+        self.max_detect_interval = max_detect_interval
+        self.detect_interval = 1
+        self._quad = None
+        self._timings = {'pose': 0.0, 'composite': 0.0, 'total': 0.0}
+        self.frames = 0
+        self.detections = 0
+        self._started = None
+
+    def run(self, frames):
+        """
+        Yields each frame with the garment composited onto it (in place; frames are not copied).
+        Frames where no person has been seen since the last missed detection are yielded unchanged.
+        """
+        self._started = time.perf_counter()
+        budget = 1.0 / self.target_fps if self.target_fps else None
+        for frame in frames:
+            frame_start = time.perf_counter()
+
+            # 1. Track the pose every detect_interval frames
+            if self._quad is None or self.frames % self.detect_interval == 0:
+                pose_start = time.perf_counter()
+                pose_result = self.engine.detect_pose(frame)
+                self._timings['pose'] += time.perf_counter() - pose_start
+                self.detections += 1
+                if pose_result.landmarks is not None:
+                    h, w = frame.shape[:2]
+                    self._update_quad(torso_quad(pose_result.landmarks, w, h))
+                else:
+                    # Nobody in frame: drop the garment, and start the average afresh when someone
+                    # reappears instead of sliding it over from where the last person was.
+                    self._quad = None
+
+            # 2. Warp and blend into the frame, reusing the engine's scratch buffers
+            if self._quad is not None:
+                composite_start = time.perf_counter()
+                self.engine.composite(frame, self.clothing_img, self._quad)
+                self._timings['composite'] += time.perf_counter() - composite_start
+
+            elapsed = time.perf_counter() - frame_start
+            self._timings['total'] += elapsed
+            self.frames += 1
+            if budget:
+                self._adapt(elapsed, budget)
+            yield frame
+
+    def _update_quad(self, quad):
+        if self._quad is None or not self.smoothing:
+            self._quad = quad
+        else:
+            self._quad = (self.smoothing * self._quad + (1 - self.smoothing) * quad).astype(np.float32)
+
+    def _adapt(self, elapsed, budget):
+        # Detect less often when over budget and more often once there is comfortable headroom.
+        if elapsed > budget and self.detect_interval < self.max_detect_interval:
+            self.detect_interval += 1
+        elif elapsed < budget * 0.5 and self.detect_interval > 1:
+            self.detect_interval -= 1
+
+    def stats(self):
+        """
+        Sustained FPS since run() started and average per-frame time per stage in milliseconds.
+        """
+        wall = time.perf_counter() - self._started if self._started else 0.0
+        frames = max(self.frames, 1)
+        return {
+            'frames': self.frames,
+            'detections': self.detections,
+            'detect_interval': self.detect_interval,
+            'fps': self.frames / wall if wall else 0.0,
+            'pose_ms': 1000 * self._timings['pose'] / max(self.detections, 1),
+            'composite_ms': 1000 * self._timings['composite'] / frames,
+            'frame_ms': 1000 * self._timings['total'] / frames,
+        }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Real-time virtual try-on on a webcam or video file.")
+    parser.add_argument('--source', default='0', help="Webcam index or video file path.")
+    parser.add_argument('--garment', required=True, help="Garment PNG with transparency.")
+    parser.add_argument('--target-fps', type=float, default=None)
+    parser.add_argument('--output', default=None, help="Optional path of an .mp4 to write.")
+    parser.add_argument('--show', action='store_true', help="Display frames in a window.")
+    args = parser.parse_args()
+
+    garment = cv2.imread(args.garment, cv2.IMREAD_UNCHANGED)
+    if garment is None:
+        raise SystemExit(f"Could not load garment {args.garment}.")
+
+    video = VideoTryOn(garment, target_fps=args.target_fps)
+    writer = None
+    try:
+        for frame in video.run(frames_from_source(args.source)):
+            if args.output:
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*'mp4v'), args.target_fps or 30, (w, h))
+                writer.write(frame)
+            if args.show:
+                cv2.imshow('Virtual Try-On', frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    finally:
+        if writer is not None:
+            writer.release()
+        video.engine.close()
+
+    stats = video.stats()
+    print(f"Processed {stats['frames']} frames at {stats['fps']:.1f} FPS "
+          f"(pose {stats['pose_ms']:.1f} ms over {stats['detections']} detections, "
+          f"composite {stats['composite_ms']:.1f} ms, frame {stats['frame_ms']:.1f} ms)")